@@ -1,9 +1,9 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, abort, Response, stream_with_context
 from flask_cors import CORS
+import functools
 import os
 import sys
 import requests
-from groq import Groq
 from dotenv import load_dotenv
 import json
 import traceback
@@ -11,132 +11,229 @@ import traceback
 # Load environment variables
 load_dotenv()
 
-# Add parent directory to path to import your existing modules
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import prompts
+from clients import UITHUB_MAX_TOKENS, fetch_repo, get_scheduler, uithub_url
+from local_source import is_local_source, read_local_repo
+from review_cache import create_review_cache
+from review_store import create_review_store
+from review_jobs import QueueFullError, create_job_queue
+from singleflight import SingleFlight, normalize_repo_url
+from prefetch import Prefetcher, create_fetch_cache
+from compression import STATIC_MAX_AGE, StaticFiles, compress_body, is_compressible
+from batch import BATCH_MAX_REPOS, run_batch
+from providers import create_router
+from metrics import (ERRORS, FETCH_CACHE_LOOKUPS, FETCH_SECONDS, REVIEW_SECONDS, REVIEWS_IN_FLIGHT, render_metrics,
+                     stage_timer)
+from map_reduce import final_messages, plan_review
+from packer import budget_for_model
+from pipeline import stream_pipeline_events
+from review_api import (SSE_HEADERS, ReviewError, ReviewStream, cache_hit_payload, cache_model_key,
+                        check_llm_configured, coalesced_event, collect_review, llm_error, lookup_cached_review,
+                        pipeline_running_event, replay_review, review_flight_key, review_history_page,
+                        review_payload, sse_stream, store_review, validate_github_url, validate_pipeline_request,
+                        validate_review_source)
 
-try:
-    import prompts
-except ImportError:
-    # If prompts.py is in the same directory
-    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-    import prompts
+# LLM backends (REVIEW_PROVIDERS, e.g. "groq,gemini") with latency-based routing and hedging
+review_router = create_router()
+REVIEW_MODEL = review_router.primary.model
+CACHE_MODEL_KEY = cache_model_key(review_router)
 
-app = Flask(__name__, static_folder='static', static_url_path='/static')
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Static files are served from memory, precompressed and with ETags (see compression.py)
+app = Flask(__name__, static_folder=None)
 CORS(app)  # Enable CORS for frontend requests
+frontend_files = StaticFiles(BASE_DIR)
+static_files = StaticFiles(os.path.join(BASE_DIR, 'static'))
+
+# Layered (memory + disk) cache of finished reviews
+review_cache = create_review_cache()
+
+# Searchable SQLite history of every finished review
+review_store = create_review_store()
+
+# Bounded worker pool that runs fetch + LLM stages off the request threads
+review_jobs = create_job_queue()
 
-# Initialize Groq client
-client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
+# Coalesce identical in-flight fetches and reviews (popular repos get submitted in bursts)
+fetch_flight = SingleFlight()
+review_flight = SingleFlight()
+
+# Repositories fetched by /api/prefetch, kept for PREFETCH_TTL seconds or until a review uses them
+fetch_cache = create_fetch_cache()
+
+def static_response(files, filename, cache_control):
+    """Serve a file from a StaticFiles, answering conditional requests with 304"""
+    result = files.response(filename, request.headers, cache_control)
+    if result is None:
+        abort(404)
+    status, body, headers = result
+    return Response(body, status=status, headers=headers)
+
+@app.after_request
+def compress_response(response):
+    """Compress large JSON and text responses for clients that accept it; streams are left alone"""
+    if (response.is_streamed or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or not is_compressible(response.mimetype)):
+        return response
+    response.vary.add('Accept-Encoding')
+    compressed = compress_body(response.get_data(), response.mimetype, request.headers)
+    if compressed is not None:
+        encoding, body = compressed
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+    return response
 
 @app.route('/')
 def index():
     """Serve the main HTML file"""
-    return send_from_directory('.', 'index.html')
+    # Always revalidated, which costs a 304 once the browser has the current version
+    return static_response(frontend_files, 'index.html', 'no-cache')
+
+@app.route('/static/<path:filename>')
+def static_file(filename):
+    return static_response(static_files, filename, f'public, max-age={STATIC_MAX_AGE}')
 
 @app.route('/health')
 def health_check():
     """Health check endpoint"""
     return jsonify({'status': 'healthy', 'message': 'Code Reviewer API is running'})
 
+def fetch_repository(github_url, prefetch=False):
+    """
+    Download the plain-text repository dump from UIthub, or read a local
+    checkout. prefetch is set by the Prefetcher, which caches the result
+    for the next review instead of using it.
+    """
+    key = normalize_repo_url(github_url)
+    if is_local_source(github_url):
+        print(f"Reading local repository: {github_url}")
+        load = lambda: read_local_repo(github_url, budget=budget_for_model(REVIEW_MODEL))
+    else:
+        # A prefetch triggered while the URL was being typed has usually fetched it already.
+        # It is used once, so a later resubmission fetches the repository again
+        fetched = fetch_cache.pop(key) if not prefetch else None
+        FETCH_CACHE_LOOKUPS.inc(result='hit' if fetched is not None else 'miss')
+        if fetched is not None:
+            print(f"Repository served from the prefetch cache: {github_url}")
+            return fetched
+        print(f"Fetching repository content from: {uithub_url(github_url, UITHUB_MAX_TOKENS)}")
+        # Fetch repository content over the shared, pooled session
+        load = lambda: fetch_repo(github_url, UITHUB_MAX_TOKENS, budget_for_model(REVIEW_MODEL))
+    
+    try:
+        fetched, _ = fetch_flight.do(key, load)
+    except (requests.exceptions.RequestException, OSError) as e:
+        ERRORS.inc(stage='fetch')
+        raise ReviewError(f'Failed to fetch repository content: {str(e)}')
+    
+    if not fetched.records:
+        ERRORS.inc(stage='fetch')
+        raise ReviewError('Repository appears to be empty or inaccessible')
+    
+    if not prefetch:
+        # This fetch may have joined a prefetch, whose result must then not be cached
+        prefetcher.mark_used(github_url)
+    
+    print(f"Repository content fetched successfully. Read {fetched.bytes_read} bytes, "
+          f"kept {len(fetched.records)} files, left out {len(fetched.omitted)}")
+    return fetched
+
+# Background fetches started by /api/prefetch
+prefetcher = Prefetcher(functools.partial(fetch_repository, prefetch=True), fetch_cache)
+
+def complete_review(messages):
+    """Run one chat completion on the fastest healthy provider and return its text"""
+    return review_router.complete(messages)
+
+def run_review(github_url, report_stage=None):
+    """
+    Fetch the repository and review it, returning the response payload.
+    Concurrent requests for the same repo, model and prompt share one run.
+    """
+    report_stage = report_stage or (lambda stage: None)
+    result, shared = review_flight.do(
+        review_flight_key(github_url, CACHE_MODEL_KEY),
+        lambda: _run_review(github_url, report_stage),
+        on_wait=lambda: report_stage('waiting')
+    )
+    if shared:
+        result = dict(result, repository_url=github_url, coalesced=True)
+    return result
+
+def _run_review(github_url, report_stage):
+    """Uncoalesced fetch + cache lookup + review, with a per-stage timing breakdown"""
+    with REVIEWS_IN_FLIGHT.track():
+        timings = {}
+        with stage_timer(timings, 'total'):
+            result = _review_stages(github_url, report_stage, timings)
+        REVIEW_SECONDS.observe(timings['total_ms'] / 1000, cache=result['cache'])
+        result['timings'] = timings
+        return result
+
+def _review_stages(github_url, report_stage, timings):
+    report_stage('fetching')
+    with stage_timer(timings, 'fetch', FETCH_SECONDS):
+        fetched = fetch_repository(github_url)
+    repo_code = fetched.text
+    
+    # Serve identical repo snapshots from the review cache
+    cache_key, cached, cache_layer = lookup_cached_review(review_cache, review_store, repo_code, CACHE_MODEL_KEY, timings)
+    if cached is not None:
+        return cache_hit_payload(github_url, repo_code, cached['review'], cache_layer, fetched.tokens_saved,
+                                 cached.get('review_id'))
+    
+    # Check if an LLM API key is available
+    check_llm_configured(review_router)
+    
+    # Get AI review from the configured providers
+    report_stage('reviewing')
+    try:
+        with stage_timer(timings, 'plan'):
+            plan = plan_review(repo_code, REVIEW_MODEL, omitted=fetched.omitted)
+        with stage_timer(timings, 'map'):
+            messages = final_messages(plan, complete_review)
+        with stage_timer(timings, 'generate'):
+            review_result = complete_review(messages)
+    except Exception as e:
+        raise llm_error(e)
+    
+    print("AI review completed successfully")
+    
+    review_id = store_review(review_cache, review_store, cache_key, github_url, repo_code, fetched,
+                             review_result, CACHE_MODEL_KEY, plan)
+    
+    return review_payload(github_url, repo_code, review_result, plan, fetched.tokens_saved, review_id)
+
 @app.route('/api/review', methods=['POST'])
 def review_code():
     """
-    API endpoint to review code from GitHub repository
+    API endpoint to queue a code review of a GitHub repository
     Expected JSON payload: {"github_url": "https://github.com/user/repo"}
+    or {"local_path": "checkout/dir"} (relative to LOCAL_REVIEW_ROOT)
+    Returns 202 with a job id; poll GET /api/review/<job_id> for the result
     """
     try:
-        # Get JSON data from request
-        data = request.get_json()
+        github_url = validate_review_source(request.get_json(silent=True))
+        job_id = review_jobs.submit(run_review, github_url)
         
-        if not data:
-            return jsonify({
-                'error': 'No JSON data provided',
-                'success': False
-            }), 400
-        
-        github_url = data.get('github_url', '').strip()
-        
-        if not github_url:
-            return jsonify({
-                'error': 'GitHub URL is required',
-                'success': False
-            }), 400
-        
-        # Validate GitHub URL format
-        if not github_url.startswith('https://github.com/'):
-            return jsonify({
-                'error': 'Invalid GitHub URL format. Must start with https://github.com/',
-                'success': False
-            }), 400
-        
-        # Transform URL to UIthub API (same as your main.py)
-        api_url = github_url.replace(
-            "https://github.com/", 
-            "https://uithub.com/"
-        ) + "?accept=text%2Fplain&maxTokens=5000"
-        
-        print(f"Fetching repository content from: {api_url}")
-        
-        # Fetch repository content
-        try:
-            repo_response = requests.get(api_url, timeout=30)
-            repo_response.raise_for_status()
-        except requests.exceptions.RequestException as e:
-            return jsonify({
-                'error': f'Failed to fetch repository content: {str(e)}',
-                'success': False
-            }), 400
-        
-        repo_code = repo_response.text
-        
-        if not repo_code or len(repo_code.strip()) == 0:
-            return jsonify({
-                'error': 'Repository appears to be empty or inaccessible',
-                'success': False
-            }), 400
-        
-        print(f"Repository content fetched successfully. Length: {len(repo_code)} characters")
-        
-        # Check if Groq API key is available
-        if not client.api_key:
-            return jsonify({
-                'error': 'Groq API key not configured. Please set GROQ_API_KEY environment variable.',
-                'success': False
-            }), 500
-        
-        # Get AI review using Groq (same as your main.py)
-        try:
-            chat_completion = client.chat.completions.create(
-                messages=[
-                    {
-                        "role": "system",
-                        "content": prompts.system_prompt_reviewer,
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Please provide the review as mentioned for the code repository given below:\n{repo_code}",
-                    }
-                ],
-                model="llama-3.3-70b-versatile",
-            )
-            
-            review_result = chat_completion.choices[0].message.content
-            
-            print("AI review completed successfully")
-            
-            return jsonify({
-                'review': review_result,
-                'success': True,
-                'repository_url': github_url,
-                'content_length': len(repo_code)
-            })
-            
-        except Exception as groq_error:
-            print(f"Groq API error: {str(groq_error)}")
-            return jsonify({
-                'error': f'AI review failed: {str(groq_error)}',
-                'success': False
-            }), 500
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': f'/api/review/{job_id}'
+        }), 202
         
+    except ReviewError as e:
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), e.status_code
+    except QueueFullError as e:
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), 503
     except Exception as e:
         # Log the full traceback for debugging
         print(f"Unexpected error in review_code: {str(e)}")
@@ -147,6 +244,239 @@ def review_code():
             'success': False
         }), 500
 
+@app.route('/api/review/<job_id>', methods=['GET'])
+def review_status(job_id):
+    """Return the status, and once finished the result, of a review job"""
+    job = review_jobs.get(job_id)
+    if job is None:
+        return jsonify({
+            'error': 'Review job not found',
+            'success': False
+        }), 404
+    
+    payload = {
+        'success': job['status'] != 'failed',
+        'job_id': job_id,
+        'status': job['status'],
+        'stage': job['stage']
+    }
+    if job['status'] == 'completed':
+        payload.update(job['result'])
+        # Time spent waiting for a free worker before the review started
+        payload['timings'] = dict(
+            payload.get('timings', {}),
+            queue_ms=round((job['started_at'] - job['created_at']) * 1000, 1)
+        )
+    elif job['status'] == 'failed':
+        payload['error'] = job['error']
+    
+    return jsonify(payload)
+
+@app.route('/api/prefetch', methods=['POST'])
+def prefetch_repository():
+    """
+    Start fetching a repository before its review is requested, so the
+    review can skip the UIthub download. Expected JSON payload:
+    {"github_url": "https://github.com/user/repo"}. Returns 202 while the
+    fetch runs and 200 when the repository is already cached.
+    """
+    try:
+        github_url = validate_github_url(request.get_json(silent=True))
+    except ReviewError as e:
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), e.status_code
+    
+    status = prefetcher.submit(github_url)
+    if status == 'busy':
+        return jsonify({
+            'error': 'Too many prefetches in progress',
+            'success': False
+        }), 503
+    return jsonify({'success': True, 'status': status}), 200 if status == 'cached' else 202
+
+@app.route('/api/review/batch', methods=['POST'])
+def review_batch():
+    """
+    Review a list of repositories with bounded parallelism
+    Expected JSON payload: {"github_urls": [...], "concurrency": 4}
+    Streams one NDJSON line per repository as it finishes, then a summary line
+    """
+    data = request.get_json(silent=True) or {}
+    github_urls = data.get('github_urls')
+    
+    if not isinstance(github_urls, list) or not github_urls:
+        return jsonify({
+            'error': 'github_urls must be a non-empty list',
+            'success': False
+        }), 400
+    
+    if len(github_urls) > BATCH_MAX_REPOS:
+        return jsonify({
+            'error': f'At most {BATCH_MAX_REPOS} repositories can be reviewed per batch',
+            'success': False
+        }), 400
+    
+    try:
+        concurrency = int(data.get('concurrency', 4))
+    except (TypeError, ValueError):
+        return jsonify({
+            'error': 'concurrency must be an integer',
+            'success': False
+        }), 400
+    
+    def review_one(github_url):
+        return run_review(validate_github_url({'github_url': str(github_url)}))
+    
+    def generate():
+        for entry in run_batch(github_urls, review_one, concurrency):
+            yield json.dumps(entry) + '\n'
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'X-Accel-Buffering': 'no'}
+    )
+
+def stream_review_events(github_url):
+    """(event, data) pairs of one streamed review: status, token and done"""
+    with REVIEWS_IN_FLIGHT.track():
+        stream = ReviewStream(github_url)
+        yield 'status', {'stage': 'fetching'}
+        with stage_timer(stream.timings, 'fetch', FETCH_SECONDS):
+            fetched = fetch_repository(github_url)
+        cache_key, cached, cache_layer = lookup_cached_review(review_cache, review_store, fetched.text,
+                                                              CACHE_MODEL_KEY, stream.timings)
+        if cached is not None:
+            yield from stream.cache_hit(fetched, cached, cache_layer)
+            return
+    
+        check_llm_configured(review_router)
+    
+        with stage_timer(stream.timings, 'plan'):
+            plan = plan_review(fetched.text, REVIEW_MODEL, omitted=fetched.omitted)
+        try:
+            yield from stream.planned(plan)
+            with stage_timer(stream.timings, 'map'):
+                messages = final_messages(plan, complete_review)
+            yield 'status', {'stage': 'reviewing'}
+            with stage_timer(stream.timings, 'generate'):
+                for text in review_router.stream(messages):
+                    yield stream.token(text)
+        except Exception as e:
+            raise llm_error(e)
+    
+        review_id = store_review(review_cache, review_store, cache_key, github_url, fetched.text, fetched,
+                                 stream.review, CACHE_MODEL_KEY, plan)
+        yield stream.done(fetched, plan, review_id)
+
+def stream_review(github_url):
+    """
+    stream_review_events() run once for concurrent reviews of the same repo,
+    model and prompt, streamed or not; every stream gets all of its events
+    """
+    items = review_flight.stream(review_flight_key(github_url, CACHE_MODEL_KEY),
+                                 lambda: stream_review_events(github_url), replay_review, collect_review)
+    try:
+        for item, shared in items:
+            yield coalesced_event(item, shared, github_url)
+    finally:
+        items.close()
+
+@app.route('/api/review/stream', methods=['GET', 'POST'])
+def review_code_stream():
+    """
+    Stream a code review as Server-Sent Events while it is generated
+    Accepts a JSON payload {"github_url": ...} or {"local_path": ...} (POST), or the same as query parameters (GET)
+    Events: status, token, done, error
+    """
+    try:
+        if request.method == 'POST':
+            github_url = validate_review_source(request.get_json(silent=True))
+        else:
+            github_url = validate_review_source(request.args)
+    except ReviewError as e:
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), e.status_code
+    
+    events = sse_stream(stream_review(github_url), 'review_code_stream')
+    return Response(stream_with_context(events), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+@app.route('/api/pipeline', methods=['POST'])
+def pipeline_stream():
+    """
+    Fetch a repository once and run several tasks on it concurrently, as Server-Sent Events
+    Expected JSON payload: {"github_url": ... or "local_path": ..., "tasks": ["review", "readme"]}
+    Events: status, token (with the task name), task_done (per task), done, error
+    """
+    try:
+        github_url, tasks = validate_pipeline_request(request.get_json(silent=True), review_router)
+    except ReviewError as e:
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), e.status_code
+    
+    def pipeline_events():
+        with REVIEWS_IN_FLIGHT.track():
+            timings = {}
+            yield 'status', {'stage': 'fetching'}
+            with stage_timer(timings, 'fetch', FETCH_SECONDS):
+                fetched = fetch_repository(github_url)
+            yield pipeline_running_event(tasks, fetched, timings)
+            # One fetch, every task's tokens interleaved and tagged with the task name
+            yield from stream_pipeline_events(fetched, tasks, review_router)
+    
+    events = sse_stream(pipeline_events(), 'pipeline_stream')
+    return Response(stream_with_context(events), mimetype='text/event-stream', headers=SSE_HEADERS)
+
+@app.route('/api/reviews', methods=['GET'])
+def list_reviews():
+    """Review history, newest first: ?q= full-text search, ?repo=, ?model=, ?limit= and ?cursor= paging"""
+    try:
+        return jsonify(review_history_page(review_store, request.args))
+    except ReviewError as e:
+        return jsonify({
+            'error': str(e),
+            'success': False
+        }), e.status_code
+
+@app.route('/api/reviews/<int:review_id>', methods=['GET'])
+def get_review(review_id):
+    """A stored review with its metadata"""
+    review = review_store.get(review_id) if review_store is not None else None
+    if review is None:
+        return jsonify({
+            'error': 'Review not found',
+            'success': False
+        }), 404
+    return jsonify({'success': True, 'review': review})
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics in the text exposition format"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/stats', methods=['GET'])
+def stats():
+    """Cache, job queue and request coalescing statistics for monitoring"""
+    return jsonify({
+        'success': True,
+        'review_cache': dict(review_cache.stats, entries=len(review_cache.memory)),
+        'review_history': {'reviews': review_store.count() if review_store is not None else 0},
+        'prefetch': prefetcher.stats(),
+        'jobs': review_jobs.stats(),
+        'rate_limits': get_scheduler().stats(),
+        'providers': review_router.stats(),
+        'coalescing': {
+            'fetches': fetch_flight.stats(),
+            'reviews': review_flight.stats()
+        }
+    })
+
 @app.route('/api/test-connection', methods=['GET'])
 def test_connection():
     """Test endpoint to verify API connectivity"""
@@ -154,13 +484,15 @@ def test_connection():
         # Test if prompts module is accessible
         hasattr(prompts, 'system_prompt_reviewer')
         
-        # Test if Groq client is configured
-        api_key_configured = bool(client.api_key)
+        # Test if the LLM providers are configured
+        api_key_configured = bool(os.environ.get("GROQ_API_KEY"))
+        providers_configured = [p.name for p in review_router.configured()]
         
         return jsonify({
             'success': True,
             'prompts_available': True,
             'groq_configured': api_key_configured,
+            'providers_configured': providers_configured,
             'message': 'All connections are working'
         })
         
@@ -197,7 +529,7 @@ def internal_error(error):
 
 def validate_environment():
     """Validate that all required environment variables are set"""
-    required_vars = ['GROQ_API_KEY']
+    required_vars = [p.api_key_env for p in review_router.providers if p.api_key_env]
     missing_vars = []
     
     for var in required_vars:
@@ -211,7 +543,7 @@ def validate_environment():
     
     return True
 
-if __name__ == '__main__':
+def main():
     # Validate environment before starting
     if not validate_environment():
         print("Environment validation failed. Please check your configuration.")
@@ -222,7 +554,15 @@ if __name__ == '__main__':
     print(f"Server will be available at: http://localhost:5000")
     print("API endpoints:")
     print("  - GET  /              : Frontend interface")
-    print("  - POST /api/review    : Code review endpoint")
+    print("  - POST /api/review    : Queue a code review (returns a job id)")
+    print("  - GET  /api/review/<id> : Review job status and result")
+    print("  - POST /api/review/stream : Stream a review as Server-Sent Events")
+    print("  - POST /api/review/batch  : Review many repositories, streamed as NDJSON")
+    print("  - POST /api/prefetch  : Fetch a repository ahead of its review")
+    print("  - POST /api/pipeline  : Run several tasks on one fetch, streamed as Server-Sent Events")
+    print("  - GET  /api/reviews   : Search and page through past reviews")
+    print("  - GET  /api/stats     : Cache, queue and coalescing statistics")
+    print("  - GET  /metrics       : Prometheus metrics")
     print("  - GET  /api/test-connection : Test connectivity")
     print("  - GET  /health        : Health check")
     
@@ -232,4 +572,7 @@ if __name__ == '__main__':
         port=5000, 
         host='0.0.0.0',  # Allow external connections
         threaded=True     # Handle multiple requests
-    )
\ No newline at end of file
+    )
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,476 @@
+"""
+Async (ASGI) serving mode for the review API.
+
+Serves the same endpoints as app.py, but every review runs as a task on one
+event loop: the repository fetch uses httpx.AsyncClient and LLM calls use the
+async Groq/Gemini clients, so a single process can keep hundreds of I/O-bound
+reviews in flight without a thread per review.
+
+    hypercorn async_app:app --bind 0.0.0.0:5000
+    python async_app.py
+"""
+import asyncio
+import functools
+import json
+import os
+import sys
+import traceback
+
+import httpx
+from dotenv import load_dotenv
+from quart import Quart, Response, abort, jsonify, request
+from quart.wrappers.response import DataBody
+
+# Load environment variables
+load_dotenv()
+
+from batch import BATCH_MAX_REPOS, run_batch_async
+from clients import UITHUB_MAX_TOKENS, close_async_clients, fetch_repo_async, get_scheduler, uithub_url
+from local_source import is_local_source, read_local_repo
+from map_reduce import final_messages_async, plan_review
+from metrics import (ERRORS, FETCH_CACHE_LOOKUPS, FETCH_SECONDS, REVIEW_SECONDS, REVIEWS_IN_FLIGHT, render_metrics,
+                     stage_timer)
+from packer import budget_for_model
+from pipeline import stream_pipeline_events_async
+from providers import create_router
+from review_api import (SSE_HEADERS, ReviewError, ReviewStream, cache_hit_payload, cache_model_key,
+                        check_llm_configured, coalesced_event, collect_review, llm_error, lookup_cached_review,
+                        pipeline_running_event, replay_review, review_flight_key, review_history_page,
+                        review_payload, sse_stream_async, store_review, validate_github_url,
+                        validate_pipeline_request, validate_review_source)
+from review_cache import create_review_cache
+from review_store import create_review_store
+from review_jobs import QueueFullError, create_async_job_queue
+from compression import STATIC_MAX_AGE, StaticFiles, compress_body, is_compressible
+from prefetch import AsyncPrefetcher, create_fetch_cache
+from singleflight import AsyncSingleFlight, normalize_repo_url
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+review_router = create_router()
+REVIEW_MODEL = review_router.primary.model
+CACHE_MODEL_KEY = cache_model_key(review_router)
+
+app = Quart(__name__, static_folder=None)
+# Reviews of large repositories can stream for several minutes
+app.config['RESPONSE_TIMEOUT'] = None
+
+review_cache = create_review_cache()
+review_store = create_review_store()
+review_jobs = create_async_job_queue()
+fetch_flight = AsyncSingleFlight()
+review_flight = AsyncSingleFlight()
+fetch_cache = create_fetch_cache()
+frontend_files = StaticFiles(BASE_DIR)
+static_files = StaticFiles(os.path.join(BASE_DIR, 'static'))
+
+
+@app.after_request
+async def add_cors_headers(response):
+    """Allow cross-origin frontends, like flask_cors does for app.py"""
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    response.headers['Access-Control-Allow-Headers'] = 'Content-Type'
+    return response
+
+
+@app.after_request
+async def compress_response(response):
+    """Compress large JSON and text responses for clients that accept it; streams are left alone"""
+    if (not isinstance(response.response, DataBody) or 'Content-Encoding' in response.headers
+            or not is_compressible(response.mimetype)):
+        return response
+    response.vary.add('Accept-Encoding')
+    compressed = compress_body(await response.get_data(), response.mimetype, request.headers)
+    if compressed is not None:
+        encoding, body = compressed
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def static_response(files, filename, cache_control):
+    """Serve a file from a StaticFiles, answering conditional requests with 304"""
+    result = files.response(filename, request.headers, cache_control)
+    if result is None:
+        abort(404)
+    status, body, headers = result
+    return Response(body, status=status, headers=headers)
+
+
+@app.after_serving
+async def shutdown():
+    await close_async_clients()
+
+
+@app.route('/')
+async def index():
+    """Serve the main HTML file"""
+    return static_response(frontend_files, 'index.html', 'no-cache')
+
+
+@app.route('/static/<path:filename>')
+async def static_file(filename):
+    return static_response(static_files, filename, f'public, max-age={STATIC_MAX_AGE}')
+
+
+@app.route('/health')
+async def health_check():
+    """Health check endpoint"""
+    return jsonify({'status': 'healthy', 'message': 'Code Reviewer API is running'})
+
+
+async def fetch_repository(github_url, prefetch=False):
+    """Download the plain-text repository dump from UIthub, or read a local checkout (see app.py)"""
+    key = normalize_repo_url(github_url)
+    if is_local_source(github_url):
+        print(f"Reading local repository: {github_url}")
+        load = lambda: asyncio.to_thread(read_local_repo, github_url, budget=budget_for_model(REVIEW_MODEL))
+    else:
+        fetched = fetch_cache.pop(key) if not prefetch else None
+        FETCH_CACHE_LOOKUPS.inc(result='hit' if fetched is not None else 'miss')
+        if fetched is not None:
+            print(f"Repository served from the prefetch cache: {github_url}")
+            return fetched
+        print(f"Fetching repository content from: {uithub_url(github_url, UITHUB_MAX_TOKENS)}")
+        load = lambda: fetch_repo_async(github_url, UITHUB_MAX_TOKENS, budget_for_model(REVIEW_MODEL))
+    try:
+        fetched, _ = await fetch_flight.do(key, load)
+    except (httpx.HTTPError, OSError) as e:
+        ERRORS.inc(stage='fetch')
+        raise ReviewError(f'Failed to fetch repository content: {str(e)}')
+
+    if not fetched.records:
+        ERRORS.inc(stage='fetch')
+        raise ReviewError('Repository appears to be empty or inaccessible')
+
+    if not prefetch:
+        prefetcher.mark_used(github_url)
+
+    print(f"Repository content fetched successfully. Read {fetched.bytes_read} bytes, "
+          f"kept {len(fetched.records)} files, left out {len(fetched.omitted)}")
+    return fetched
+
+
+prefetcher = AsyncPrefetcher(functools.partial(fetch_repository, prefetch=True), fetch_cache)
+
+
+async def complete_review(messages):
+    """Run one chat completion on the fastest healthy provider and return its text"""
+    return await review_router.complete_async(messages)
+
+
+async def run_review(github_url, report_stage=None):
+    """
+    Fetch the repository and review it, returning the response payload.
+    Concurrent requests for the same repo, model and prompt share one run.
+    """
+    report_stage = report_stage or (lambda stage: None)
+    result, shared = await review_flight.do(
+        review_flight_key(github_url, CACHE_MODEL_KEY),
+        lambda: _run_review(github_url, report_stage),
+        on_wait=lambda: report_stage('waiting')
+    )
+    if shared:
+        result = dict(result, repository_url=github_url, coalesced=True)
+    return result
+
+
+async def _run_review(github_url, report_stage):
+    with REVIEWS_IN_FLIGHT.track():
+        timings = {}
+        with stage_timer(timings, 'total'):
+            result = await _review_stages(github_url, report_stage, timings)
+        REVIEW_SECONDS.observe(timings['total_ms'] / 1000, cache=result['cache'])
+        result['timings'] = timings
+        return result
+
+
+async def _review_stages(github_url, report_stage, timings):
+    report_stage('fetching')
+    with stage_timer(timings, 'fetch', FETCH_SECONDS):
+        fetched = await fetch_repository(github_url)
+    repo_code = fetched.text
+
+    # The disk layer and history are read off the event loop
+    cache_key, cached, cache_layer = await asyncio.to_thread(lookup_cached_review, review_cache, review_store,
+                                                             repo_code, CACHE_MODEL_KEY, timings)
+    if cached is not None:
+        return cache_hit_payload(github_url, repo_code, cached['review'], cache_layer, fetched.tokens_saved,
+                                 cached.get('review_id'))
+
+    check_llm_configured(review_router)
+
+    report_stage('reviewing')
+    try:
+        with stage_timer(timings, 'plan'):
+            # Parsing and packing is CPU work, so it runs on a worker thread
+            plan = await asyncio.to_thread(plan_review, repo_code, REVIEW_MODEL, omitted=fetched.omitted)
+        with stage_timer(timings, 'map'):
+            messages = await final_messages_async(plan, complete_review)
+        with stage_timer(timings, 'generate'):
+            review_result = await complete_review(messages)
+    except Exception as e:
+        raise llm_error(e)
+
+    print("AI review completed successfully")
+    review_id = await asyncio.to_thread(store_review, review_cache, review_store, cache_key, github_url, repo_code,
+                                        fetched, review_result, CACHE_MODEL_KEY, plan)
+    return review_payload(github_url, repo_code, review_result, plan, fetched.tokens_saved, review_id)
+
+
+@app.route('/api/review', methods=['POST'])
+async def review_code():
+    """
+    Queue a code review of a GitHub repository
+    Expected JSON payload: {"github_url": "https://github.com/user/repo"}
+    or {"local_path": "checkout/dir"} (relative to LOCAL_REVIEW_ROOT)
+    Returns 202 with a job id; poll GET /api/review/<job_id> for the result
+    """
+    try:
+        github_url = validate_review_source(await request.get_json(silent=True))
+        job_id = review_jobs.submit(run_review, github_url)
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status': 'queued',
+            'status_url': f'/api/review/{job_id}'
+        }), 202
+    except ReviewError as e:
+        return jsonify({'error': str(e), 'success': False}), e.status_code
+    except QueueFullError as e:
+        return jsonify({'error': str(e), 'success': False}), 503
+    except Exception as e:
+        print(f"Unexpected error in review_code: {str(e)}")
+        print(traceback.format_exc())
+        return jsonify({'error': f'Internal server error: {str(e)}', 'success': False}), 500
+
+
+@app.route('/api/review/<job_id>', methods=['GET'])
+async def review_status(job_id):
+    """Return the status, and once finished the result, of a review job"""
+    job = review_jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Review job not found', 'success': False}), 404
+
+    payload = {
+        'success': job['status'] != 'failed',
+        'job_id': job_id,
+        'status': job['status'],
+        'stage': job['stage']
+    }
+    if job['status'] == 'completed':
+        payload.update(job['result'])
+        payload['timings'] = dict(
+            payload.get('timings', {}),
+            queue_ms=round((job['started_at'] - job['created_at']) * 1000, 1)
+        )
+    elif job['status'] == 'failed':
+        payload['error'] = job['error']
+    return jsonify(payload)
+
+
+@app.route('/api/prefetch', methods=['POST'])
+async def prefetch_repository():
+    """Start fetching a repository before its review is requested (202, or 200 when already cached)"""
+    try:
+        github_url = validate_github_url(await request.get_json(silent=True))
+    except ReviewError as e:
+        return jsonify({'error': str(e), 'success': False}), e.status_code
+
+    status = prefetcher.submit(github_url)
+    if status == 'busy':
+        return jsonify({'error': 'Too many prefetches in progress', 'success': False}), 503
+    return jsonify({'success': True, 'status': status}), 200 if status == 'cached' else 202
+
+
+@app.route('/api/review/batch', methods=['POST'])
+async def review_batch():
+    """
+    Review a list of repositories with bounded parallelism
+    Expected JSON payload: {"github_urls": [...], "concurrency": 4}
+    Streams one NDJSON line per repository as it finishes, then a summary line
+    """
+    data = await request.get_json(silent=True) or {}
+    github_urls = data.get('github_urls')
+    if not isinstance(github_urls, list) or not github_urls:
+        return jsonify({'error': 'github_urls must be a non-empty list', 'success': False}), 400
+    if len(github_urls) > BATCH_MAX_REPOS:
+        return jsonify({
+            'error': f'At most {BATCH_MAX_REPOS} repositories can be reviewed per batch',
+            'success': False
+        }), 400
+    try:
+        concurrency = int(data.get('concurrency', 4))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'concurrency must be an integer', 'success': False}), 400
+
+    async def review_one(github_url):
+        return await run_review(validate_github_url({'github_url': str(github_url)}))
+
+    async def generate():
+        async for entry in run_batch_async(github_urls, review_one, concurrency):
+            yield json.dumps(entry) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
+
+
+async def stream_review_events(github_url):
+    """(event, data) pairs of one streamed review: status, token and done"""
+    with REVIEWS_IN_FLIGHT.track():
+        stream = ReviewStream(github_url)
+        yield 'status', {'stage': 'fetching'}
+        with stage_timer(stream.timings, 'fetch', FETCH_SECONDS):
+            fetched = await fetch_repository(github_url)
+        cache_key, cached, cache_layer = await asyncio.to_thread(lookup_cached_review, review_cache, review_store,
+                                                                 fetched.text, CACHE_MODEL_KEY, stream.timings)
+        if cached is not None:
+            for event in stream.cache_hit(fetched, cached, cache_layer):
+                yield event
+            return
+
+        check_llm_configured(review_router)
+
+        with stage_timer(stream.timings, 'plan'):
+            plan = await asyncio.to_thread(plan_review, fetched.text, REVIEW_MODEL, omitted=fetched.omitted)
+        try:
+            for event in stream.planned(plan):
+                yield event
+            with stage_timer(stream.timings, 'map'):
+                messages = await final_messages_async(plan, complete_review)
+            yield 'status', {'stage': 'reviewing'}
+            with stage_timer(stream.timings, 'generate'):
+                async for text in review_router.astream(messages):
+                    yield stream.token(text)
+        except Exception as e:
+            raise llm_error(e)
+
+        review_id = await asyncio.to_thread(store_review, review_cache, review_store, cache_key, github_url,
+                                            fetched.text, fetched, stream.review, CACHE_MODEL_KEY, plan)
+        yield stream.done(fetched, plan, review_id)
+
+
+async def stream_review(github_url):
+    """stream_review_events() coalesced with other reviews of the same repo, model and prompt (see app.py)"""
+    items = review_flight.stream(review_flight_key(github_url, CACHE_MODEL_KEY),
+                                 lambda: stream_review_events(github_url), replay_review, collect_review)
+    try:
+        async for item, shared in items:
+            yield coalesced_event(item, shared, github_url)
+    finally:
+        # Closing the subscription lets the shared review stop once nobody reads it
+        await items.aclose()
+
+
+@app.route('/api/review/stream', methods=['GET', 'POST'])
+async def review_code_stream():
+    """
+    Stream a code review as Server-Sent Events while it is generated
+    Accepts a JSON payload {"github_url": ...} or {"local_path": ...} (POST), or the same as query parameters (GET)
+    Events: status, token, done, error
+    """
+    try:
+        if request.method == 'POST':
+            github_url = validate_review_source(await request.get_json(silent=True))
+        else:
+            github_url = validate_review_source(request.args)
+    except ReviewError as e:
+        return jsonify({'error': str(e), 'success': False}), e.status_code
+
+    events = sse_stream_async(stream_review(github_url), 'review_code_stream')
+    return Response(events, mimetype='text/event-stream', headers=SSE_HEADERS)
+
+
+@app.route('/api/pipeline', methods=['POST'])
+async def pipeline_stream():
+    """
+    Fetch a repository once and run several tasks on it concurrently, as Server-Sent Events
+    Expected JSON payload: {"github_url": ... or "local_path": ..., "tasks": ["review", "readme"]}
+    Events: status, token (with the task name), task_done (per task), done, error
+    """
+    try:
+        github_url, tasks = validate_pipeline_request(await request.get_json(silent=True), review_router)
+    except ReviewError as e:
+        return jsonify({'error': str(e), 'success': False}), e.status_code
+
+    async def pipeline_events():
+        with REVIEWS_IN_FLIGHT.track():
+            timings = {}
+            yield 'status', {'stage': 'fetching'}
+            with stage_timer(timings, 'fetch', FETCH_SECONDS):
+                fetched = await fetch_repository(github_url)
+            yield pipeline_running_event(tasks, fetched, timings)
+            async for event in stream_pipeline_events_async(fetched, tasks, review_router):
+                yield event
+
+    events = sse_stream_async(pipeline_events(), 'pipeline_stream')
+    return Response(events, mimetype='text/event-stream', headers=SSE_HEADERS)
+
+
+@app.route('/api/reviews', methods=['GET'])
+async def list_reviews():
+    """Review history, newest first: ?q= full-text search, ?repo=, ?model=, ?limit= and ?cursor= paging"""
+    try:
+        return jsonify(await asyncio.to_thread(review_history_page, review_store, request.args))
+    except ReviewError as e:
+        return jsonify({'error': str(e), 'success': False}), e.status_code
+
+
+@app.route('/api/reviews/<int:review_id>', methods=['GET'])
+async def get_review(review_id):
+    """A stored review with its metadata"""
+    review = await asyncio.to_thread(review_store.get, review_id) if review_store is not None else None
+    if review is None:
+        return jsonify({'error': 'Review not found', 'success': False}), 404
+    return jsonify({'success': True, 'review': review})
+
+
+@app.route('/metrics', methods=['GET'])
+async def metrics():
+    """Prometheus metrics in the text exposition format"""
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/stats', methods=['GET'])
+async def stats():
+    """Cache, job queue and request coalescing statistics for monitoring"""
+    return jsonify({
+        'success': True,
+        'review_cache': dict(review_cache.stats, entries=len(review_cache.memory)),
+        'review_history': {'reviews': review_store.count() if review_store is not None else 0},
+        'prefetch': prefetcher.stats(),
+        'jobs': review_jobs.stats(),
+        'rate_limits': get_scheduler().stats(),
+        'providers': review_router.stats(),
+        'coalescing': {
+            'fetches': fetch_flight.stats(),
+            'reviews': review_flight.stats()
+        }
+    })
+
+
+@app.errorhandler(404)
+async def not_found(error):
+    return jsonify({'error': 'Endpoint not found', 'success': False}), 404
+
+
+@app.errorhandler(405)
+async def method_not_allowed(error):
+    return jsonify({'error': 'Method not allowed', 'success': False}), 405
+
+
+def main():
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    if not review_router.configured():
+        print("No LLM provider is configured. Please check your environment variables.")
+        sys.exit(1)
+
+    config = Config()
+    config.bind = [f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', 5000)}"]
+    print(f"Starting async Code Reviewer API on {config.bind[0]}")
+    asyncio.run(serve(app, config))
+
+
+if __name__ == '__main__':
+    main()
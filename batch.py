@@ -0,0 +1,111 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+BATCH_MAX_CONCURRENCY = int(os.environ.get('BATCH_MAX_CONCURRENCY', 8))
+BATCH_MAX_REPOS = int(os.environ.get('BATCH_MAX_REPOS', 500))
+
+
+def _entry(url, started, result=None, error=None):
+    if error is None:
+        entry = dict(result, success=result.get('success', True))
+    else:
+        entry = {'success': False, 'error': str(error)}
+    entry.update({
+        'type': 'result',
+        'repository_url': url,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+    })
+    return entry
+
+
+def _timed(review_fn, url):
+    started = time.perf_counter()
+    try:
+        return _entry(url, started, review_fn(url))
+    except Exception as e:
+        return _entry(url, started, error=e)
+
+
+def _concurrency(urls, concurrency):
+    return max(1, min(concurrency, BATCH_MAX_CONCURRENCY, len(urls) or 1))
+
+
+def _timing(entry):
+    return {
+        'repository_url': entry['repository_url'],
+        'success': entry['success'],
+        'duration_ms': entry['duration_ms'],
+    }
+
+
+def _summary(urls, concurrency, started, timings):
+    succeeded = sum(1 for t in timings if t['success'])
+    durations = sorted(t['duration_ms'] for t in timings)
+    return {
+        'type': 'summary',
+        'total': len(urls),
+        'succeeded': succeeded,
+        'failed': len(urls) - succeeded,
+        'concurrency': concurrency,
+        'wall_ms': round((time.perf_counter() - started) * 1000, 1),
+        'max_ms': durations[-1] if durations else 0,
+        'mean_ms': round(sum(durations) / len(durations), 1) if durations else 0,
+        'timings': timings,
+    }
+
+
+def run_batch(urls, review_fn, concurrency=4):
+    """
+    Review many repositories with bounded parallelism.
+    Yields one result dict per repository as soon as it finishes (in
+    completion order), then a final summary dict with per-repo timings.
+    review_fn(url) returns a result dict or raises on failure. Closing the
+    generator early (the client went away) cancels the reviews that have
+    not started yet.
+    """
+    concurrency = _concurrency(urls, concurrency)
+    started = time.perf_counter()
+    timings = []
+
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='review-batch')
+    try:
+        futures = [executor.submit(_timed, review_fn, url) for url in urls]
+        for future in as_completed(futures):
+            entry = future.result()
+            timings.append(_timing(entry))
+            yield entry
+    finally:
+        # Reviews already running finish in the background; queued ones never start
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    yield _summary(urls, concurrency, started, timings)
+
+
+async def run_batch_async(urls, review_fn, concurrency=4):
+    """run_batch() for an async review_fn(url), as an async generator; closing it cancels the remaining reviews"""
+    concurrency = _concurrency(urls, concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+    timings = []
+
+    async def timed(url):
+        async with semaphore:
+            url_started = time.perf_counter()
+            try:
+                return _entry(url, url_started, await review_fn(url))
+            except Exception as e:
+                return _entry(url, url_started, error=e)
+
+    tasks = [asyncio.ensure_future(timed(url)) for url in urls]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            entry = await next_done
+            timings.append(_timing(entry))
+            yield entry
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    yield _summary(urls, concurrency, started, timings)
@@ -0,0 +1,297 @@
+"""
+Local stand-ins for UIthub and the Groq API, for load tests and benchmarks.
+
+    python bench/fake_servers.py --llm-latency lognormal:2,0.5 --rate-limit-every 20
+
+Point the app at them with UITHUB_BASE_URL and GROQ_BASE_URL (GROQ_API_KEY
+can be any value). bench/load.py starts them automatically.
+"""
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from repo_files import FileRecord, estimate_tokens, render_records
+
+REVIEW_SENTENCE = "The module is readable, but error handling around network calls could be stricter. "
+
+
+def parse_latency(spec, rng=None):
+    """
+    Latency sampler (returning seconds) from a spec string:
+    "0.5" or "fixed:0.5", "uniform:LOW,HIGH", "normal:MEAN,STDDEV",
+    "lognormal:MEDIAN,SIGMA" or "exp:MEAN".
+    """
+    rng = rng or random.Random()
+    kind, _, params = str(spec).partition(':')
+    if not params:
+        kind, params = 'fixed', kind
+    values = [float(value) for value in params.split(',')]
+    samplers = {
+        'fixed': lambda: values[0],
+        'uniform': lambda: rng.uniform(values[0], values[1]),
+        'normal': lambda: rng.gauss(values[0], values[1]),
+        'lognormal': lambda: rng.lognormvariate(math.log(values[0]), values[1]),
+        'exp': lambda: rng.expovariate(1 / values[0]) if values[0] else 0.0,
+    }
+    if kind not in samplers:
+        raise ValueError(f"Unknown latency distribution: {kind}")
+    sampler = samplers[kind]
+    return lambda: max(0.0, sampler())
+
+
+@lru_cache(maxsize=256)
+def build_dump(repo, files, file_bytes):
+    """Deterministic UIthub-style dump of a fake repository (content differs per repo)"""
+    records = []
+    for n in range(files):
+        lines = []
+        size = 0
+        line = 0
+        while size < file_bytes:
+            text = f"def handler_{n}_{line}(request):  # {repo}\n    return process(request, {line})\n"
+            lines.append(text)
+            size += len(text)
+            line += 1
+        records.append(FileRecord(f"src/module_{n}.py", ''.join(lines)))
+    tree = '\n'.join(['├── src'] + [f"│   ├── module_{n}.py" for n in range(files)])
+    return render_records(records, preamble=tree)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type='application/json', headers=None):
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_rate_limited(self):
+        self._send(
+            429,
+            json.dumps({'error': {'message': 'Rate limit reached (injected)', 'type': 'rate_limit_exceeded'}}),
+            headers={'Retry-After': str(self.server.retry_after)},
+        )
+
+    def _start_chunked(self, content_type):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def _write_chunk(self, text):
+        data = text.encode('utf-8')
+        self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+        self.wfile.flush()
+
+    def _end_chunked(self):
+        self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
+
+
+class _FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+    handler_class = _Handler
+
+    def __init__(self, port=0, latency='0', rate_limit_every=0, retry_after=1, seed=0):
+        super().__init__(('127.0.0.1', port), self.handler_class)
+        self.sample_latency = parse_latency(latency, random.Random(seed))
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self._requests = itertools.count(1)
+        self._lock = threading.Lock()
+        self.stats = {'requests': 0, 'rate_limited': 0}
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def handle_error(self, request, client_address):
+        # Clients that stop reading a dump early (the ingest byte cap) reset the connection
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+    def count_request(self):
+        """Record a request; True when this one should be rejected with a 429"""
+        n = next(self._requests)
+        limited = bool(self.rate_limit_every) and n % self.rate_limit_every == 0
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['rate_limited'] += limited
+        return limited
+
+
+class _UithubHandler(_Handler):
+    def do_GET(self):
+        if self.server.count_request():
+            return self._send_rate_limited()
+        time.sleep(self.server.sample_latency())
+        repo = self.path.split('?', 1)[0].strip('/')
+        dump = build_dump(repo, self.server.files, self.server.file_bytes)
+        # Sent in pieces, like a large dump arriving over the network
+        self._start_chunked('text/plain; charset=utf-8')
+        for start in range(0, len(dump), 64 * 1024):
+            self._write_chunk(dump[start:start + 64 * 1024])
+        self._end_chunked()
+
+
+class FakeUithub(_FakeServer):
+    """Serves a generated repository dump of files x file_bytes for any /owner/repo path"""
+
+    handler_class = _UithubHandler
+
+    def __init__(self, port=0, files=40, file_bytes=4000, **kwargs):
+        super().__init__(port, **kwargs)
+        self.files = files
+        self.file_bytes = file_bytes
+
+
+class _GroqHandler(_Handler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if not self.path.endswith('/chat/completions'):
+            return self._send(404, json.dumps({'error': {'message': 'Not found'}}))
+        if self.server.count_request():
+            return self._send_rate_limited()
+
+        server = self.server
+        model = body.get('model', 'fake')
+        prompt_tokens = sum(estimate_tokens(m.get('content') or '') for m in body.get('messages', []))
+        text = (REVIEW_SENTENCE * (server.completion_chars // len(REVIEW_SENTENCE) + 1))[:server.completion_chars]
+        completion_id = f"chatcmpl-{next(server.ids)}"
+        # Latency until the first token
+        time.sleep(server.sample_latency())
+
+        if not body.get('stream'):
+            time.sleep(server.token_interval * server.chunks)
+            return self._send(200, json.dumps({
+                'id': completion_id,
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': text}, 'finish_reason': 'stop'}],
+                'usage': {
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': estimate_tokens(text),
+                    'total_tokens': prompt_tokens + estimate_tokens(text),
+                },
+            }))
+
+        self._start_chunked('text/event-stream')
+        size = max(1, len(text) // server.chunks)
+        for n, start in enumerate(range(0, len(text), size)):
+            if n:
+                time.sleep(server.token_interval)
+            chunk = {
+                'id': completion_id,
+                'object': 'chat.completion.chunk',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': text[start:start + size]}, 'finish_reason': None}],
+            }
+            self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+        self._write_chunk("data: [DONE]\n\n")
+        self._end_chunked()
+
+
+class FakeGroq(_FakeServer):
+    """
+    OpenAI-compatible chat completions endpoint as served by Groq, with or
+    without streaming. latency is the time to first token; the completion
+    is sent in chunks pieces token_interval seconds apart.
+    """
+
+    handler_class = _GroqHandler
+
+    def __init__(self, port=0, completion_chars=2000, chunks=20, token_interval=0.0, **kwargs):
+        super().__init__(port, **kwargs)
+        self.completion_chars = completion_chars
+        self.chunks = chunks
+        self.token_interval = token_interval
+        self.ids = itertools.count(1)
+
+
+def add_arguments(parser):
+    """Fake server options shared by this script and bench/load.py"""
+    parser.add_argument('--files', type=int, default=40, help='files per fake repository')
+    parser.add_argument('--file-bytes', type=int, default=4000, help='approximate size of each file')
+    parser.add_argument('--fetch-latency', default='0.05', help='UIthub latency distribution')
+    parser.add_argument('--llm-latency', default='lognormal:0.5,0.3', help='LLM time-to-first-token distribution')
+    parser.add_argument('--completion-chars', type=int, default=2000)
+    parser.add_argument('--stream-chunks', type=int, default=20)
+    parser.add_argument('--token-interval', type=float, default=0.01, help='seconds between streamed chunks')
+    parser.add_argument('--rate-limit-every', type=int, default=0, help='answer every n-th LLM call with a 429')
+    parser.add_argument('--fetch-rate-limit-every', type=int, default=0, help='answer every n-th fetch with a 429')
+    parser.add_argument('--retry-after', type=float, default=1, help='Retry-After seconds sent with injected 429s')
+    parser.add_argument('--seed', type=int, default=0)
+
+
+def start_fakes(args, uithub_port=0, groq_port=0):
+    """Start both fake servers from parsed add_arguments() options"""
+    uithub = FakeUithub(
+        uithub_port,
+        files=args.files,
+        file_bytes=args.file_bytes,
+        latency=args.fetch_latency,
+        rate_limit_every=args.fetch_rate_limit_every,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    ).start()
+    groq = FakeGroq(
+        groq_port,
+        completion_chars=args.completion_chars,
+        chunks=args.stream_chunks,
+        token_interval=args.token_interval,
+        latency=args.llm_latency,
+        rate_limit_every=args.rate_limit_every,
+        retry_after=args.retry_after,
+        seed=args.seed + 1,
+    ).start()
+    return uithub, groq
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run fake UIthub and Groq servers')
+    parser.add_argument('--uithub-port', type=int, default=8801)
+    parser.add_argument('--groq-port', type=int, default=8802)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    uithub, groq = start_fakes(args, args.uithub_port, args.groq_port)
+    print(f"UITHUB_BASE_URL={uithub.url}")
+    print(f"GROQ_BASE_URL={groq.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,289 @@
+"""
+Load driver for the review API.
+
+Starts the fake UIthub and Groq servers, launches app.py against them and
+measures /api/review at several concurrency levels:
+
+    python bench/load.py --levels 1,4,16 --requests 40 --output bench/results/baseline.json
+    python bench/load.py --compare bench/results/baseline.json
+
+Each level reports throughput and p50/p95/p99 latency. Results are written
+as JSON; --compare prints the change against an earlier run and exits with
+status 1 when p95 latency or throughput regress by more than --max-regression.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from fake_servers import add_arguments, start_fakes
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+# Generous limits so the scheduler measures the app, not the provider quota
+BENCH_RATE_LIMITS = {'llama-3.3-70b-versatile': {'rpm': 100000, 'tpm': 1000000000}}
+
+_local = threading.local()
+
+
+def _session():
+    if not hasattr(_local, 'session'):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list (None when empty)"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def start_app(uithub_url, groq_url, port, server='flask'):
+    """Launch app.py or async_app.py (via serve_app.py) against the fake servers and wait for /health"""
+    env = dict(os.environ)
+    env.update({
+        'UITHUB_BASE_URL': uithub_url,
+        'GROQ_BASE_URL': groq_url,
+        'GROQ_API_KEY': 'bench',
+        'REVIEW_PROVIDERS': 'groq',
+    })
+    # Cold reviews by default; export these to benchmark the caches instead
+    env.setdefault('REVIEW_CACHE_DIR', '')
+    env.setdefault('REVIEW_INCREMENTAL', '0')
+    # Keep benchmark reviews out of the developer's review history
+    env.setdefault('REVIEW_STORE_PATH', '')
+    env.setdefault('LLM_RATE_LIMITS', json.dumps(BENCH_RATE_LIMITS))
+    env.setdefault('LLM_BASE_BACKOFF', '0.2')
+
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BENCH_DIR, 'serve_app.py'), '--port', str(port), '--server', server],
+        cwd=ROOT_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    app_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The {server} app exited with status {process.returncode}")
+        try:
+            if requests.get(f"{app_url}/health", timeout=1).ok:
+                return process, app_url
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError(f'The {server} app did not become healthy within 30s')
+
+
+def review_once(app_url, github_url, endpoint, poll_interval, timeout):
+    """Run one review end to end; returns (ok, error)"""
+    session = _session()
+    deadline = time.monotonic() + timeout
+    if endpoint == 'stream':
+        with session.post(f"{app_url}/api/review/stream", json={'github_url': github_url},
+                          stream=True, timeout=timeout) as response:
+            event = None
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith('event: '):
+                    event = line[len('event: '):]
+                elif line.startswith('data: ') and event in ('done', 'error'):
+                    data = json.loads(line[len('data: '):])
+                    return event == 'done', data.get('error')
+        return False, 'stream ended without a done event'
+
+    response = session.post(f"{app_url}/api/review", json={'github_url': github_url}, timeout=timeout)
+    if response.status_code != 202:
+        return False, f"HTTP {response.status_code}"
+    status_url = app_url + response.json()['status_url']
+    while time.monotonic() < deadline:
+        job = session.get(status_url, timeout=timeout).json()
+        if job['status'] == 'completed':
+            return True, None
+        if job['status'] == 'failed':
+            return False, job.get('error')
+        time.sleep(poll_interval)
+    return False, 'timed out'
+
+
+def run_level(app_url, concurrency, total, args, run_id):
+    """Send total reviews with concurrency in flight and summarize latencies"""
+    def one(n):
+        if args.repos:
+            github_url = f"https://github.com/bench/shared-{n % args.repos}"
+        else:
+            # Unique repositories so every review misses the caches
+            github_url = f"https://github.com/bench/{run_id}-c{concurrency}-{n}"
+        started = time.perf_counter()
+        try:
+            ok, error = review_once(app_url, github_url, args.endpoint, args.poll_interval, args.timeout)
+        except requests.exceptions.RequestException as e:
+            ok, error = False, str(e)
+        return ok, error, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        outcomes = list(executor.map(one, range(total)))
+    wall = time.perf_counter() - started
+
+    latencies = [seconds * 1000 for ok, _, seconds in outcomes if ok]
+    errors = {}
+    for ok, error, _ in outcomes:
+        if not ok:
+            errors[error] = errors.get(error, 0) + 1
+
+    def ms(value):
+        return round(value, 1) if value is not None else None
+
+    return {
+        'concurrency': concurrency,
+        'requests': total,
+        'succeeded': len(latencies),
+        'failed': total - len(latencies),
+        'errors': errors,
+        'wall_s': round(wall, 3),
+        'throughput_rps': round(len(latencies) / wall, 3) if wall else 0,
+        'mean_ms': ms(sum(latencies) / len(latencies) if latencies else None),
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'max_ms': ms(max(latencies) if latencies else None),
+    }
+
+
+def print_levels(levels):
+    print(f"{'conc':>5} {'ok':>5} {'fail':>5} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for level in levels:
+        print(f"{level['concurrency']:>5} {level['succeeded']:>5} {level['failed']:>5} "
+              f"{level['throughput_rps']:>8} {level['p50_ms'] or '-':>9} {level['p95_ms'] or '-':>9} "
+              f"{level['p99_ms'] or '-':>9}")
+
+
+def compare(result, baseline, max_regression):
+    """Print per-level changes against a baseline run; True when nothing regressed"""
+    base_levels = {level['concurrency']: level for level in baseline['levels']}
+    passed = True
+    print(f"\nCompared with {baseline.get('name')} ({baseline.get('created')}):")
+    for level in result['levels']:
+        base = base_levels.get(level['concurrency'])
+        if base is None:
+            continue
+        changes = []
+        for key in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+            if base[key] and level[key] is not None:
+                changes.append(f"{key} {(level[key] - base[key]) / base[key]:+.1%}")
+        print(f"  concurrency {level['concurrency']}: " + ', '.join(changes))
+        if base['p95_ms'] and (level['p95_ms'] is None or level['p95_ms'] > base['p95_ms'] * (1 + max_regression)):
+            print(f"    p95 regressed beyond {max_regression:.0%}")
+            passed = False
+        if base['throughput_rps'] and level['throughput_rps'] < base['throughput_rps'] * (1 - max_regression):
+            print(f"    throughput regressed beyond {max_regression:.0%}")
+            passed = False
+    return passed
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark /api/review against fake UIthub and Groq servers')
+    parser.add_argument('--levels', default='1,4,8,16', help='comma-separated concurrency levels')
+    parser.add_argument('--requests', type=int, default=32, help='reviews per concurrency level')
+    parser.add_argument('--endpoint', choices=['review', 'stream'], default='review',
+                        help='queued job API (polled) or the SSE stream')
+    parser.add_argument('--repos', type=int, default=0,
+                        help='cycle through this many repositories (0 = every review is unique)')
+    parser.add_argument('--poll-interval', type=float, default=0.02)
+    parser.add_argument('--timeout', type=float, default=300)
+    parser.add_argument('--server', choices=['flask', 'async'], default='flask',
+                        help='serve app.py (threads) or async_app.py (ASGI on hypercorn)')
+    parser.add_argument('--app-url', help='benchmark an already running app instead of starting one')
+    parser.add_argument('--name', default='run')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare', help='baseline results JSON to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.2)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    process = None
+    fakes = ()
+    app_url = args.app_url
+    if not app_url:
+        fakes = start_fakes(args)
+        process, app_url = start_app(fakes[0].url, fakes[1].url, _free_port(), args.server)
+
+    run_id = uuid.uuid4().hex[:8]
+    try:
+        levels = []
+        for concurrency in [int(level) for level in args.levels.split(',')]:
+            print(f"Running {args.requests} reviews at concurrency {concurrency}...")
+            levels.append(run_level(app_url, concurrency, args.requests, args, run_id))
+        try:
+            app_stats = requests.get(f"{app_url}/api/stats", timeout=5).json()
+        except (requests.exceptions.RequestException, ValueError):
+            app_stats = None
+    finally:
+        if process:
+            process.terminate()
+            process.wait()
+        for server in fakes:
+            server.stop()
+
+    result = {
+        'name': args.name,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'config': {
+            key: value for key, value in vars(args).items()
+            if key not in ('output', 'compare', 'name', 'app_url')
+        },
+        'levels': levels,
+        'fake_servers': {'uithub': fakes[0].stats, 'groq': fakes[1].stats} if fakes else None,
+        'app_stats': app_stats,
+    }
+
+    print()
+    print_levels(levels)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('config', {}).get('levels') != result['config']['levels']:
+            print("Note: baseline was run with different concurrency levels")
+        if not compare(result, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
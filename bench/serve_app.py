@@ -0,0 +1,28 @@
+"""Run app.py (without the debug reloader) or async_app.py on hypercorn, for benchmarks"""
+import argparse
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--server', choices=['flask', 'async'], default='flask')
+    args = parser.parse_args()
+
+    if args.server == 'async':
+        from hypercorn.asyncio import serve
+        from hypercorn.config import Config
+
+        from async_app import app
+
+        config = Config()
+        config.bind = [f"127.0.0.1:{args.port}"]
+        config.backlog = 1024
+        asyncio.run(serve(app, config))
+    else:
+        from app import app
+
+        app.run(host='127.0.0.1', port=args.port, threaded=True, debug=False)
@@ -0,0 +1,167 @@
+"""
+Startup-time benchmark for the CLI and server entry points.
+
+Each target is started in a fresh interpreter several times and the wall
+time to import it (or to run a cheap command) is recorded, together with the
+slowest imports reported by `python -X importtime`:
+
+    python bench/startup.py --runs 10 --output bench/results/startup.json
+    python bench/startup.py --compare bench/results/startup.json
+
+--compare exits with status 1 when a target's median startup regresses by
+more than --max-regression.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+
+# name: python arguments; imports run the module body without starting anything
+TARGETS = {
+    'cli --help': ['cli.py', '--help'],
+    'import main': ['-c', 'import main'],
+    'import pipeline': ['-c', 'import pipeline'],
+    'import code_reviewer': ['-c', 'import code_reviewer'],
+    'import repo_readme': ['-c', 'import repo_readme'],
+    'import app': ['-c', 'import app'],
+    'import async_app': ['-c', 'import async_app'],
+}
+
+
+def _env():
+    env = dict(os.environ)
+    # Dummy credentials so modules that check for them still import
+    env.setdefault('GROQ_API_KEY', 'bench')
+    env['PYTHONDONTWRITEBYTECODE'] = '1'
+    return env
+
+
+def time_target(arguments, runs):
+    """Wall times in ms of runs fresh interpreters (None if the target fails)"""
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        completed = subprocess.run([sys.executable] + arguments, cwd=ROOT_DIR, env=_env(),
+                                   stdin=subprocess.DEVNULL, capture_output=True, text=True)
+        if completed.returncode != 0:
+            print(f"  failed: {completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else 'no output'}")
+            return None
+        times.append((time.perf_counter() - started) * 1000)
+    return times
+
+
+def _import_times(arguments):
+    """[(depth, module, cumulative ms)] from python -X importtime"""
+    completed = subprocess.run([sys.executable, '-X', 'importtime'] + arguments, cwd=ROOT_DIR, env=_env(),
+                               stdin=subprocess.DEVNULL, capture_output=True, text=True)
+    imports = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or line.count('|') != 2:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        imports.append((depth, name.strip(), round(int(cumulative) / 1000, 1)))
+    return imports
+
+
+def slowest_imports(arguments, top, startup_modules):
+    """[(module, cumulative ms)] of the slowest imports made by the target itself or its direct imports"""
+    imports = [(module, ms) for depth, module, ms in _import_times(arguments)
+               if depth <= 1 and module not in startup_modules]
+    return sorted(imports, key=lambda item: -item[1])[:top]
+
+
+def compare(result, baseline, max_regression):
+    """Print median changes against a baseline run; True when nothing regressed"""
+    base_targets = {target['name']: target for target in baseline['targets']}
+    passed = True
+    print(f"\nCompared with {baseline.get('name')} ({baseline.get('created')}):")
+    for target in result['targets']:
+        base = base_targets.get(target['name'])
+        if base is None or not base['median_ms'] or target['median_ms'] is None:
+            continue
+        change = (target['median_ms'] - base['median_ms']) / base['median_ms']
+        print(f"  {target['name']}: median {change:+.1%}")
+        if change > max_regression:
+            print(f"    startup regressed beyond {max_regression:.0%}")
+            passed = False
+    return passed
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure cold start time of the CLI and server entry points')
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per target')
+    parser.add_argument('--targets', help=f"comma-separated subset of: {', '.join(TARGETS)}")
+    parser.add_argument('--top', type=int, default=5, help='slowest imports listed per target')
+    parser.add_argument('--name', default='run')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare', help='baseline results JSON to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.2)
+    args = parser.parse_args()
+
+    names = [name.strip() for name in args.targets.split(',')] if args.targets else list(TARGETS)
+    unknown = [name for name in names if name not in TARGETS]
+    if unknown:
+        parser.error(f"Unknown targets: {', '.join(unknown)}")
+
+    # Bare interpreter startup, for reference; its imports are left out of every target's list
+    baseline_times = time_target(['-c', 'pass'], args.runs)
+    startup_modules = {module for _, module, _ in _import_times(['-c', 'pass'])}
+    print(f"{'python -c pass':<24} median {statistics.median(baseline_times):8.1f} ms")
+
+    targets = []
+    for name in names:
+        times = time_target(TARGETS[name], args.runs)
+        target = {
+            'name': name,
+            'median_ms': round(statistics.median(times), 1) if times else None,
+            'min_ms': round(min(times), 1) if times else None,
+            'slowest_imports': slowest_imports(TARGETS[name], args.top, startup_modules) if times else [],
+        }
+        targets.append(target)
+        if times:
+            imports = ', '.join(f"{module} {ms}" for module, ms in target['slowest_imports'])
+            print(f"{name:<24} median {target['median_ms']:8.1f} ms  min {target['min_ms']:8.1f} ms  [{imports}]")
+        else:
+            print(f"{name:<24} failed to start")
+
+    result = {
+        'name': args.name,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'git_commit': _git_commit(),
+        'python': platform.python_version(),
+        'runs': args.runs,
+        'interpreter_ms': round(statistics.median(baseline_times), 1),
+        'targets': targets,
+    }
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if not compare(result, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+Single entry point for the KnowFlux command-line tools and servers.
+
+    python cli.py review https://github.com/owner/repo
+    echo https://github.com/owner/repo | python cli.py readme
+    python cli.py pipeline ./checkout --tasks review,readme
+    python cli.py serve --async
+
+Only the module behind the chosen command is imported, so `--help` and short
+scripted runs do not pay for Flask, Quart or the LLM SDKs they never use.
+"""
+import importlib
+import sys
+
+# command: (module, help); each module has a main(argv) taking the remaining arguments
+COMMANDS = {
+    'review': ('main', 'review repositories with the configured LLM providers (batch and NDJSON output)'),
+    'pipeline': ('pipeline', 'fetch a repository once and run several tasks on it'),
+    'gemini-review': ('code_reviewer', 'stream a review from Gemini'),
+    'readme': ('repo_readme', 'stream a generated README.md from Gemini'),
+    'serve': (None, 'run the API server (--async for the ASGI server)'),
+}
+
+
+def usage():
+    lines = ['usage: python cli.py <command> [arguments]', '', 'commands:']
+    for name, (_, description) in COMMANDS.items():
+        lines.append(f"  {name:<14} {description}")
+    lines.append('')
+    lines.append("Run 'python cli.py <command> --help' for the command's options.")
+    return '\n'.join(lines)
+
+
+def serve(argv):
+    """Start app.py, or async_app.py with --async"""
+    if '-h' in argv or '--help' in argv:
+        print('usage: python cli.py serve [--async]')
+        return
+    module = importlib.import_module('async_app' if '--async' in argv else 'app')
+    module.main()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ('-h', '--help'):
+        print(usage())
+        return
+    command, args = argv[0], argv[1:]
+    if command not in COMMANDS:
+        print(usage(), file=sys.stderr)
+        sys.exit(f"\nUnknown command: {command}")
+
+    # Settings from .env must be in place before the command's modules read them at import
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    module_name = COMMANDS[command][0]
+    if module_name is None:
+        serve(args)
+    else:
+        importlib.import_module(module_name).main(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+import asyncio
+import itertools
+import os
+import random
+import threading
+
+from ingest import CHUNK_BYTES, StreamingIngest
+from llm_scheduler import create_scheduler, estimate_prompt_tokens
+from repo_files import estimate_tokens
+
+HTTP_POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', 10))
+HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 32))
+HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', 3))
+UITHUB_TIMEOUT = float(os.environ.get('UITHUB_TIMEOUT', 30))
+# Upper bound on the repository dump; anything beyond one chunk is reviewed with map-reduce
+UITHUB_MAX_TOKENS = int(os.environ.get('UITHUB_MAX_TOKENS', 100000))
+# Point at a local stand-in (see bench/fake_servers.py) for load tests
+UITHUB_BASE_URL = os.environ.get('UITHUB_BASE_URL', 'https://uithub.com').rstrip('/')
+LLM_MAX_CONNECTIONS = int(os.environ.get('LLM_MAX_CONNECTIONS', 32))
+# Connection limit of the async clients used by async_app.py (one event loop, many reviews)
+ASYNC_MAX_CONNECTIONS = int(os.environ.get('ASYNC_MAX_CONNECTIONS', 256))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_lock = threading.Lock()
+_session = None
+_groq_client = None
+_gemini_client = None
+_scheduler = None
+_async_http_client = None
+_async_groq_client = None
+
+
+def _build_retry():
+    from urllib3.util.retry import Retry
+    options = dict(
+        total=HTTP_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    try:
+        # Jitter spreads out retries from concurrent requests (urllib3 >= 2.0)
+        return Retry(backoff_jitter=0.5, **options)
+    except TypeError:
+        return Retry(**options)
+
+
+def get_session():
+    """Process-wide requests.Session with keep-alive connection pooling and retries"""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                # requests is imported on first use, which keeps it out of CLI and worker startup
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=HTTP_POOL_CONNECTIONS,
+                    pool_maxsize=HTTP_POOL_MAXSIZE,
+                    max_retries=_build_retry(),
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def uithub_url(github_url, max_tokens=None):
+    """Translate a GitHub repository URL into the UIthub plain-text API URL"""
+    url = github_url.replace("https://github.com/", UITHUB_BASE_URL + "/") + "?accept=text%2Fplain"
+    if max_tokens:
+        url += f"&maxTokens={max_tokens}"
+    return url
+
+
+def fetch_repo(github_url, max_tokens=None, budget=None, timeout=UITHUB_TIMEOUT):
+    """
+    Stream a repository dump from UIthub into an IngestResult.
+    Reading stops after max_tokens (or INGEST_MAX_BYTES) of dump, and with a
+    token budget only the most important files that fit it are kept.
+    """
+    ingest = StreamingIngest(budget=budget, max_tokens=max_tokens)
+    with get_session().get(uithub_url(github_url, max_tokens), timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        for chunk in response.iter_content(chunk_size=CHUNK_BYTES):
+            if not ingest.feed(chunk):
+                break
+    return ingest.finish()
+
+
+def _async_limits():
+    import httpx
+    return httpx.Limits(max_connections=ASYNC_MAX_CONNECTIONS, max_keepalive_connections=ASYNC_MAX_CONNECTIONS)
+
+
+def get_async_http_client():
+    """Shared httpx.AsyncClient for the async app (create it inside the running event loop)"""
+    global _async_http_client
+    if _async_http_client is None:
+        with _lock:
+            if _async_http_client is None:
+                import httpx
+                _async_http_client = httpx.AsyncClient(limits=_async_limits(), follow_redirects=True)
+    return _async_http_client
+
+
+async def fetch_repo_async(github_url, max_tokens=None, budget=None, timeout=UITHUB_TIMEOUT):
+    """fetch_repo() on the async client, with the same retries as the pooled session"""
+    client = get_async_http_client()
+    url = uithub_url(github_url, max_tokens)
+    for attempt in range(HTTP_RETRIES + 1):
+        async with client.stream('GET', url, timeout=timeout) as response:
+            if response.status_code not in RETRY_STATUSES or attempt == HTTP_RETRIES:
+                response.raise_for_status()
+                ingest = StreamingIngest(budget=budget, max_tokens=max_tokens)
+                async for chunk in response.aiter_bytes(CHUNK_BYTES):
+                    if not ingest.feed(chunk):
+                        break
+                return ingest.finish()
+            try:
+                delay = float(response.headers.get('retry-after'))
+            except (TypeError, ValueError):
+                delay = 0.5 * (2 ** attempt)
+        await asyncio.sleep(delay + random.uniform(0, 0.5))
+
+
+def get_groq_client():
+    """Shared Groq client (one connection pool for every caller)"""
+    global _groq_client
+    if _groq_client is None:
+        with _lock:
+            if _groq_client is None:
+                import httpx
+                from groq import DefaultHttpxClient, Groq
+                _groq_client = Groq(
+                    api_key=os.environ.get("GROQ_API_KEY"),
+                    # 429 retries are handled by the scheduler, with shared backoff
+                    max_retries=0,
+                    http_client=DefaultHttpxClient(
+                        limits=httpx.Limits(
+                            max_connections=LLM_MAX_CONNECTIONS,
+                            max_keepalive_connections=LLM_MAX_CONNECTIONS,
+                        ),
+                    ),
+                )
+    return _groq_client
+
+
+def get_async_groq_client():
+    """Shared AsyncGroq client for the async app"""
+    global _async_groq_client
+    if _async_groq_client is None:
+        with _lock:
+            if _async_groq_client is None:
+                from groq import AsyncGroq, DefaultAsyncHttpxClient
+                _async_groq_client = AsyncGroq(
+                    api_key=os.environ.get("GROQ_API_KEY"),
+                    max_retries=0,
+                    http_client=DefaultAsyncHttpxClient(limits=_async_limits()),
+                )
+    return _async_groq_client
+
+
+async def close_async_clients():
+    """Close the async HTTP connection pools (on server shutdown)"""
+    global _async_http_client, _async_groq_client
+    if _async_http_client is not None:
+        await _async_http_client.aclose()
+        _async_http_client = None
+    if _async_groq_client is not None:
+        await _async_groq_client.close()
+        _async_groq_client = None
+
+
+def get_gemini_client():
+    """Shared Gemini client"""
+    global _gemini_client
+    if _gemini_client is None:
+        with _lock:
+            if _gemini_client is None:
+                from google import genai
+                _gemini_client = genai.Client(
+                    api_key=os.environ.get("GEMINI_API_KEY"),
+                )
+    return _gemini_client
+
+
+def get_scheduler():
+    """Process-wide LLM rate-limit scheduler"""
+    global _scheduler
+    if _scheduler is None:
+        with _lock:
+            if _scheduler is None:
+                _scheduler = create_scheduler()
+    return _scheduler
+
+
+def groq_chat(messages, model, cancel=None, **kwargs):
+    """Groq chat completion routed through the rate-limit scheduler; cancel leaves its queue"""
+    return get_scheduler().run(
+        model,
+        estimate_prompt_tokens(messages),
+        lambda: get_groq_client().chat.completions.create(messages=messages, model=model, **kwargs),
+        cancel,
+    )
+
+
+def gemini_stream(model, contents, config, prompt_text='', cancel=None):
+    """
+    Gemini streaming generation routed through the rate-limit scheduler.
+    The first chunk is read inside the scheduler so that a 429, which the SDK
+    raises on iteration, is retried like any other rate-limited call.
+    """
+    def start():
+        stream = get_gemini_client().models.generate_content_stream(
+            model=model,
+            contents=contents,
+            config=config,
+        )
+        first = next(stream, None)
+        return itertools.chain([first] if first is not None else [], stream)
+
+    return get_scheduler().run(model, estimate_tokens(prompt_text), start, cancel)
+
+
+async def groq_chat_async(messages, model, **kwargs):
+    """groq_chat() on the async client"""
+    return await get_scheduler().run_async(
+        model,
+        estimate_prompt_tokens(messages),
+        lambda: get_async_groq_client().chat.completions.create(messages=messages, model=model, **kwargs),
+    )
+
+
+async def _prepend(first, stream):
+    if first is not None:
+        yield first
+    async for chunk in stream:
+        yield chunk
+
+
+async def gemini_stream_async(model, contents, config, prompt_text=''):
+    """gemini_stream() on the async Gemini API; returns an async iterator of chunks"""
+    async def start():
+        stream = await get_gemini_client().aio.models.generate_content_stream(
+            model=model,
+            contents=contents,
+            config=config,
+        )
+        return await anext(stream, None), stream
+
+    first, stream = await get_scheduler().run_async(model, estimate_tokens(prompt_text), start)
+    return _prepend(first, stream)
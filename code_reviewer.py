@@ -1,24 +1,19 @@
 # To run this code you need to install the following dependencies:
 # pip install google-genai
 
-import base64
-import os
-from google import genai
-import prompts
-import requests
-from google.genai import types
+import argparse
 from dotenv import load_dotenv
+# Settings from .env must be in place before the modules below read them at import
 load_dotenv()
-github_url = input("Github URL: ").replace("https://github.com/","https://uithub.com/") +"?accept=text%2Fplain"
-
-repo_code = requests.get(github_url).text
-
-def generate():
-    client = genai.Client(
-        api_key=os.environ.get("GEMINI_API_KEY"),
-    )
+import prompts
+from clients import gemini_stream
+from local_source import load_repo, read_source
+from packer import budget_for_model, format_omitted
+model = "gemini-2.5-pro"
 
-    model = "gemini-2.5-pro"
+def generate(repo_code):
+    # google-genai is only imported once there is something to generate
+    from google.genai import types
     contents = [
         types.Content(
             role="user",
@@ -37,12 +32,17 @@ def generate():
         ],
     )
 
-    for chunk in client.models.generate_content_stream(
-        model=model,
-        contents=contents,
-        config=generate_content_config,
-    ):
+    for chunk in gemini_stream(model, contents, generate_content_config, prompt_text=repo_code):
         print(chunk.text, end="")
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Review a repository with Gemini")
+    parser.add_argument("source", nargs="?",
+                        help="GitHub repository URL or local directory (read from stdin, or prompted for, when omitted)")
+    args = parser.parse_args(argv)
+    # Streamed (or read from a local directory) and capped at the model's token budget, keeping the most important files
+    fetched = load_repo(read_source(args.source), budget_for_model(model), budget_for_model(model))
+    generate(fetched.text + format_omitted(fetched.omitted))
+
 if __name__ == "__main__":
-    generate()
+    main()
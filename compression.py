@@ -0,0 +1,156 @@
+"""
+Precompressed static files and content-encoding negotiation, shared by
+app.py and async_app.py.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+
+try:
+    # Optional: brotli is only offered when the package is installed
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are not worth compressing
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+# Dynamic responses use cheaper settings than static files, which are compressed once
+COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 5))
+# Cache-Control for /static files (index.html is always revalidated, so new deploys show up at once)
+STATIC_MAX_AGE = int(os.environ.get('STATIC_MAX_AGE', 3600))
+
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml')
+# Never buffered: these are streamed to the client as they are produced
+STREAMING_TYPES = ('text/event-stream', 'application/x-ndjson')
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate_encoding(accept_encoding, encodings=None):
+    """Preferred encoding from encodings (best first) that Accept-Encoding allows, or None"""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    best, best_quality = None, 0.0
+    for encoding in available_encodings() if encodings is None else encodings:
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data, encoding, static=False):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if static else COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=9 if static else COMPRESS_GZIP_LEVEL, mtime=0)
+
+
+def is_compressible(mimetype):
+    return bool(mimetype) and mimetype.startswith(COMPRESSIBLE_TYPES) and not mimetype.startswith(STREAMING_TYPES)
+
+
+class StaticAsset:
+    """A file held in memory with its compressed variants and their strong ETags"""
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        with open(path, 'rb') as f:
+            data = f.read()
+        self.mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if self.mimetype.startswith('text/'):
+            self.mimetype += '; charset=utf-8'
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        # encoding -> (body, etag); each representation gets its own strong ETag
+        self.variants = {None: (data, f'"{digest}"')}
+        if is_compressible(self.mimetype) and len(data) >= COMPRESS_MIN_BYTES:
+            for encoding in available_encodings():
+                self.variants[encoding] = (compress(data, encoding, static=True), f'"{digest}-{encoding}"')
+
+    def response(self, request_headers, cache_control):
+        """(status, body, headers) for a GET with the given request headers"""
+        encoding = negotiate_encoding(request_headers.get('Accept-Encoding'),
+                                      [e for e in available_encodings() if e in self.variants])
+        body, etag = self.variants[encoding]
+        headers = {
+            'ETag': etag,
+            'Cache-Control': cache_control,
+            'Vary': 'Accept-Encoding',
+        }
+        if _etag_matches(request_headers.get('If-None-Match'), [tag for _, tag in self.variants.values()]):
+            return 304, b'', headers
+        headers['Content-Type'] = self.mimetype
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        return 200, body, headers
+
+
+def _etag_matches(if_none_match, etags):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    # If-None-Match uses weak comparison, so W/ prefixes added by proxies still match
+    candidates = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+    return any(etag in candidates for etag in etags)
+
+
+class StaticFiles:
+    """
+    Serves files below directory from memory: each file is read and
+    compressed once, and again only when its modification time changes
+    """
+
+    def __init__(self, directory):
+        self.directory = os.path.realpath(directory)
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, filename):
+        """Absolute path of filename, or None when it is missing or outside the directory"""
+        path = os.path.realpath(os.path.join(self.directory, filename))
+        if os.path.commonpath([self.directory, path]) != self.directory or not os.path.isfile(path):
+            return None
+        return path
+
+    def get(self, filename):
+        """StaticAsset for filename, or None when it does not exist"""
+        path = self.resolve(filename)
+        if path is None:
+            return None
+        with self._lock:
+            asset = self._assets.get(path)
+            if asset is None or asset.mtime != os.path.getmtime(path):
+                asset = self._assets[path] = StaticAsset(path)
+        return asset
+
+    def response(self, filename, request_headers, cache_control):
+        """(status, body, headers), or None when the file does not exist"""
+        asset = self.get(filename)
+        return asset.response(request_headers, cache_control) if asset is not None else None
+
+
+def compress_body(data, mimetype, request_headers):
+    """(encoding, compressed body) for a buffered response worth compressing, or None"""
+    if len(data) < COMPRESS_MIN_BYTES or not is_compressible(mimetype):
+        return None
+    encoding = negotiate_encoding(request_headers.get('Accept-Encoding'))
+    if encoding is None:
+        return None
+    compressed = compress(data, encoding)
+    return (encoding, compressed) if len(compressed) < len(data) else None
@@ -0,0 +1,122 @@
+import os
+import re
+import threading
+
+import prompts
+from review_cache import DiskCache, LayeredCache, MemoryCache, hash_text
+
+NO_FINDINGS = 'No notable findings.'
+# Cached findings are summarised to this many characters in the merge prompt
+SUMMARY_CHARS = int(os.environ.get('REVIEW_FINDINGS_SUMMARY_CHARS', 600))
+
+_HEADING_RE = re.compile(r'^#{2,4}\s+(.+?)\s*$', re.MULTILINE)
+_PART_RE = re.compile(r'\s*\(part \d+/\d+\)$')
+_LABEL_RE = re.compile(r'^(?:file|path)\s*:\s*', re.IGNORECASE)
+
+_lock = threading.Lock()
+_store = None
+
+
+def base_path(path):
+    """File path without the " (part i/n)" suffix added to split files"""
+    return _PART_RE.sub('', path)
+
+
+def heading_path(heading):
+    """
+    File path named by a findings heading, without the formatting models add
+    around it: "**File:** `./src/app.py` (part 1/2)" -> "src/app.py"
+    """
+    path = heading.replace('`', '').replace('**', '').strip()
+    path = _LABEL_RE.sub('', path)
+    path = base_path(path).strip().rstrip(':').strip()
+    if path.startswith('./'):
+        path = path[2:]
+    return path.lstrip('/')
+
+
+def split_findings(text):
+    """Split map-stage output into {path: findings} using its "### <path>" headings"""
+    matches = list(_HEADING_RE.finditer(text))
+    findings = {}
+    for n, match in enumerate(matches):
+        end = matches[n + 1].start() if n + 1 < len(matches) else len(text)
+        body = text[match.end():end].strip()
+        path = heading_path(match.group(1))
+        findings[path] = f"{findings[path]}\n{body}" if path in findings else body
+    return findings
+
+
+class FindingsStore:
+    """Per-file review findings keyed by file content hash, model and map prompt"""
+
+    def __init__(self, cache):
+        self.cache = cache
+        self._prompt_hash = hash_text(prompts.system_prompt_chunk_reviewer)
+
+    def key(self, record, model):
+        # The path is not part of the key so identical (e.g. vendored) files share findings
+        return hash_text(f"{hash_text(record.content)}:{model}:{self._prompt_hash}")
+
+    def get(self, record, model):
+        value, _ = self.cache.get(self.key(record, model))
+        return value['findings'] if value else None
+
+    def set(self, record, model, findings):
+        self.cache.set(self.key(record, model), {'findings': findings or NO_FINDINGS})
+
+    def remember(self, model, outputs):
+        """
+        Store findings for the records of each map chunk.
+        outputs is a list of (records_in_chunk, map_output). A file is only
+        stored when every chunk it appears in has a heading for it: a missing
+        heading means the output could not be matched, not that the file is clean.
+        """
+        found = {}
+        missing = set()
+        for chunk_records, output in outputs:
+            findings = split_findings(output)
+            for record in chunk_records:
+                if record.path in findings:
+                    found.setdefault(record.path, (record, []))[1].append(findings[record.path])
+                else:
+                    missing.add(record.path)
+        for path, (record, parts) in found.items():
+            if path not in missing:
+                self.set(record, model, '\n'.join(part for part in parts if part))
+
+
+def summarize_findings(cached):
+    """Compact "### path" summary of findings reused from earlier reviews"""
+    sections = []
+    for path, findings in sorted(cached.items()):
+        if len(findings) > SUMMARY_CHARS:
+            findings = findings[:SUMMARY_CHARS].rsplit('\n', 1)[0] + '\n* ...'
+        sections.append(f"### {path}\n{findings}")
+    return '\n\n'.join(sections)
+
+
+def get_findings_store():
+    """Process-wide findings store, or None when REVIEW_INCREMENTAL=0"""
+    global _store
+    if os.environ.get('REVIEW_INCREMENTAL', '1') == '0':
+        return None
+    if _store is None:
+        with _lock:
+            if _store is None:
+                ttl = int(os.environ.get('REVIEW_FINDINGS_TTL', 7 * 86400))
+                memory = MemoryCache(
+                    max_entries=int(os.environ.get('REVIEW_FINDINGS_MAX_ENTRIES', 10000)),
+                    max_bytes=int(os.environ.get('REVIEW_FINDINGS_MEMORY_BYTES', 32 * 1024 * 1024)),
+                    ttl=ttl,
+                )
+                directory = os.environ.get('REVIEW_FINDINGS_DIR', os.path.join('.cache', 'findings'))
+                disk = None
+                if directory:
+                    disk = DiskCache(
+                        directory,
+                        max_bytes=int(os.environ.get('REVIEW_FINDINGS_DISK_BYTES', 256 * 1024 * 1024)),
+                        ttl=ttl,
+                    )
+                _store = FindingsStore(LayeredCache(memory, disk))
+    return _store
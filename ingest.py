@@ -0,0 +1,138 @@
+import codecs
+import heapq
+import itertools
+import os
+import sys
+from dataclasses import dataclass, field
+
+from minify import create_minifier
+from packer import load_scoring, score_file
+from repo_files import DumpParser, render_records
+
+# Hard cap on the raw dump read per request, whatever the token limits say
+INGEST_MAX_BYTES = int(os.environ.get('INGEST_MAX_BYTES', 32 * 1024 * 1024))
+CHUNK_BYTES = 64 * 1024
+
+
+@dataclass
+class IngestResult:
+    """Files kept from a streamed repository dump, plus the ones left out"""
+    preamble: str
+    records: list
+    omitted: list = field(default_factory=list)  # (path, reason)
+    bytes_read: int = 0
+    truncated: bool = False
+    minify: dict = None  # MinifyStats.as_dict() when minification ran
+    commit: str = None  # commit SHA, when the source knows it
+
+    @property
+    def tokens_saved(self):
+        return self.minify['tokens_saved'] if self.minify else 0
+
+    @property
+    def text(self):
+        """The kept files as a UIthub-style dump"""
+        return render_records(self.records, self.preamble)
+
+
+class StreamingIngest:
+    """
+    Push-style ingestion of a UIthub dump: feed() raw bytes as they arrive.
+    Files are parsed as soon as their boundaries are seen. With a token
+    budget, excluded files are dropped at once and only the highest-scoring
+    files that fit the budget are kept, so memory stays around the budget
+    instead of the size of the repository. feed() returns False once
+    max_bytes or max_tokens of raw dump have been read. Files are minified
+    (see minify.py) before they are scored, so the budget holds more code.
+    """
+
+    def __init__(self, budget=None, max_bytes=INGEST_MAX_BYTES, max_tokens=None, scoring=None, minify=True):
+        self.budget = budget
+        self.max_bytes = max_bytes
+        self.max_chars = max_tokens * 4 if max_tokens else None
+        self.scoring = (scoring or load_scoring()) if budget else None
+        self.minifier = create_minifier() if minify else None
+        self.omitted = []
+        self.bytes_read = 0
+        self.chars_read = 0
+        self.truncated = False
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._parser = DumpParser(max_chars=budget * 4 if budget else None)
+        self._kept = []  # heap of (score, order, record)
+        self._kept_tokens = 0
+        self._order = itertools.count()
+
+    def feed(self, data):
+        """Add the next chunk of bytes; returns False when the rest should not be read"""
+        if self.truncated:
+            return False
+        if self.max_bytes and self.bytes_read + len(data) > self.max_bytes:
+            data = data[:self.max_bytes - self.bytes_read]
+            self.truncated = True
+        self.bytes_read += len(data)
+        text = self._decoder.decode(data)
+        if self.max_chars and self.chars_read + len(text) > self.max_chars:
+            text = text[:self.max_chars - self.chars_read]
+            self.truncated = True
+        self.chars_read += len(text)
+        self._add(self._parser.feed(text))
+        return not self.truncated
+
+    def add_records(self, records):
+        """Add FileRecords read some other way (a local checkout) to the same selection"""
+        self._add(records)
+
+    def finish(self):
+        """Finish the stream and return the IngestResult"""
+        if self.truncated:
+            # The file being read when the cap was hit is incomplete
+            if self._parser.current_path is not None:
+                self.omitted.append((self._parser.current_path, 'truncated'))
+                self._parser.abandon()
+            print(f"Stopped reading the repository dump after {self.bytes_read} bytes", file=sys.stderr)
+        else:
+            self._add(self._parser.feed(self._decoder.decode(b'', final=True)))
+        self._add(self._parser.close())
+
+        stats = self.minifier.stats if self.minifier else None
+        if stats and stats.files:
+            print(f"Minified {stats.files} files, saving {stats.tokens_saved} of {stats.tokens_before} tokens",
+                  file=sys.stderr)
+
+        kept = sorted(self._kept, key=lambda item: item[1])
+        return IngestResult(
+            self._parser.preamble,
+            [record for _, _, record in kept],
+            self.omitted,
+            bytes_read=self.bytes_read,
+            truncated=self.truncated,
+            minify=stats.as_dict() if stats else None,
+        )
+
+    def _add(self, records):
+        for path in self._parser.oversized:
+            self.omitted.append((path, 'over budget'))
+        self._parser.oversized.clear()
+
+        for record in records:
+            if self.minifier:
+                minified, reason = self.minifier.process(record)
+                if minified is None:
+                    self.omitted.append((record.path, reason))
+                    continue
+                record = minified
+            order = next(self._order)
+            if not self.budget or not record.path:
+                self._kept.append((float('inf'), order, record))
+                continue
+            score = score_file(record, self.scoring)
+            if score <= 0:
+                self.omitted.append((record.path, 'excluded'))
+                continue
+            heapq.heappush(self._kept, (score, order, record))
+            self._kept_tokens += record.tokens
+            # Evict the lowest-scoring files until the kept set fits the budget again
+            while self._kept_tokens > self.budget:
+                _, _, evicted = heapq.heappop(self._kept)
+                self._kept_tokens -= evicted.tokens
+                self.omitted.append((evicted.path, 'over budget'))
@@ -0,0 +1,330 @@
+import asyncio
+import collections
+import contextlib
+import contextvars
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+from metrics import LLM_QUEUE_SECONDS
+from repo_files import estimate_tokens
+
+# Provider limits per model (requests and tokens per minute); override with LLM_RATE_LIMITS
+DEFAULT_RATE_LIMITS = {
+    'llama-3.3-70b-versatile': {'rpm': 30, 'tpm': 12000},
+    'gemini-2.5-pro': {'rpm': 5, 'tpm': 250000},
+}
+FALLBACK_RATE_LIMITS = {'rpm': 30, 'tpm': 6000}
+
+# Tokens reserved for the completion when estimating the cost of a call
+COMPLETION_RESERVE = int(os.environ.get('LLM_COMPLETION_RESERVE', 1024))
+
+# Scheduler queue time of the calls made so far in the current thread or task
+_queued_seconds = contextvars.ContextVar('llm_queued_seconds', default=0.0)
+# Event set when the scheduler admits a call of the current thread or task
+_admission = contextvars.ContextVar('llm_admission', default=None)
+
+
+def queued_seconds():
+    """Seconds this thread or task has spent waiting in scheduler queues, for timing calls without it"""
+    return _queued_seconds.get()
+
+
+@contextlib.contextmanager
+def admission_event(event):
+    """Set event (threading or asyncio) once a call made inside the with block is admitted"""
+    token = _admission.set(event)
+    try:
+        yield
+    finally:
+        _admission.reset(token)
+
+
+class RateLimitedError(Exception):
+    """The provider kept rejecting a call (429) or the scheduler queue wait ran out"""
+    status_code = 429
+
+
+class CallCancelled(Exception):
+    """The caller gave up on a call while it was waiting in the queue"""
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at rate_per_minute"""
+
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.rate_per_minute = float(rate_per_minute)
+        self.tokens = float(rate_per_minute)
+        self.updated = time.monotonic()
+
+    def refill(self, rate_factor=1.0):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate_per_minute * rate_factor / 60)
+        self.updated = now
+
+    def wait_time(self, amount, rate_factor=1.0):
+        """Seconds until amount tokens are available (0 if they are now)"""
+        missing = amount - self.tokens
+        if missing <= 0:
+            return 0.0
+        return missing * 60 / (self.rate_per_minute * rate_factor)
+
+
+class _Ticket:
+    """A call waiting for its turn in a model's queue"""
+    __slots__ = ('tokens',)
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+
+
+class _ModelState:
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        # Calls are admitted first come, first served, so one review's map
+        # workers cannot keep starving another review's calls
+        self.queue = collections.deque()
+        self.rate_factor = 1.0  # adaptive multiplier, lowered after 429s
+        self.paused_until = 0.0
+        self.stats = {'calls': 0, 'rate_limited': 0, 'retries': 0, 'queued_seconds': 0.0, 'tokens_estimated': 0}
+
+
+def load_rate_limits():
+    """Per-model limits: DEFAULT_RATE_LIMITS updated with the JSON in LLM_RATE_LIMITS"""
+    limits = dict(DEFAULT_RATE_LIMITS)
+    if os.environ.get('LLM_RATE_LIMITS'):
+        limits.update(json.loads(os.environ['LLM_RATE_LIMITS']))
+    return limits
+
+
+def rate_limits_for(model, limits=None):
+    return (limits if limits is not None else load_rate_limits()).get(model, FALLBACK_RATE_LIMITS)
+
+
+def estimate_prompt_tokens(messages):
+    """Estimated prompt tokens for a list of chat messages"""
+    return sum(estimate_tokens(message['content']) for message in messages)
+
+
+def is_rate_limit_error(error):
+    """True for 429 errors from the Groq (status_code) or Gemini (code) SDKs"""
+    return getattr(error, 'status_code', None) == 429 or getattr(error, 'code', None) == 429
+
+
+def retry_after_seconds(error):
+    """Retry-After hint (in seconds) from a provider error response, if any"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    value = headers.get('retry-after') or headers.get('Retry-After')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class LLMScheduler:
+    """
+    Central gate for LLM calls: per-model request/token buckets, a FIFO
+    queue while over budget and adaptive backoff on 429 responses.
+    """
+
+    def __init__(self, limits=None, max_retries=5, base_backoff=1.0, max_queue_wait=300):
+        self.limits = limits or {}
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_queue_wait = max_queue_wait
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _state(self, model):
+        state = self._models.get(model)
+        if state is None:
+            limits = rate_limits_for(model, self.limits)
+            state = self._models[model] = _ModelState(limits['rpm'], limits['tpm'])
+        return state
+
+    def _enqueue(self, model, tokens):
+        with self._lock:
+            state = self._state(model)
+            # A single call larger than the whole minute budget waits for a full bucket
+            ticket = _Ticket(min(tokens, state.tokens.capacity))
+            state.queue.append(ticket)
+            return ticket
+
+    def _dequeue(self, model, ticket):
+        with self._lock:
+            queue = self._state(model).queue
+            if ticket in queue:
+                queue.remove(ticket)
+
+    def _try_acquire(self, model, ticket, started):
+        """
+        Take the ticket's request if it is first in line and the buckets allow
+        it; returns (tokens, 0) or (None, wait). Calls further back wait for
+        everything queued ahead of them, which is also what the queue wait
+        limit is checked against.
+        """
+        with self._lock:
+            state = self._state(model)
+            state.requests.refill(state.rate_factor)
+            state.tokens.refill(state.rate_factor)
+            position = state.queue.index(ticket)
+            ahead = sum(queued.tokens for queued in list(state.queue)[:position + 1])
+            wait = max(
+                state.paused_until - time.time(),
+                state.requests.wait_time(position + 1, state.rate_factor),
+                state.tokens.wait_time(ahead, state.rate_factor),
+            )
+            if position == 0 and wait <= 0:
+                state.queue.popleft()
+                state.requests.tokens -= 1
+                state.tokens.tokens -= ticket.tokens
+                state.stats['calls'] += 1
+                state.stats['tokens_estimated'] += ticket.tokens
+                queued = time.monotonic() - started
+                state.stats['queued_seconds'] += queued
+                LLM_QUEUE_SECONDS.observe(queued, model=model)
+                _queued_seconds.set(_queued_seconds.get() + queued)
+                admitted = _admission.get()
+                if admitted is not None:
+                    admitted.set()
+                return ticket.tokens, 0.0
+        if time.monotonic() - started + wait > self.max_queue_wait:
+            raise RateLimitedError(f'Rate limit queue wait for {model} exceeded {self.max_queue_wait}s')
+        # Not first in line yet: poll again shortly
+        return None, max(wait, 0.01)
+
+    def acquire(self, model, tokens, cancel=None):
+        """
+        Block until it is this call's turn and the model's buckets can take
+        tokens. Setting cancel (a threading.Event) takes the call out of the
+        queue with CallCancelled.
+        """
+        started = time.monotonic()
+        ticket = self._enqueue(model, tokens)
+        cancel = cancel or threading.Event()
+        try:
+            while True:
+                if cancel.is_set():
+                    raise CallCancelled(f'{model} call cancelled while queued')
+                reserved, wait = self._try_acquire(model, ticket, started)
+                if reserved is not None:
+                    return reserved
+                cancel.wait(min(wait, 1.0))
+        finally:
+            # Leaves the queue on admission, on errors and when the caller gives up
+            self._dequeue(model, ticket)
+
+    async def acquire_async(self, model, tokens):
+        """acquire() that waits on the event loop instead of blocking a thread"""
+        started = time.monotonic()
+        ticket = self._enqueue(model, tokens)
+        try:
+            while True:
+                reserved, wait = self._try_acquire(model, ticket, started)
+                if reserved is not None:
+                    return reserved
+                await asyncio.sleep(min(wait, 1.0))
+        finally:
+            # A cancelled review must not hold up the calls queued behind it
+            self._dequeue(model, ticket)
+
+    def reconcile(self, model, estimated, actual):
+        """Correct the token bucket once the real usage of a call is known"""
+        with self._lock:
+            self._state(model).tokens.tokens -= actual - estimated
+
+    def _on_rate_limited(self, model, error, attempt):
+        with self._lock:
+            state = self._state(model)
+            state.stats['rate_limited'] += 1
+            state.rate_factor = max(0.25, state.rate_factor * 0.5)
+            delay = retry_after_seconds(error)
+            if delay is None:
+                delay = self.base_backoff * (2 ** attempt)
+            delay += random.uniform(0, delay * 0.25)
+            # Hold off every caller of this model, not just the one that was rejected
+            state.paused_until = max(state.paused_until, time.time() + delay)
+            return delay
+
+    def _retry_delay(self, model, error, attempt):
+        """Record a 429 and return the backoff, or raise once retries are used up"""
+        delay = self._on_rate_limited(model, error, attempt)
+        if attempt == self.max_retries:
+            raise RateLimitedError(f'Rate limited by provider for {model}: {str(error)}') from error
+        print(f"Rate limited on {model}, retrying in {delay:.1f}s", file=sys.stderr)
+        with self._lock:
+            self._state(model).stats['retries'] += 1
+        return delay
+
+    def _on_success(self, model, reserved, result):
+        with self._lock:
+            state = self._state(model)
+            state.rate_factor = min(1.0, state.rate_factor + 0.1)
+        usage = getattr(result, 'usage', None)
+        total_tokens = getattr(usage, 'total_tokens', None)
+        if isinstance(total_tokens, int):
+            self.reconcile(model, reserved, total_tokens)
+        return result
+
+    def run(self, model, prompt_tokens, fn, cancel=None):
+        """
+        Run fn() under the model's rate limits, retrying 429s.
+        The call is charged prompt_tokens plus the completion reserve; if fn
+        returns an object with a .usage attribute the token bucket is
+        corrected with the real token count. cancel is passed to acquire().
+        """
+        estimated = prompt_tokens + COMPLETION_RESERVE
+        for attempt in range(self.max_retries + 1):
+            reserved = self.acquire(model, estimated, cancel)
+            try:
+                result = fn()
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    raise
+                # The next acquire() waits out the pause set for this model
+                self._retry_delay(model, e, attempt)
+                continue
+            return self._on_success(model, reserved, result)
+
+    async def run_async(self, model, prompt_tokens, fn):
+        """run() for async calls: fn() returns an awaitable"""
+        estimated = prompt_tokens + COMPLETION_RESERVE
+        for attempt in range(self.max_retries + 1):
+            reserved = await self.acquire_async(model, estimated)
+            try:
+                result = await fn()
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    raise
+                self._retry_delay(model, e, attempt)
+                continue
+            return self._on_success(model, reserved, result)
+
+    def stats(self):
+        with self._lock:
+            return {
+                model: dict(
+                    state.stats,
+                    rate_factor=round(state.rate_factor, 3),
+                    request_tokens_available=round(state.requests.tokens, 2),
+                    tokens_available=round(state.tokens.tokens),
+                    queued_calls=len(state.queue),
+                )
+                for model, state in self._models.items()
+            }
+
+
+def create_scheduler():
+    """Build the scheduler from environment configuration"""
+    return LLMScheduler(
+        limits=load_rate_limits(),
+        max_retries=int(os.environ.get('LLM_MAX_RETRIES', 5)),
+        base_backoff=float(os.environ.get('LLM_BASE_BACKOFF', 1.0)),
+        max_queue_wait=float(os.environ.get('LLM_MAX_QUEUE_WAIT', 300)),
+    )
@@ -0,0 +1,289 @@
+import os
+import posixpath
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from clients import fetch_repo
+from ingest import INGEST_MAX_BYTES, StreamingIngest
+from packer import score_file
+from repo_files import FileRecord
+
+# API requests may only review directories below this root; unset disables local_path
+LOCAL_REVIEW_ROOT = os.environ.get('LOCAL_REVIEW_ROOT', '')
+LOCAL_WALK_WORKERS = int(os.environ.get('LOCAL_WALK_WORKERS', 16))
+# Directory tree entries listed in the preamble
+TREE_MAX_ENTRIES = 500
+
+_ALWAYS_SKIPPED = {'.git', '.hg', '.svn'}
+
+
+def is_local_source(source):
+    """True when a review source is a directory path rather than a repository URL"""
+    return not source.startswith(('https://', 'http://'))
+
+
+def resolve_local_path(path, root=LOCAL_REVIEW_ROOT):
+    """
+    Absolute, symlink-free form of a path requested through the API, which
+    must be a directory inside root. Raises ValueError otherwise.
+    """
+    if not root:
+        raise ValueError('Local path reviews are disabled. Set LOCAL_REVIEW_ROOT to enable them.')
+    root = os.path.realpath(root)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise ValueError('Local path must be inside LOCAL_REVIEW_ROOT')
+    if not os.path.isdir(resolved):
+        raise ValueError(f'Local path is not a directory: {path}')
+    return resolved
+
+
+def _translate(pattern):
+    """Regex for a .gitignore glob (without the leading '!' or trailing '/')"""
+    parts = []
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            parts.append('(?:.*/)?')
+            i += 3
+        elif pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+        elif pattern[i] == '*':
+            parts.append('[^/]*')
+            i += 1
+        elif pattern[i] == '?':
+            parts.append('[^/]')
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 2:]:
+            end = pattern.index(']', i + 2)
+            body = pattern[i + 1:end]
+            parts.append('[' + ('^' + body[1:] if body.startswith('!') else body) + ']')
+            i = end + 1
+        else:
+            parts.append(re.escape(pattern[i]))
+            i += 1
+    return ''.join(parts)
+
+
+def parse_gitignore(text, base=''):
+    """[(base, regex, negate, dir_only), ...] for the patterns of a .gitignore in directory base"""
+    rules = []
+    for line in text.splitlines():
+        line = line.rstrip()
+        if not line or line.startswith('#'):
+            continue
+        negate = line.startswith('!')
+        if negate:
+            line = line[1:]
+        if line.startswith('\\'):
+            line = line[1:]
+        dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        if not line:
+            continue
+        # Patterns with a slash are relative to the .gitignore; others match at any depth
+        anchored = '/' in line
+        regex = _translate(line.lstrip('/'))
+        if not anchored:
+            regex = '(?:.*/)?' + regex
+        rules.append((base, re.compile(regex + '$'), negate, dir_only))
+    return rules
+
+
+def is_ignored(rules, path, is_dir):
+    """Whether the last matching rule ignores path (relative to the walked root)"""
+    ignored = False
+    for base, regex, negate, dir_only in rules:
+        if dir_only and not is_dir:
+            continue
+        if base:
+            if not path.startswith(base + '/'):
+                continue
+            relative = path[len(base) + 1:]
+        else:
+            relative = path
+        if regex.match(relative):
+            ignored = not negate
+    return ignored
+
+
+def _read_text(path):
+    try:
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            return f.read()
+    except OSError:
+        return ''
+
+
+def _scan_dir(root, directory, rules):
+    """(files [(path, size)], subdirectories [(path, rules)]) of one directory"""
+    gitignore = os.path.join(root, directory, '.gitignore')
+    if os.path.isfile(gitignore):
+        rules = rules + parse_gitignore(_read_text(gitignore), directory)
+
+    files, subdirs = [], []
+    try:
+        entries = list(os.scandir(os.path.join(root, directory)))
+    except OSError:
+        return files, subdirs
+    for entry in entries:
+        path = posixpath.join(directory, entry.name) if directory else entry.name
+        # Symlinks are skipped so a walk never leaves the requested tree
+        if entry.is_symlink():
+            continue
+        if entry.is_dir():
+            if entry.name not in _ALWAYS_SKIPPED and not is_ignored(rules, path, True):
+                subdirs.append((path, rules))
+        elif entry.is_file() and not is_ignored(rules, path, False):
+            files.append((path, entry.stat().st_size))
+    return files, subdirs
+
+
+def walk_local_repo(root, executor):
+    """Sorted [(relative path, size)] of the files under root that git would not ignore"""
+    rules = []
+    exclude = os.path.join(root, '.git', 'info', 'exclude')
+    if os.path.isfile(exclude):
+        rules = parse_gitignore(_read_text(exclude))
+
+    files = []
+    # Each level of the tree is scanned in parallel
+    level = [('', rules)]
+    while level:
+        next_level = []
+        for dir_files, subdirs in executor.map(lambda item: _scan_dir(root, *item), level):
+            files.extend(dir_files)
+            next_level.extend(subdirs)
+        level = next_level
+    return sorted(files)
+
+
+def git_head(root):
+    """Commit checked out in root, read from .git without running git (None if unknown)"""
+    git_dir = os.path.join(root, '.git')
+    try:
+        with open(os.path.join(git_dir, 'HEAD'), encoding='utf-8') as f:
+            head = f.read().strip()
+        if not head.startswith('ref: '):
+            return head or None
+        ref = head[len('ref: '):]
+        if os.path.isfile(os.path.join(git_dir, ref)):
+            with open(os.path.join(git_dir, ref), encoding='utf-8') as f:
+                return f.read().strip() or None
+        with open(os.path.join(git_dir, 'packed-refs'), encoding='utf-8') as f:
+            for line in f:
+                sha, _, name = line.strip().partition(' ')
+                if name == ref:
+                    return sha
+    except OSError:
+        pass
+    return None
+
+
+def _read_file(root, path, max_size):
+    """FileRecord for a text file, or (path, reason) when it is skipped"""
+    try:
+        with open(os.path.join(root, path), 'rb') as f:
+            data = f.read(max_size + 1) if max_size else f.read()
+    except OSError:
+        return path, 'unreadable'
+    if max_size and len(data) > max_size:
+        return path, 'over budget'
+    if b'\0' in data[:8192]:
+        return path, 'binary'
+    return FileRecord(path, data.decode('utf-8', errors='replace'))
+
+
+def render_tree(paths, max_entries=TREE_MAX_ENTRIES):
+    """UIthub-style directory tree of the given file paths"""
+    lines = []
+    seen = set()
+    for path in paths:
+        parts = path.split('/')
+        for depth in range(len(parts)):
+            prefix = '/'.join(parts[:depth + 1])
+            if prefix not in seen:
+                seen.add(prefix)
+                lines.append('│   ' * depth + '├── ' + parts[depth])
+    if len(lines) > max_entries:
+        lines = lines[:max_entries] + [f"... and {len(lines) - max_entries} more"]
+    return '\n'.join(lines)
+
+
+def read_local_repo(path, max_tokens=None, budget=None, max_bytes=INGEST_MAX_BYTES, workers=LOCAL_WALK_WORKERS):
+    """
+    Read a checked-out repository from disk into the same IngestResult as
+    fetch_repo(): files are walked and read in parallel, .gitignore rules
+    and binaries are skipped, and the records go through the same
+    minification, scoring and budget as a UIthub dump.
+    """
+    started = time.perf_counter()
+    root = os.path.abspath(path)
+    if not os.path.isdir(root):
+        raise FileNotFoundError(f"Not a directory: {path}")
+
+    ingest = StreamingIngest(budget=budget, max_bytes=max_bytes, max_tokens=max_tokens)
+    cap = min(max_bytes or float('inf'), max_tokens * 4 if max_tokens else float('inf'))
+    max_size = budget * 4 if budget else None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        files = walk_local_repo(root, executor)
+
+        # Same caps as the streamed dump: stop at max_bytes or max_tokens of raw text
+        selected = []
+        total = 0
+        for file_path, size in files:
+            # Lockfiles, vendored and build output are excluded by path alone, so are never read
+            if ingest.scoring and score_file(FileRecord(file_path, ''), ingest.scoring) <= 0:
+                ingest.omitted.append((file_path, 'excluded'))
+                continue
+            if total + size > cap:
+                ingest.truncated = True
+                ingest.omitted.append((file_path, 'truncated'))
+                break
+            selected.append(file_path)
+            total += size
+
+        records = []
+        for result in executor.map(lambda file_path: _read_file(root, file_path, max_size), selected):
+            if isinstance(result, FileRecord):
+                records.append(result)
+            else:
+                ingest.omitted.append(result)
+
+    ingest.add_records(records)
+    ingest.bytes_read = total
+    result = ingest.finish()
+    result.preamble = render_tree([file_path for file_path, _ in files])
+    result.commit = git_head(root)
+    print(f"Read {len(files)} local files from {root} in {(time.perf_counter() - started) * 1000:.0f} ms",
+          file=sys.stderr)
+    return result
+
+
+def read_source(source=None):
+    """
+    Repository for a CLI run: the source given on the command line, else the
+    first line piped to stdin, else asked for interactively
+    """
+    if source:
+        return source.strip()
+    if not sys.stdin.isatty():
+        source = sys.stdin.readline().strip()
+        if not source:
+            raise SystemExit('No GitHub URL or local path given on the command line or stdin')
+        return source
+    return input("Github URL or local path: ").strip()
+
+
+def load_repo(source, max_tokens=None, budget=None):
+    """
+    fetch_repo() for repository URLs and read_local_repo() for directories.
+    max_tokens only limits the UIthub download; local files are all scored.
+    """
+    if is_local_source(source):
+        return read_local_repo(source, budget=budget)
+    return fetch_repo(source, max_tokens, budget)
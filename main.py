@@ -1,29 +1,68 @@
-import prompts
-import os
-import requests
-from groq import Groq
+import argparse
+import json
+import sys
 from dotenv import load_dotenv
+# Settings from .env must be in place before the modules below read them at import
 load_dotenv()
-client = Groq(
-    api_key=os.environ.get("GROQ_API_KEY"),
-)
+from batch import run_batch
+from clients import UITHUB_MAX_TOKENS
+from local_source import load_repo, read_source
+from map_reduce import review_repository
+from packer import budget_for_model
+from providers import create_router
 
-github_url = input("Github URL: ").replace("https://github.com/","https://uithub.com/") +"?accept=text%2Fplain&maxTokens=5000"
+_router = None
 
-repo_code = requests.get(github_url).text
+def get_router():
+    # Groq by default; set REVIEW_PROVIDERS=groq,gemini to route/hedge across both.
+    # Built on first use, so importing this module stays cheap
+    global _router
+    if _router is None:
+        _router = create_router()
+    return _router
 
-chat_completion = client.chat.completions.create(
-    messages=[
-        {
-            "role": "system",
-            "content" : prompts.system_prompt_reviewer,
-        },
-        {
-            "role": "user",
-            "content": f"Please provide the review as mentioned for the code repository given below:\n{repo_code}",
-        }
-    ],
-    model="llama-3.3-70b-versatile",
-)
+def review(github_url):
+    router = get_router()
+    # Streamed from UIthub (or read from disk for a local directory); only the
+    # files that fit the model's token budget are kept in memory
+    fetched = load_repo(github_url, UITHUB_MAX_TOKENS, budget_for_model(router.primary.model))
+    repo_code = fetched.text
+    # Large repositories are split into chunks, reviewed in parallel and merged
+    review_text, plan = review_repository(
+        repo_code, router.complete, router.primary.model, omitted=fetched.omitted
+    )
+    return {
+        'review': review_text,
+        'content_length': len(repo_code),
+        'chunks': len(plan.chunks),
+        'omitted_files': len(plan.omitted),
+        'cached_files': len(plan.cached),
+    }
 
-print(chat_completion.choices[0].message.content)
\ No newline at end of file
+def read_urls(args):
+    """Repository URLs from the command line and/or a --batch file ("-" for stdin)"""
+    urls = list(args.urls)
+    if args.batch:
+        source = sys.stdin if args.batch == "-" else open(args.batch, encoding="utf-8")
+        with source:
+            urls.extend(line.strip() for line in source if line.strip() and not line.startswith("#"))
+    return urls
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AI code review for GitHub repositories")
+    parser.add_argument("urls", nargs="*",
+                        help="GitHub repository URLs or local directories (read from stdin, or prompted for, when omitted)")
+    parser.add_argument("--batch", help="file with one repository URL or directory per line, or - for stdin")
+    parser.add_argument("--concurrency", type=int, default=4, help="repositories reviewed in parallel")
+    args = parser.parse_args(argv)
+
+    urls = read_urls(args)
+    if not urls:
+        print(review(read_source())["review"])
+    else:
+        # Non-interactive mode: one NDJSON line per repository, then a summary
+        for entry in run_batch(urls, review, args.concurrency):
+            print(json.dumps(entry), flush=True)
+
+if __name__ == "__main__":
+    main()
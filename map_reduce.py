@@ -0,0 +1,252 @@
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import prompts
+from file_findings import get_findings_store, summarize_findings
+from packer import budget_for_model, format_omitted, pack_records
+from repo_files import FileRecord, estimate_tokens, parse_dump, render_record
+
+CHUNK_TOKENS = int(os.environ.get('REVIEW_CHUNK_TOKENS', 8000))
+MAP_WORKERS = int(os.environ.get('REVIEW_MAP_WORKERS', 4))
+
+
+@dataclass
+class ReviewPlan:
+    """What will be sent for a review: rendered chunks plus the files left out"""
+    preamble: str
+    chunks: list
+    omitted: list
+    model: str = None
+    chunk_records: list = field(default_factory=list)  # source records in each chunk
+    cached: dict = field(default_factory=dict)  # path -> findings reused from earlier reviews
+
+
+def _split_record(record, max_tokens):
+    """Split a file that is larger than a chunk into line-aligned parts"""
+    lines = record.content.split('\n')
+    parts = []
+    current = []
+    current_tokens = 0
+    for line in lines:
+        line_tokens = estimate_tokens(line)
+        if current and current_tokens + line_tokens > max_tokens:
+            parts.append(current)
+            current, current_tokens = [], 0
+        current.append(line)
+        current_tokens += line_tokens
+    if current:
+        parts.append(current)
+
+    if len(parts) == 1:
+        return [record]
+    return [
+        FileRecord(f"{record.path} (part {n}/{len(parts)})", '\n'.join(part))
+        for n, part in enumerate(parts, 1)
+    ]
+
+
+def group_chunks(records, max_tokens=CHUNK_TOKENS):
+    """
+    Group file records into rendered chunks of at most ~max_tokens each.
+    Files are kept in path order so a chunk holds neighbouring files from
+    the same directory; oversized files are split across chunks.
+    Returns [(source_records, rendered_text), ...].
+    """
+    groups = []
+    current, current_records = [], []
+    current_tokens = 0
+    for record in sorted(records, key=lambda r: r.path):
+        for piece in _split_record(record, max_tokens):
+            text = render_record(piece)
+            tokens = estimate_tokens(text)
+            if current and current_tokens + tokens > max_tokens:
+                groups.append((current_records, ''.join(current)))
+                current, current_records, current_tokens = [], [], 0
+            current.append(text)
+            if not current_records or current_records[-1] is not record:
+                current_records.append(record)
+            current_tokens += tokens
+    if current:
+        groups.append((current_records, ''.join(current)))
+    return groups
+
+
+def build_review_messages(repo_code, system_prompt=None):
+    """Chat messages for a single-pass review of a repository dump"""
+    return [
+        {
+            "role": "system",
+            "content": system_prompt or prompts.system_prompt_reviewer,
+        },
+        {
+            "role": "user",
+            "content": f"Please provide the review as mentioned for the code repository given below:\n{repo_code}",
+        }
+    ]
+
+
+def build_chunk_messages(chunk, index, total):
+    """Chat messages for the map stage: findings for one part of the repository"""
+    return [
+        {
+            "role": "system",
+            "content": prompts.system_prompt_chunk_reviewer,
+        },
+        {
+            "role": "user",
+            "content": f"This is part {index} of {total} of the code repository:\n{chunk}",
+        }
+    ]
+
+
+def build_reduce_messages(partials, preamble='', system_prompt=None, omitted=None, cached=None):
+    """Chat messages for the reduce stage: merge partial findings into one review"""
+    sections = '\n\n'.join(
+        f"## Findings for part {n} of {len(partials)}\n{findings}"
+        for n, findings in enumerate(partials, 1)
+    )
+    if cached:
+        unchanged = f"## Findings for unchanged files (from an earlier review)\n{summarize_findings(cached)}"
+        sections = f"{sections}\n\n{unchanged}" if sections else unchanged
+    structure = f"Repository structure:\n{preamble}\n\n" if preamble else ''
+    return [
+        {
+            "role": "system",
+            "content": system_prompt or prompts.system_prompt_reviewer,
+        },
+        {
+            "role": "user",
+            "content": (
+                "The code repository was reviewed in parts: each part was reviewed separately "
+                "and findings for files unchanged since an earlier review were reused. Merge the "
+                "findings below into a single review of the whole repository, as mentioned.\n\n"
+                f"{structure}{sections}{format_omitted(omitted or [])}"
+            ),
+        }
+    ]
+
+
+def map_chunks(chunks, complete, max_workers=MAP_WORKERS):
+    """Review chunks concurrently with complete(messages) -> text, preserving order"""
+    if len(chunks) == 1:
+        return [complete(build_chunk_messages(chunks[0], 1, 1))]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+        futures = [
+            executor.submit(complete, build_chunk_messages(chunk, n, len(chunks)))
+            for n, chunk in enumerate(chunks, 1)
+        ]
+        return [future.result() for future in futures]
+
+
+async def map_chunks_async(chunks, complete, max_concurrency=MAP_WORKERS):
+    """map_chunks() for an async complete(messages), preserving order"""
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def review(n, chunk):
+        async with semaphore:
+            return await complete(build_chunk_messages(chunk, n, len(chunks)))
+
+    return await asyncio.gather(*(review(n, chunk) for n, chunk in enumerate(chunks, 1)))
+
+
+def plan_review(repo_code, model=None, max_tokens=CHUNK_TOKENS, omitted=()):
+    """
+    Parse a repository dump, pack the most important files into the model's
+    token budget and group them into chunks of at most ~max_tokens.
+    Files whose content was reviewed before reuse their cached findings and
+    are left out of the chunks. omitted lists (path, reason) for files that
+    were already dropped while the dump was fetched.
+    """
+    preamble, records = parse_dump(repo_code)
+    packed = pack_records(records, budget_for_model(model))
+    packed.omitted[:0] = omitted
+    if packed.omitted:
+        print(f"Packed {len(packed.included)} files ({packed.tokens} tokens), left out {len(packed.omitted)}",
+              file=sys.stderr)
+    if estimate_tokens(preamble) > max_tokens // 4:
+        # The directory tree of a huge repository would crowd out the code
+        preamble = ''
+
+    store = get_findings_store()
+    cached = {}
+    fresh = []
+    for record in packed.included:
+        findings = store.get(record, model) if store and record.path else None
+        if findings is None:
+            fresh.append(record)
+        else:
+            cached[record.path] = findings
+    if cached:
+        print(f"Reusing findings for {len(cached)} unchanged files, reviewing {len(fresh)}", file=sys.stderr)
+
+    groups = group_chunks(fresh, max_tokens)
+    return ReviewPlan(
+        preamble,
+        [text for _, text in groups],
+        packed.omitted,
+        model=model,
+        chunk_records=[chunk_records for chunk_records, _ in groups],
+        cached=cached,
+    )
+
+
+def final_messages(plan, complete, max_workers=MAP_WORKERS):
+    """
+    Messages for the last (user-facing) call of a review.
+    Plans that fit in one chunk with no cached findings to merge go straight
+    to the reviewer prompt. Otherwise the map stage runs over the changed
+    files and the reduce messages are returned.
+    """
+    if _single_pass(plan):
+        return _single_pass_messages(plan)
+
+    partials = []
+    if plan.chunks:
+        print(f"Reviewing repository in {len(plan.chunks)} chunks", file=sys.stderr)
+        partials = map_chunks(plan.chunks, complete, max_workers)
+    return _reduce_messages(plan, partials)
+
+
+async def final_messages_async(plan, complete, max_concurrency=MAP_WORKERS):
+    """final_messages() for an async complete(messages)"""
+    if _single_pass(plan):
+        return _single_pass_messages(plan)
+
+    partials = []
+    if plan.chunks:
+        print(f"Reviewing repository in {len(plan.chunks)} chunks", file=sys.stderr)
+        partials = await map_chunks_async(plan.chunks, complete, max_concurrency)
+    # Storing findings touches the disk cache, so keep it off the event loop
+    return await asyncio.to_thread(_reduce_messages, plan, partials)
+
+
+def _single_pass(plan):
+    return len(plan.chunks) <= 1 and not plan.cached
+
+
+def _single_pass_messages(plan):
+    repo_code = (plan.preamble + '\n\n' if plan.preamble else '') + ''.join(plan.chunks)
+    return build_review_messages(repo_code + format_omitted(plan.omitted))
+
+
+def _reduce_messages(plan, partials):
+    """Remember the map findings per file and build the reduce messages"""
+    store = get_findings_store()
+    if store and partials:
+        store.remember(plan.model, zip(plan.chunk_records, partials))
+    return build_reduce_messages(partials, plan.preamble, omitted=plan.omitted, cached=plan.cached)
+
+
+def review_repository(repo_code, complete, model=None, max_tokens=CHUNK_TOKENS, max_workers=MAP_WORKERS, omitted=()):
+    """
+    Review a repository dump of any size.
+    The dump is split into chunks, reviewed in parallel (map) and merged with
+    one more call (reduce); dumps that fit in one chunk get a single call
+    unless findings cached from earlier reviews have to be merged in.
+    Returns (review_text, plan).
+    """
+    plan = plan_review(repo_code, model, max_tokens, omitted)
+    return complete(final_messages(plan, complete, max_workers)), plan
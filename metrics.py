@@ -0,0 +1,163 @@
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    @contextmanager
+    def track(self, **labels):
+        """Increment for the duration of a with block"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for n, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][n] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, state in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, state['counts']):
+                    cumulative += count
+                    labels = _format_labels(self.labelnames, key, ('le', _format_value(float(bound))))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {repr(state['sum'])}")
+                lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+def render_metrics():
+    """All registered metrics in the Prometheus text exposition format"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def stage_timer(timings, stage, histogram=None, **labels):
+    """
+    Time a block, storing milliseconds in timings[f"{stage}_ms"] and
+    observing seconds in histogram (if given).
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        timings[f"{stage}_ms"] = round(timings.get(f"{stage}_ms", 0) + elapsed * 1000, 1)
+        if histogram is not None:
+            histogram.observe(elapsed, **labels)
+
+
+# Review pipeline metrics
+FETCH_SECONDS = Histogram('knowflux_fetch_seconds', 'Repository fetch latency in seconds')
+LLM_SECONDS = Histogram('knowflux_llm_seconds', 'LLM call latency in seconds, excluding rate limit queueing', ['provider'])
+LLM_TTFT_SECONDS = Histogram('knowflux_llm_time_to_first_token_seconds', 'Time to first LLM token in seconds, excluding rate limit queueing', ['provider'])
+LLM_QUEUE_SECONDS = Histogram('knowflux_llm_queue_seconds', 'Time LLM calls waited on rate limits in seconds', ['model'])
+REVIEW_SECONDS = Histogram('knowflux_review_seconds', 'End-to-end review latency in seconds', ['cache'])
+PROMPT_TOKENS = Counter('knowflux_llm_prompt_tokens_total', 'Prompt tokens sent to LLM providers (estimated)', ['provider'])
+COMPLETION_TOKENS = Counter('knowflux_llm_completion_tokens_total', 'Completion tokens received from LLM providers (estimated)', ['provider'])
+CACHE_LOOKUPS = Counter('knowflux_review_cache_lookups_total', 'Review cache lookups by result', ['result'])
+FETCH_CACHE_LOOKUPS = Counter('knowflux_fetch_cache_lookups_total', 'Prefetched repository cache lookups by result', ['result'])
+MINIFY_TOKENS_SAVED = Counter('knowflux_minify_tokens_saved_total', 'Repository tokens removed before prompting (estimated)', ['step'])
+ERRORS = Counter('knowflux_errors_total', 'Errors by pipeline stage', ['stage'])
+REVIEWS_IN_FLIGHT = Gauge('knowflux_reviews_in_flight', 'Reviews and pipelines currently being processed')
@@ -0,0 +1,341 @@
+import json
+import os
+import posixpath
+import re
+import threading
+from dataclasses import dataclass, field
+
+from metrics import MINIFY_TOKENS_SAVED
+from repo_files import FileRecord, estimate_tokens
+
+DEFAULT_MINIFY = {
+    # Steps run on every file, in this order; remove a step to disable it. 'comments' is
+    # opt-in: the reviewer grades comments and docstrings, so they are sent by default
+    'steps': ['boilerplate', 'generated', 'license', 'blobs', 'whitespace', 'duplicates'],
+    # Comments containing one of these words are kept by the 'comments' step
+    'keep_comment_words': ['TODO', 'FIXME', 'XXX', 'HACK', 'SAFETY'],
+    # Files at least this similar (estimated Jaccard over their lines) to an earlier file are dropped
+    'duplicate_threshold': 0.9,
+    # Files with fewer distinct lines are never treated as duplicates
+    'duplicate_min_lines': 5,
+    # Runs of base64/hex-looking characters at least this long are replaced by a placeholder
+    'blob_min_chars': 400,
+    # A file is minified when a line is this long and the average line is longer than minified_avg_line
+    'minified_line_chars': 1000,
+    'minified_avg_line': 200,
+}
+
+_STRING = r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\''
+_C_BLOCK = r'/\*[\s\S]*?\*/'
+_HASH_LINE = r'(?<!\S)#[^\n]*'
+
+# (string pattern, comment pattern) per language
+LANGUAGES = {
+    'python': (r'[rRbBuUfF]{0,2}(?:"""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\'|' + _STRING + ')', r'#[^\n]*'),
+    'c': (_STRING + r'|`(?:\\.|[^`\\])*`', r'//[^\n]*|' + _C_BLOCK),
+    # Rust lifetimes ('a) look like unterminated char literals, so those are kept short
+    'rust': (r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\\n]){1,8}\'', r'//[^\n]*|' + _C_BLOCK),
+    'hash': (_STRING, _HASH_LINE),
+    'sql': (_STRING, r'--[^\n]*|' + _C_BLOCK),
+    'lua': (_STRING, r'--\[\[[\s\S]*?\]\]|--[^\n]*'),
+    'css': (_STRING, _C_BLOCK),
+    'markup': (None, r'<!--[\s\S]*?-->'),
+}
+
+EXTENSION_LANGUAGES = {
+    '.py': 'python', '.pyi': 'python',
+    '.js': 'c', '.jsx': 'c', '.mjs': 'c', '.cjs': 'c', '.ts': 'c', '.tsx': 'c',
+    '.go': 'c', '.java': 'c', '.kt': 'c', '.kts': 'c', '.scala': 'c', '.swift': 'c',
+    '.c': 'c', '.h': 'c', '.cc': 'c', '.cpp': 'c', '.hpp': 'c', '.cs': 'c', '.m': 'c',
+    '.php': 'c', '.dart': 'c', '.groovy': 'c', '.proto': 'c',
+    '.rs': 'rust',
+    '.sh': 'hash', '.bash': 'hash', '.zsh': 'hash', '.rb': 'hash', '.pl': 'hash', '.r': 'hash',
+    '.yaml': 'hash', '.yml': 'hash', '.toml': 'hash', '.cfg': 'hash', '.ini': 'hash', '.tf': 'hash',
+    '.sql': 'sql', '.lua': 'lua',
+    '.css': 'css', '.scss': 'css', '.less': 'css',
+    '.html': 'markup', '.htm': 'markup', '.xml': 'markup', '.svg': 'markup', '.vue': 'markup', '.svelte': 'markup',
+}
+FILENAME_LANGUAGES = {
+    'dockerfile': 'hash', 'makefile': 'hash', 'cmakelists.txt': 'hash', 'gemfile': 'hash',
+    'rakefile': 'hash', '.gitignore': 'hash', '.dockerignore': 'hash', '.env.example': 'hash',
+}
+
+_LICENSE_RE = re.compile(r'copyright|\blicen[cs]e|spdx-license-identifier|all rights reserved', re.IGNORECASE)
+_LICENSE_FILE_RE = re.compile(r'^(?:licen[cs]e|copying|unlicense)(?:[.-][\w.]+)?$', re.IGNORECASE)
+_BOILERPLATE_FILE_RE = re.compile(r'^code_of_conduct(?:\.\w+)?$', re.IGNORECASE)
+_GENERATED_RE = re.compile(
+    r'@generated|do not edit|auto-?generated|automatically generated|code generated by|this file (?:was|is) generated',
+    re.IGNORECASE,
+)
+_BINARY_RE = re.compile('[\x00-\x08\x0e-\x1f\ufffd]')
+_BLOB_PATTERN = r'[A-Za-z0-9+/=]{%d,}'
+# More than two blank lines in a row; two are kept, as PEP 8 asks for between definitions
+_BLANK_RUN_RE = re.compile(r'\n{4,}')
+
+# One-permutation MinHash signatures of 32 bins, split into 8 bands of 4 for candidate lookup
+_SIGNATURE_BINS = 32
+_BAND_ROWS = 4
+
+_lock = threading.Lock()
+_compiled = {}
+
+
+@dataclass
+class MinifyStats:
+    """Token estimates before and after minification, for one review"""
+    files: int = 0
+    dropped: int = 0
+    tokens_before: int = 0
+    tokens_after: int = 0
+    saved_by_step: dict = field(default_factory=dict)
+
+    @property
+    def tokens_saved(self):
+        return self.tokens_before - self.tokens_after
+
+    def as_dict(self):
+        return {
+            'files': self.files,
+            'dropped_files': self.dropped,
+            'tokens_before': self.tokens_before,
+            'tokens_after': self.tokens_after,
+            'tokens_saved': self.tokens_saved,
+            'saved_by_step': dict(self.saved_by_step),
+        }
+
+
+def load_minify_config():
+    """
+    Default minification settings merged with overrides from the JSON file in
+    REVIEW_MINIFY_CONFIG. REVIEW_MINIFY=0 disables every step; a
+    comma-separated list of step names runs only those.
+    """
+    config = dict(DEFAULT_MINIFY)
+    config_path = os.environ.get('REVIEW_MINIFY_CONFIG')
+    if config_path:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config.update(json.load(f))
+    steps = os.environ.get('REVIEW_MINIFY', '1').strip()
+    if steps in ('0', 'false', 'off', ''):
+        config['steps'] = []
+    elif steps not in ('1', 'true', 'on'):
+        config['steps'] = [step.strip() for step in steps.split(',') if step.strip()]
+    return config
+
+
+def create_minifier(config=None):
+    """A Minifier for one review, or None when minification is disabled"""
+    config = config or load_minify_config()
+    return Minifier(config) if config['steps'] else None
+
+
+def language_for(path):
+    """Comment syntax family for a path, or None when unknown"""
+    name = posixpath.basename(path).lower()
+    if name in FILENAME_LANGUAGES:
+        return FILENAME_LANGUAGES[name]
+    return EXTENSION_LANGUAGES.get(posixpath.splitext(name)[1])
+
+
+def _patterns(language):
+    """(scanner, header) regexes for a language, compiled once"""
+    with _lock:
+        if language not in _compiled:
+            string, comment = LANGUAGES[language]
+            scanner = f'(?P<comment>{comment})'
+            if string:
+                scanner = f'(?P<string>{string})|' + scanner
+            header = rf'(?:[ \t]*(?:{comment})[ \t]*(?:\n|\Z)|[ \t]*\n)+'
+            _compiled[language] = (re.compile(scanner), re.compile(header))
+        return _compiled[language]
+
+
+def _split_shebang(content):
+    if content.startswith('#!'):
+        end = content.find('\n') + 1 or len(content)
+        return content[:end], content[end:]
+    return '', content
+
+
+def detect_unreviewable(content, config=DEFAULT_MINIFY):
+    """'binary', 'generated' or 'minified' when a file is not worth reviewing, else None"""
+    sample = content[:8192]
+    if sample and len(_BINARY_RE.findall(sample)) > len(sample) * 0.05:
+        return 'binary'
+    # Generators announce themselves in the first few lines
+    if _GENERATED_RE.search('\n'.join(content.split('\n', 5)[:5])):
+        return 'generated'
+    if len(content) > config['minified_line_chars']:
+        lines = content.split('\n')
+        if (len(content) / len(lines) > config['minified_avg_line']
+                and max(len(line) for line in lines) >= config['minified_line_chars']):
+            return 'minified'
+    return None
+
+
+def strip_license_header(content, language):
+    """Remove a leading comment block that reads like a license or copyright notice"""
+    if language not in LANGUAGES:
+        return content
+    shebang, body = _split_shebang(content)
+    match = _patterns(language)[1].match(body)
+    if match and _LICENSE_RE.search(match.group()):
+        return shebang + body[match.end():]
+    return content
+
+
+def strip_comments(content, language, keep_words=()):
+    """
+    Remove comments outside string literals. Comments mentioning one of
+    keep_words (TODO, FIXME, ...) and a leading shebang are kept, and lines
+    left empty by the removal are dropped.
+    """
+    if language not in LANGUAGES:
+        return content
+    keep = re.compile('|'.join(re.escape(word) for word in keep_words)) if keep_words else None
+    shebang, body = _split_shebang(content)
+
+    def replace(match):
+        if match.lastgroup != 'comment' or (keep and keep.search(match.group())):
+            return match.group()
+        # Keep the line breaks of block comments, so the stripped text splits into the same
+        # lines as the original and the lines emptied by the removal can be dropped below
+        return '\n' * match.group().count('\n')
+
+    stripped = _patterns(language)[0].sub(replace, body)
+    lines = [
+        new for old, new in zip(body.split('\n'), stripped.split('\n'))
+        if new.strip() or not old.strip()
+    ]
+    return shebang + '\n'.join(lines)
+
+
+def replace_blobs(content, min_chars=DEFAULT_MINIFY['blob_min_chars']):
+    """Replace long base64/hex runs (embedded images, keys, fixtures) with a short placeholder"""
+    def replace(match):
+        text = match.group()
+        if not (re.search(r'[A-Za-z]', text) and re.search(r'\d', text)):
+            return text
+        return f'<{len(text)} characters of encoded data>'
+    return re.sub(_BLOB_PATTERN % min_chars, replace, content)
+
+
+def collapse_whitespace(content):
+    """Strip trailing whitespace and collapse runs of more than two blank lines to two"""
+    lines = [line.rstrip() for line in content.split('\n')]
+    return _BLANK_RUN_RE.sub('\n\n\n', '\n'.join(lines)).strip('\n')
+
+
+def _signature(content):
+    """
+    (distinct lines, MinHash signature) of a file's non-blank lines. Each line
+    hash goes to one of the bins, which keeps its smallest value; empty bins
+    borrow from the next filled one so small files still get full signatures.
+    """
+    lines = {hash(line.strip()) for line in content.split('\n') if line.strip()}
+    if not lines:
+        return 0, ()
+    bins = [None] * _SIGNATURE_BINS
+    for h in lines:
+        n, value = h % _SIGNATURE_BINS, h // _SIGNATURE_BINS
+        if bins[n] is None or value < bins[n]:
+            bins[n] = value
+    signature = []
+    for n in range(_SIGNATURE_BINS):
+        offset = 0
+        while bins[(n + offset) % _SIGNATURE_BINS] is None:
+            offset += 1
+        signature.append((bins[(n + offset) % _SIGNATURE_BINS], offset))
+    return len(lines), tuple(signature)
+
+
+def _similarity(a, b):
+    """Estimated Jaccard similarity of two MinHash signatures"""
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+class Minifier:
+    """
+    Shrinks files before they are packed into a prompt: drops boilerplate,
+    generated, minified, binary and near-duplicate files, and strips license
+    headers, comments, encoded blobs and blank lines from the rest. One
+    instance per review, since duplicates are found across its files.
+    """
+
+    def __init__(self, config=None):
+        self.config = config or load_minify_config()
+        self.steps = list(self.config['steps'])
+        self.stats = MinifyStats()
+        self._signatures = {}  # path -> MinHash signature
+        self._bands = {}  # (band, rows) -> paths
+
+    def process(self, record):
+        """(minified FileRecord, None), or (None, reason) when the file should be left out"""
+        before = record.tokens
+        self.stats.files += 1
+        self.stats.tokens_before += before
+
+        content, reason = self._run(record)
+        if content is None:
+            self.stats.dropped += 1
+            return None, reason
+        if content is not record.content:
+            record = FileRecord(record.path, content)
+        self.stats.tokens_after += record.tokens
+        return record, None
+
+    def _run(self, record):
+        path, content = record.path, record.content
+        language = language_for(path) if path else None
+        name = posixpath.basename(path)
+        config = self.config
+
+        for step in self.steps:
+            before = estimate_tokens(content)
+            reason = None
+            if step == 'boilerplate' and path:
+                if _LICENSE_FILE_RE.match(name):
+                    # Keep the license name ("MIT License"), which READMEs and reviews mention
+                    first = next((line.strip() for line in content.split('\n') if line.strip()), '')
+                    content = f"{first}\n[license text removed]"
+                elif _BOILERPLATE_FILE_RE.match(name):
+                    reason = 'boilerplate'
+            elif step == 'generated' and path:
+                reason = detect_unreviewable(content, config)
+            elif step == 'license':
+                content = strip_license_header(content, language)
+            elif step == 'comments':
+                content = strip_comments(content, language, config['keep_comment_words'])
+            elif step == 'blobs':
+                content = replace_blobs(content, config['blob_min_chars'])
+            elif step == 'whitespace':
+                content = collapse_whitespace(content)
+            elif step == 'duplicates' and path:
+                reason = self._check_duplicate(path, content)
+
+            if reason:
+                self._count(step, before)
+                return None, reason
+            self._count(step, before - estimate_tokens(content))
+
+        return (record.content if content == record.content else content), None
+
+    def _count(self, step, tokens):
+        if tokens > 0:
+            self.stats.saved_by_step[step] = self.stats.saved_by_step.get(step, 0) + tokens
+            MINIFY_TOKENS_SAVED.inc(tokens, step=step)
+
+    def _check_duplicate(self, path, content):
+        lines, signature = _signature(content)
+        if lines < self.config['duplicate_min_lines']:
+            return None
+        # Similar files very likely agree on every row of at least one band
+        bands = [(n, signature[n:n + _BAND_ROWS]) for n in range(0, len(signature), _BAND_ROWS)]
+        candidates = {other for band in bands for other in self._bands.get(band, ())}
+        for other in sorted(candidates):
+            if _similarity(signature, self._signatures[other]) >= self.config['duplicate_threshold']:
+                return f"duplicate of {other}"
+        self._signatures[path] = signature
+        for band in bands:
+            self._bands.setdefault(band, []).append(path)
+        return None
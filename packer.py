@@ -0,0 +1,162 @@
+import fnmatch
+import json
+import os
+import posixpath
+from dataclasses import dataclass, field
+
+from llm_scheduler import rate_limits_for
+from repo_files import FileRecord
+
+# Total repository tokens sent per review, across all map-reduce chunks
+MODEL_TOKEN_BUDGETS = {
+    'llama-3.3-70b-versatile': 24000,
+    'gemini-2.5-pro': 400000,
+}
+DEFAULT_TOKEN_BUDGET = 64000
+# A review sends at most this many minutes of the model's tokens-per-minute limit
+# (see llm_scheduler.py), so one review cannot hold the rate limit queue for long
+REVIEW_BUDGET_MINUTES = float(os.environ.get('REVIEW_BUDGET_MINUTES', 2))
+
+DEFAULT_SCORING = {
+    # Base score by file extension; unknown extensions use 'default_extension_score'
+    'extension_scores': {
+        '.py': 10, '.js': 9, '.jsx': 9, '.ts': 10, '.tsx': 10, '.go': 10, '.rs': 10,
+        '.java': 10, '.kt': 10, '.scala': 9, '.c': 10, '.h': 8, '.cpp': 10, '.hpp': 8,
+        '.cs': 10, '.rb': 10, '.php': 9, '.swift': 10, '.m': 8, '.sh': 6, '.sql': 6,
+        '.vue': 8, '.svelte': 8, '.html': 4, '.css': 3, '.scss': 3,
+        '.toml': 4, '.yaml': 4, '.yml': 4, '.json': 2, '.ini': 3, '.cfg': 3, '.xml': 2,
+        '.md': 3, '.rst': 3, '.txt': 2,
+        '.svg': 0, '.map': 0, '.lock': 0, '.snap': 0, '.csv': 0, '.ipynb': 1,
+    },
+    'default_extension_score': 3,
+    # Files matching these glob patterns are never sent (score 0)
+    'exclude_patterns': [
+        '*.min.js', '*.min.css', '*.bundle.js', '*.map', '*.lock',
+        'package-lock.json', 'yarn.lock', 'pnpm-lock.yaml', 'poetry.lock', 'Pipfile.lock',
+        'Cargo.lock', 'composer.lock', 'Gemfile.lock', 'go.sum',
+        'node_modules/*', 'vendor/*', 'dist/*', 'build/*', '.git/*',
+        '*/node_modules/*', '*/vendor/*', '*/dist/*', '*/build/*',
+    ],
+    # Score multipliers for matching paths (first match wins)
+    'path_multipliers': [
+        ['*test*', 0.6],
+        ['docs/*', 0.5],
+        ['examples/*', 0.6],
+        ['*/migrations/*', 0.3],
+        ['*generated*', 0.2],
+    ],
+    # Entry points and top-level modules are the best starting point for a review
+    'entry_points': [
+        'main.*', 'app.*', 'index.*', 'server.*', 'cli.*', 'manage.py', 'setup.py',
+        'pyproject.toml', 'package.json', 'Cargo.toml', 'go.mod', '__main__.py',
+        'src/main.*', 'src/index.*', 'src/app.*', 'cmd/*/main.go',
+    ],
+    'entry_point_multiplier': 2.0,
+    'top_level_multiplier': 1.2,
+    # Larger files score lower: score / (1 + tokens / size_pivot_tokens)
+    'size_pivot_tokens': 4000,
+}
+
+
+@dataclass
+class PackResult:
+    """Files chosen for the prompt, and those left out with the reason why"""
+    included: list = field(default_factory=list)
+    omitted: list = field(default_factory=list)  # [(path, reason), ...]
+
+    @property
+    def tokens(self):
+        return sum(record.tokens for record in self.included)
+
+
+def load_scoring():
+    """Default scoring merged with overrides from the JSON file in REVIEW_PACKER_CONFIG"""
+    scoring = dict(DEFAULT_SCORING)
+    config_path = os.environ.get('REVIEW_PACKER_CONFIG')
+    if config_path:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            scoring.update(json.load(f))
+    return scoring
+
+
+def budget_for_model(model):
+    """
+    Per-review repository token budget for a model: its entry in
+    MODEL_TOKEN_BUDGETS, capped at REVIEW_BUDGET_MINUTES of its rate limit
+    (REVIEW_TOKEN_BUDGET overrides both)
+    """
+    if os.environ.get('REVIEW_TOKEN_BUDGET'):
+        return int(os.environ['REVIEW_TOKEN_BUDGET'])
+    budget = MODEL_TOKEN_BUDGETS.get(model, DEFAULT_TOKEN_BUDGET)
+    return min(budget, int(rate_limits_for(model)['tpm'] * REVIEW_BUDGET_MINUTES))
+
+
+def _matches(path, patterns):
+    name = posixpath.basename(path)
+    return any(fnmatch.fnmatch(path, pattern) or fnmatch.fnmatch(name, pattern) for pattern in patterns)
+
+
+def score_file(record, scoring=DEFAULT_SCORING):
+    """Importance score for a file; 0 means it should never be sent"""
+    path = record.path
+    if _matches(path, scoring['exclude_patterns']):
+        return 0.0
+
+    extension = posixpath.splitext(path)[1].lower()
+    score = float(scoring['extension_scores'].get(extension, scoring['default_extension_score']))
+    if score <= 0:
+        return 0.0
+
+    for pattern, multiplier in scoring['path_multipliers']:
+        if fnmatch.fnmatch(path.lower(), pattern):
+            score *= multiplier
+            break
+
+    if any(fnmatch.fnmatch(path, pattern) for pattern in scoring['entry_points']):
+        score *= scoring['entry_point_multiplier']
+    elif '/' not in path:
+        score *= scoring['top_level_multiplier']
+
+    return score / (1 + record.tokens / scoring['size_pivot_tokens'])
+
+
+def pack_records(records, budget, scoring=None):
+    """
+    Rank records by score and greedily pack them into the token budget.
+    Files that do not fit are skipped so smaller, still-valuable files can
+    fill the remaining space.
+    """
+    scoring = scoring or load_scoring()
+
+    # Unparsed dumps come through as a single unnamed record; truncate instead of dropping
+    if len(records) == 1 and not records[0].path:
+        record = records[0]
+        if record.tokens > budget:
+            record = FileRecord('', record.content[:budget * 4])
+        return PackResult(included=[record])
+
+    result = PackResult()
+    ranked = sorted(((score_file(r, scoring), r) for r in records), key=lambda item: -item[0])
+    remaining = budget
+    for score, record in ranked:
+        if score <= 0:
+            result.omitted.append((record.path, 'excluded'))
+        elif record.tokens > remaining:
+            result.omitted.append((record.path, 'over budget'))
+        else:
+            result.included.append(record)
+            remaining -= record.tokens
+    return result
+
+
+def format_omitted(omitted, limit=50):
+    """Prompt note listing the files that were left out of the review"""
+    if not omitted:
+        return ''
+    lines = [f"- {path} ({reason})" for path, reason in omitted[:limit]]
+    if len(omitted) > limit:
+        lines.append(f"- ... and {len(omitted) - limit} more")
+    return (
+        "\n\nThe following files were left out of this review (lockfiles, generated "
+        "or low-priority files, or files that did not fit the token budget):\n" + '\n'.join(lines)
+    )
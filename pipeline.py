@@ -0,0 +1,347 @@
+"""
+Fetch a repository once and run several generation tasks on it concurrently.
+
+    python pipeline.py https://github.com/owner/repo --tasks review,readme
+    python pipeline.py ./checkout --tasks readme --sink readme=README.generated.md
+
+Tasks are the system prompts in prompts.py ("review" and "readme", plus any
+other system_prompt_<name> added there). Every task streams its output into
+its own sink: a file per task by default, or stdout for one task with "-".
+"""
+import argparse
+import asyncio
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+
+from dotenv import load_dotenv
+
+# Settings from .env must be in place before the modules below read them at import
+load_dotenv()
+
+import prompts
+from clients import UITHUB_MAX_TOKENS
+from local_source import load_repo, read_source
+from map_reduce import final_messages, final_messages_async, plan_review
+from packer import budget_for_model, format_omitted
+from providers import create_router
+
+# Short names for the built-in prompts; other prompts are used by their own name
+TASK_ALIASES = {'review': 'reviewer', 'readme': 'readme_generator'}
+TASK_INSTRUCTIONS = {
+    'reviewer': "Please provide the review as mentioned for the code repository given below:\n",
+    'readme_generator': "Generate a README.md for the following code repository:\n",
+}
+DEFAULT_INSTRUCTION = "Apply your instructions to the code repository given below:\n"
+# Prompts used inside other tasks rather than run on their own
+INTERNAL_PROMPTS = {'chunk_reviewer'}
+DEFAULT_TASKS = ['review', 'readme']
+
+PIPELINE_MAX_TASKS = int(os.environ.get('PIPELINE_MAX_TASKS', 8))
+
+
+class PipelineCancelled(Exception):
+    """The consumer of a streamed pipeline went away"""
+
+
+@dataclass
+class Task:
+    """A generation task: a system prompt and the instruction before the repository"""
+    name: str
+    system_prompt: str
+    instruction: str = DEFAULT_INSTRUCTION
+
+
+def available_tasks():
+    """{name: Task} for every system_prompt_<name> defined in prompts.py"""
+    tasks = {}
+    for attribute in dir(prompts):
+        if attribute.startswith('system_prompt_'):
+            name = attribute[len('system_prompt_'):]
+            if name not in INTERNAL_PROMPTS:
+                tasks[name] = Task(name, getattr(prompts, attribute),
+                                   TASK_INSTRUCTIONS.get(name, DEFAULT_INSTRUCTION))
+    return tasks
+
+
+def resolve_tasks(names):
+    """Tasks for names or aliases (a list or comma-separated string); ValueError for unknown ones"""
+    if isinstance(names, str):
+        names = names.split(',')
+    tasks = available_tasks()
+    resolved = []
+    for name in names:
+        name = TASK_ALIASES.get(str(name).strip(), str(name).strip())
+        if name not in tasks:
+            aliases = sorted(set(tasks) - set(TASK_ALIASES.values()) | set(TASK_ALIASES))
+            raise ValueError(f"Unknown task '{name}'. Available tasks: {', '.join(aliases)}")
+        if tasks[name] not in resolved:
+            resolved.append(tasks[name])
+    if not resolved:
+        raise ValueError('No tasks selected')
+    if len(resolved) > PIPELINE_MAX_TASKS:
+        raise ValueError(f'At most {PIPELINE_MAX_TASKS} tasks can run in one pipeline')
+    return resolved
+
+
+def task_messages(task, repo_code, omitted=()):
+    """Single-call chat messages for a task over the whole repository dump"""
+    return [
+        {"role": "system", "content": task.system_prompt},
+        {"role": "user", "content": task.instruction + repo_code + format_omitted(list(omitted))},
+    ]
+
+
+class FileSink:
+    """Writes a task's output to a file as it streams in"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def write(self, text):
+        if self._file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._file = open(self.path, 'w', encoding='utf-8')
+        self._file.write(text)
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class StdoutSink:
+    """Streams a task's output to stdout"""
+
+    def write(self, text):
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    def close(self):
+        sys.stdout.write('\n')
+
+
+class QueueSink:
+    """
+    Puts ('token', {'task', 'text'}) events on a queue, for multiplexed HTTP
+    streams. Once cancelled is set, writing stops the task.
+    """
+
+    def __init__(self, task, events, cancelled=None):
+        self.task = task
+        self.events = events
+        self.cancelled = cancelled
+
+    def write(self, text):
+        if self.cancelled is not None and self.cancelled.is_set():
+            raise PipelineCancelled(f'{self.task} cancelled')
+        self._put(('token', {'task': self.task, 'text': text}))
+
+    def _put(self, event):
+        self.events.put(event)
+
+    def close(self):
+        pass
+
+
+class AsyncQueueSink(QueueSink):
+    """QueueSink for an asyncio.Queue; cancelled may be an asyncio.Event"""
+
+    def _put(self, event):
+        self.events.put_nowait(event)
+
+
+def _result(task, started, chars, plan=None, error=None):
+    result = {
+        'task': task.name,
+        'success': error is None,
+        'chars': chars,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
+    if plan is not None:
+        result['chunks'] = len(plan.chunks)
+        result['cached_files'] = len(plan.cached)
+    if error is not None:
+        result['error'] = error
+    return result
+
+
+def run_task(task, fetched, router, sink):
+    """Run one task to completion, streaming into sink; returns a result dict"""
+    started = time.perf_counter()
+    chars = 0
+    plan = None
+    try:
+        if task.name == 'reviewer':
+            # Reviews keep their map-reduce path, so large repositories and cached findings still work
+            plan = plan_review(fetched.text, router.primary.model, omitted=fetched.omitted)
+            messages = final_messages(plan, router.complete)
+        else:
+            messages = task_messages(task, fetched.text, fetched.omitted)
+        for text in router.stream(messages):
+            chars += len(text)
+            sink.write(text)
+    except Exception as e:
+        print(f"Pipeline task {task.name} failed: {str(e)}", file=sys.stderr)
+        return _result(task, started, chars, plan, str(e))
+    finally:
+        sink.close()
+    return _result(task, started, chars, plan)
+
+
+async def run_task_async(task, fetched, router, sink):
+    """run_task() on the async provider clients"""
+    started = time.perf_counter()
+    chars = 0
+    plan = None
+    try:
+        if task.name == 'reviewer':
+            plan = await asyncio.to_thread(plan_review, fetched.text, router.primary.model, omitted=fetched.omitted)
+            messages = await final_messages_async(plan, router.complete_async)
+        else:
+            messages = task_messages(task, fetched.text, fetched.omitted)
+        async for text in router.astream(messages):
+            chars += len(text)
+            sink.write(text)
+    except Exception as e:
+        print(f"Pipeline task {task.name} failed: {str(e)}", file=sys.stderr)
+        return _result(task, started, chars, plan, str(e))
+    finally:
+        sink.close()
+    return _result(task, started, chars, plan)
+
+
+def run_pipeline(fetched, tasks, router, sinks):
+    """
+    Run tasks concurrently over one fetched repository. sinks maps task
+    name to a sink (write/close). Yields each task's result dict as it
+    finishes, in completion order.
+    """
+    with ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix='pipeline') as executor:
+        futures = [executor.submit(run_task, task, fetched, router, sinks[task.name]) for task in tasks]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+async def run_pipeline_async(fetched, tasks, router, sinks):
+    """run_pipeline() as an async generator; closing or cancelling it cancels the tasks still running"""
+    running = [asyncio.ensure_future(run_task_async(task, fetched, router, sinks[task.name])) for task in tasks]
+    try:
+        for future in asyncio.as_completed(running):
+            yield await future
+    finally:
+        for task in running:
+            task.cancel()
+
+
+def stream_pipeline_events(fetched, tasks, router):
+    """
+    Run the pipeline in the background and yield (event, data) as outputs
+    stream in: 'token' with the task name and text, 'task_done' with each
+    task's result, then 'done' with all results.
+    """
+    events = queue.Queue()
+    cancelled = threading.Event()
+    sinks = {task.name: QueueSink(task.name, events, cancelled) for task in tasks}
+
+    def run():
+        results = []
+        try:
+            for result in run_pipeline(fetched, tasks, router, sinks):
+                results.append(result)
+                events.put(('task_done', result))
+        finally:
+            events.put(('done', {'success': all(r['success'] for r in results), 'tasks': results}))
+
+    threading.Thread(target=run, daemon=True).start()
+    try:
+        while True:
+            event, data = events.get()
+            yield event, data
+            if event == 'done':
+                return
+    finally:
+        # The client went away: stop the tasks at their next token
+        cancelled.set()
+
+
+async def stream_pipeline_events_async(fetched, tasks, router):
+    """stream_pipeline_events() for the async app"""
+    events = asyncio.Queue()
+    cancelled = asyncio.Event()
+    sinks = {task.name: AsyncQueueSink(task.name, events, cancelled) for task in tasks}
+
+    async def run():
+        results = []
+        try:
+            async for result in run_pipeline_async(fetched, tasks, router, sinks):
+                results.append(result)
+                events.put_nowait(('task_done', result))
+        finally:
+            events.put_nowait(('done', {'success': all(r['success'] for r in results), 'tasks': results}))
+
+    runner = asyncio.ensure_future(run())
+    try:
+        while True:
+            event, data = await events.get()
+            yield event, data
+            if event == 'done':
+                return
+    finally:
+        # The client went away: stop generating
+        cancelled.set()
+        runner.cancel()
+
+
+def _cli_sinks(tasks, overrides, output_dir):
+    """File sinks per task (output_dir/<task>.md), with --sink task=path|- overrides"""
+    sinks = {}
+    for override in overrides:
+        name, _, path = override.partition('=')
+        name = TASK_ALIASES.get(name.strip(), name.strip())
+        sinks[name] = StdoutSink() if path == '-' else FileSink(path)
+    if sum(isinstance(sink, StdoutSink) for sink in sinks.values()) > 1:
+        raise ValueError('Only one task can stream to stdout')
+    for task in tasks:
+        sinks.setdefault(task.name, FileSink(os.path.join(output_dir, f"{task.name}.md")))
+    return sinks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Fetch a repository once and run several tasks on it concurrently')
+    parser.add_argument('source', nargs='?',
+                        help='GitHub repository URL or local directory (read from stdin, or prompted for, when omitted)')
+    parser.add_argument('--tasks', default=','.join(DEFAULT_TASKS),
+                        help=f"comma-separated tasks (default {','.join(DEFAULT_TASKS)})")
+    parser.add_argument('--sink', action='append', default=[], metavar='TASK=PATH',
+                        help='write a task to PATH instead of OUTPUT_DIR/<task>.md ("-" for stdout)')
+    parser.add_argument('--output-dir', default='pipeline_output')
+    args = parser.parse_args(argv)
+
+    try:
+        tasks = resolve_tasks(args.tasks)
+        sinks = _cli_sinks(tasks, args.sink, args.output_dir)
+    except ValueError as e:
+        parser.error(str(e))
+
+    router = create_router()
+    fetched = load_repo(read_source(args.source), UITHUB_MAX_TOKENS, budget_for_model(router.primary.model))
+
+    failed = False
+    for result in run_pipeline(fetched, tasks, router, sinks):
+        sink = sinks[result['task']]
+        where = sink.path if isinstance(sink, FileSink) else 'stdout'
+        status = 'done' if result['success'] else f"failed: {result['error']}"
+        print(f"{result['task']}: {status} ({result['chars']} chars in {result['duration_ms']} ms) -> {where}",
+              file=sys.stderr)
+        failed = failed or not result['success']
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
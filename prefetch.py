@@ -0,0 +1,121 @@
+import asyncio
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from review_cache import MemoryCache
+from singleflight import normalize_repo_url
+
+# Prefetched repositories are kept briefly, long enough for the review that follows
+PREFETCH_TTL = int(os.environ.get('PREFETCH_TTL', 300))
+PREFETCH_CACHE_MAX_BYTES = int(os.environ.get('PREFETCH_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+PREFETCH_WORKERS = int(os.environ.get('PREFETCH_WORKERS', 4))
+# Prefetches waiting or running at once; more are turned away rather than queued
+PREFETCH_MAX_PENDING = int(os.environ.get('PREFETCH_MAX_PENDING', 32))
+
+
+def create_fetch_cache():
+    """Short-TTL memory cache of prefetched repositories, keyed by normalized URL"""
+    return MemoryCache(max_entries=64, max_bytes=PREFETCH_CACHE_MAX_BYTES, ttl=PREFETCH_TTL)
+
+
+class Prefetcher:
+    """
+    Runs repository fetches in the background for /api/prefetch and puts
+    the results in the fetch cache, where the next review of the repository
+    takes (and removes) it. fetch is the app's fetch_repository(), which
+    coalesces with any review already fetching the same repository; a
+    repository that is cached or already being prefetched is not fetched again.
+    """
+
+    def __init__(self, fetch, fetch_cache, workers=PREFETCH_WORKERS, max_pending=PREFETCH_MAX_PENDING):
+        self.fetch = fetch
+        self.fetch_cache = fetch_cache
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='prefetch') if workers else None
+        self._pending = set()
+        # Pending prefetches whose result a review already used, e.g. by joining the fetch
+        self._used = set()
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'started': 0, 'cached': 0, 'in_flight': 0, 'busy': 0, 'failed': 0}
+
+    def _claim(self, github_url):
+        """'cached', 'in_flight', 'busy' or 'started' (the caller then runs the fetch)"""
+        key = normalize_repo_url(github_url)
+        with self._lock:
+            self._stats['requests'] += 1
+            if self.fetch_cache.get(key) is not None:
+                status = 'cached'
+            elif key in self._pending:
+                status = 'in_flight'
+            elif len(self._pending) >= self.max_pending:
+                status = 'busy'
+            else:
+                self._pending.add(key)
+                status = 'started'
+            self._stats[status] += 1
+        return status
+
+    def mark_used(self, github_url):
+        """A review fetched github_url, so a prefetch running for it must not cache its result"""
+        key = normalize_repo_url(github_url)
+        with self._lock:
+            if key in self._pending:
+                self._used.add(key)
+
+    def _release(self, github_url, fetched=None, error=None):
+        key = normalize_repo_url(github_url)
+        with self._lock:
+            if fetched is not None and key not in self._used:
+                self.fetch_cache.set(key, fetched, fetched.bytes_read)
+            self._pending.discard(key)
+            self._used.discard(key)
+            if error is not None:
+                self._stats['failed'] += 1
+        if error is not None:
+            print(f"Prefetch of {github_url} failed: {str(error)}", file=sys.stderr)
+
+    def submit(self, github_url):
+        """Start fetching github_url in the background; returns the status from _claim()"""
+        status = self._claim(github_url)
+        if status == 'started':
+            self._executor.submit(self._run, github_url)
+        return status
+
+    def _run(self, github_url):
+        try:
+            fetched = self.fetch(github_url)
+        except Exception as e:
+            self._release(github_url, error=e)
+        else:
+            self._release(github_url, fetched)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, running=len(self._pending), cached_repos=len(self.fetch_cache))
+
+
+class AsyncPrefetcher(Prefetcher):
+    """Prefetcher that runs the async app's fetch_repository() as event loop tasks"""
+
+    def __init__(self, fetch, fetch_cache, max_pending=PREFETCH_MAX_PENDING):
+        super().__init__(fetch, fetch_cache, workers=0, max_pending=max_pending)
+        self._tasks = set()
+
+    def submit(self, github_url):
+        status = self._claim(github_url)
+        if status == 'started':
+            # Tasks are referenced until done so they are not garbage collected mid-fetch
+            task = asyncio.ensure_future(self._run(github_url))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return status
+
+    async def _run(self, github_url):
+        try:
+            fetched = await self.fetch(github_url)
+        except Exception as e:
+            self._release(github_url, error=e)
+        else:
+            self._release(github_url, fetched)
@@ -0,0 +1,532 @@
+import asyncio
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from clients import gemini_stream, gemini_stream_async, groq_chat, groq_chat_async
+from llm_scheduler import RateLimitedError, admission_event, estimate_prompt_tokens, queued_seconds
+from metrics import COMPLETION_TOKENS, ERRORS, LLM_SECONDS, LLM_TTFT_SECONDS, PROMPT_TOKENS
+from repo_files import estimate_tokens
+
+
+class ProviderCancelled(Exception):
+    """Raised inside a provider call that lost a hedged race"""
+
+
+def _all_failed(errors):
+    """Single error for a call that every provider failed; 429 only if all were rate limited"""
+    message = "All providers failed: " + '; '.join(f"{name}: {str(e)}" for name, e in errors)
+    if all(isinstance(e, RateLimitedError) for _, e in errors):
+        return RateLimitedError(message)
+    return RuntimeError(message)
+
+
+class _CallTimer:
+    """
+    Time of a provider call minus what it spent queued in the rate-limit
+    scheduler, so latency metrics and routing measure the provider alone
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queued = queued_seconds()
+
+    def elapsed(self):
+        return time.perf_counter() - self.started - (queued_seconds() - self.queued)
+
+
+class Provider:
+    """An LLM backend that turns chat messages into review text"""
+
+    name = 'provider'
+    model = None
+    api_key_env = None
+    # Calls wait for the rate-limit scheduler before they reach the provider
+    scheduled = True
+
+    def is_configured(self):
+        return not self.api_key_env or bool(os.environ.get(self.api_key_env))
+
+    def stream(self, messages, cancel=None):
+        """Yield text pieces; stop early once cancel (a threading.Event) is set"""
+        raise NotImplementedError
+
+    async def astream(self, messages):
+        """Async generator of text pieces; cancelling the task stops the call"""
+        raise NotImplementedError
+        yield
+
+    def complete(self, messages, cancel=None):
+        parts = []
+        for text in self.stream(messages, cancel):
+            if cancel is not None and cancel.is_set():
+                raise ProviderCancelled(self.name)
+            parts.append(text)
+        if cancel is not None and cancel.is_set():
+            raise ProviderCancelled(self.name)
+        return ''.join(parts)
+
+
+class GroqProvider(Provider):
+    name = 'groq'
+    api_key_env = 'GROQ_API_KEY'
+
+    def __init__(self, model="llama-3.3-70b-versatile"):
+        self.model = model
+
+    def stream(self, messages, cancel=None):
+        response = groq_chat(messages, self.model, cancel=cancel, stream=True)
+        try:
+            for chunk in response:
+                if cancel is not None and cancel.is_set():
+                    break
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Closing the stream drops the HTTP connection so a cancelled call stops generating
+            close = getattr(response, 'close', None)
+            if close:
+                close()
+
+    async def astream(self, messages):
+        response = await groq_chat_async(messages, self.model, stream=True)
+        try:
+            async for chunk in response:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await response.close()
+
+
+class GeminiProvider(Provider):
+    name = 'gemini'
+    api_key_env = 'GEMINI_API_KEY'
+
+    def __init__(self, model="gemini-2.5-pro"):
+        self.model = model
+
+    def _request(self, messages):
+        """Chat messages as Gemini (contents, config, prompt_text)"""
+        from google.genai import types
+
+        system = [m['content'] for m in messages if m['role'] == 'system']
+        contents = [
+            types.Content(
+                role='model' if m['role'] == 'assistant' else 'user',
+                parts=[types.Part.from_text(text=m['content'])],
+            )
+            for m in messages if m['role'] != 'system'
+        ]
+        config = types.GenerateContentConfig(
+            thinking_config=types.ThinkingConfig(thinking_budget=-1),
+            response_mime_type="text/plain",
+            system_instruction=[types.Part.from_text(text=text) for text in system],
+        )
+        return contents, config, ''.join(m['content'] for m in messages)
+
+    def stream(self, messages, cancel=None):
+        contents, config, prompt_text = self._request(messages)
+        response = gemini_stream(self.model, contents, config, prompt_text=prompt_text, cancel=cancel)
+        for chunk in response:
+            if cancel is not None and cancel.is_set():
+                break
+            if chunk.text:
+                yield chunk.text
+
+    async def astream(self, messages):
+        contents, config, prompt_text = self._request(messages)
+        response = await gemini_stream_async(self.model, contents, config, prompt_text=prompt_text)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+class StubProvider(Provider):
+    """
+    Local stand-in for tests and benchmarks.
+    latency is seconds (a number or a zero-argument callable); fail_every
+    makes every n-th call raise.
+    """
+
+    scheduled = False
+
+    def __init__(self, name, latency=0.0, text='stub review', fail_every=0, chunks=4):
+        self.name = name
+        self.model = name
+        self.latency = latency
+        self.text = text
+        self.fail_every = fail_every
+        self.chunks = chunks
+        self.calls = itertools.count(1)
+
+    def _next_call(self):
+        """(delay, fails) for the next call"""
+        call = next(self.calls)
+        delay = self.latency() if callable(self.latency) else self.latency
+        return delay, bool(self.fail_every) and call % self.fail_every == 0
+
+    def _pieces(self):
+        size = max(1, len(self.text) // self.chunks)
+        return [self.text[start:start + size] for start in range(0, len(self.text), size)]
+
+    def stream(self, messages, cancel=None):
+        delay, fails = self._next_call()
+        if fails:
+            time.sleep(delay / 2)
+            raise RuntimeError(f'{self.name} stub failure')
+        cancel = cancel or threading.Event()
+        for piece in self._pieces():
+            if cancel.wait(delay / self.chunks):
+                return
+            yield piece
+
+    async def astream(self, messages):
+        delay, fails = self._next_call()
+        if fails:
+            await asyncio.sleep(delay / 2)
+            raise RuntimeError(f'{self.name} stub failure')
+        for piece in self._pieces():
+            await asyncio.sleep(delay / self.chunks)
+            yield piece
+
+
+class LatencyTracker:
+    """Rolling window of call latencies and outcomes for one provider"""
+
+    def __init__(self, window=100):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok):
+        with self._lock:
+            self._samples.append((seconds, ok))
+
+    def percentile(self, pct):
+        with self._lock:
+            latencies = sorted(seconds for seconds, ok in self._samples if ok)
+        if not latencies:
+            return None
+        index = min(len(latencies) - 1, int(round(pct / 100 * (len(latencies) - 1))))
+        return latencies[index]
+
+    def error_rate(self):
+        with self._lock:
+            if not self._samples:
+                return 0.0
+            return sum(1 for _, ok in self._samples if not ok) / len(self._samples)
+
+    def count(self):
+        with self._lock:
+            return len(self._samples)
+
+    def snapshot(self):
+        return {
+            'samples': self.count(),
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'error_rate': round(self.error_rate(), 4),
+        }
+
+
+class ProviderRouter:
+    """
+    Routes each call to the fastest healthy provider (by rolling p50) and,
+    when hedging is enabled, fires a second request at the runner-up once the
+    first has been running longer than its hedge_percentile latency, counted
+    from when the rate-limit scheduler admitted it. The first answer wins and
+    the other request is cancelled.
+    """
+
+    def __init__(self, providers, hedge_percentile=95, hedge_min_samples=10,
+                 max_error_rate=0.5, min_samples=3, window=100):
+        self.providers = list(providers)
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.trackers = {p.name: LatencyTracker(window) for p in self.providers}
+        self.counters = {'calls': 0, 'hedged': 0, 'hedge_wins': 0, 'failovers': 0}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(os.environ.get('PROVIDER_WORKERS', 16)),
+            thread_name_prefix='provider',
+        )
+
+    @property
+    def primary(self):
+        return self.providers[0]
+
+    def configured(self):
+        """Providers whose API key is available"""
+        return [p for p in self.providers if p.is_configured()]
+
+    def ranked(self):
+        """Healthy providers first, fastest first; providers without enough samples are tried early"""
+        def key(provider):
+            tracker = self.trackers[provider.name]
+            healthy = tracker.count() < self.min_samples or tracker.error_rate() <= self.max_error_rate
+            p50 = tracker.percentile(50) if tracker.count() >= self.min_samples else 0.0
+            return (not healthy, p50 if p50 is not None else float('inf'))
+        return sorted(self.configured(), key=key)
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def _record_failure(self, provider, timer):
+        self.trackers[provider.name].record(timer.elapsed(), False)
+        ERRORS.inc(stage='llm')
+
+    def _record_success(self, provider, timer, messages, parts):
+        elapsed = timer.elapsed()
+        self.trackers[provider.name].record(elapsed, True)
+        LLM_SECONDS.observe(elapsed, provider=provider.name)
+        PROMPT_TOKENS.inc(estimate_prompt_tokens(messages), provider=provider.name)
+        COMPLETION_TOKENS.inc(estimate_tokens(''.join(parts)), provider=provider.name)
+
+    def _instrumented(self, provider, messages, cancel=None):
+        """
+        provider.stream() that records latency, time to first token, token
+        counts and errors; time spent queued for the rate limit is left out
+        """
+        timer = _CallTimer()
+        parts = []
+        try:
+            for text in provider.stream(messages, cancel):
+                if not parts:
+                    LLM_TTFT_SECONDS.observe(timer.elapsed(), provider=provider.name)
+                parts.append(text)
+                yield text
+        except Exception:
+            # A cancelled call stops early or leaves the scheduler queue; neither is a provider failure
+            if cancel is None or not cancel.is_set():
+                self._record_failure(provider, timer)
+            raise
+        if cancel is None or not cancel.is_set():
+            self._record_success(provider, timer, messages, parts)
+
+    async def _ainstrumented(self, provider, messages):
+        """_instrumented() for provider.astream()"""
+        timer = _CallTimer()
+        parts = []
+        try:
+            async for text in provider.astream(messages):
+                if not parts:
+                    LLM_TTFT_SECONDS.observe(timer.elapsed(), provider=provider.name)
+                parts.append(text)
+                yield text
+        except Exception:
+            self._record_failure(provider, timer)
+            raise
+        self._record_success(provider, timer, messages, parts)
+
+    def _call(self, provider, messages, cancel, admitted=None):
+        """One provider call; admitted is set once the scheduler lets it through, or when it ends"""
+        try:
+            if admitted is not None and not provider.scheduled:
+                admitted.set()
+            with admission_event(admitted):
+                parts = []
+                for text in self._instrumented(provider, messages, cancel):
+                    if cancel.is_set():
+                        raise ProviderCancelled(provider.name)
+                    parts.append(text)
+            if cancel.is_set():
+                raise ProviderCancelled(provider.name)
+            return ''.join(parts)
+        finally:
+            if admitted is not None:
+                admitted.set()
+
+    async def _acall(self, provider, messages, admitted=None):
+        """_call() for the async app, with admitted an asyncio.Event"""
+        try:
+            if admitted is not None and not provider.scheduled:
+                admitted.set()
+            with admission_event(admitted):
+                return ''.join([text async for text in self._ainstrumented(provider, messages)])
+        finally:
+            if admitted is not None:
+                admitted.set()
+
+    def _hedge_delay(self, provider):
+        if not self.hedge_percentile:
+            return None
+        tracker = self.trackers[provider.name]
+        if tracker.count() < self.hedge_min_samples:
+            return None
+        return tracker.percentile(self.hedge_percentile)
+
+    def complete(self, messages):
+        """Return review text from the first provider that answers successfully"""
+        self._count('calls')
+        ranked = self.ranked()
+        if not ranked:
+            raise RuntimeError('No LLM provider is configured')
+        primary, backups = ranked[0], ranked[1:]
+
+        cancels = {primary.name: threading.Event()}
+        admitted = threading.Event()
+        futures = {self._executor.submit(self._call, primary, messages, cancels[primary.name], admitted): primary}
+
+        hedged = False
+        delay = self._hedge_delay(primary)
+        if backups and delay is not None:
+            # delay is provider latency, so time queued for the rate limit does not count towards it
+            admitted.wait()
+            done, _ = wait(futures, timeout=delay)
+            if not done:
+                backup = backups.pop(0)
+                hedged = True
+                self._count('hedged')
+                cancels[backup.name] = threading.Event()
+                futures[self._executor.submit(self._call, backup, messages, cancels[backup.name])] = backup
+
+        errors = []
+        pending = set(futures)
+        while True:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                provider = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append((provider.name, e))
+                    continue
+                for other, other_provider in futures.items():
+                    if other is not future:
+                        cancels[other_provider.name].set()
+                        other.cancel()
+                if hedged and provider is not primary:
+                    self._count('hedge_wins')
+                return result
+
+            if not pending:
+                if not backups:
+                    raise _all_failed(errors)
+                # Fail over to the next provider
+                self._count('failovers')
+                backup = backups.pop(0)
+                cancels[backup.name] = threading.Event()
+                future = self._executor.submit(self._call, backup, messages, cancels[backup.name])
+                futures[future] = backup
+                pending = {future}
+
+    def stream(self, messages):
+        """
+        Yield text pieces from the fastest healthy provider, failing over to
+        the next one if a provider errors before producing any output.
+        """
+        self._count('calls')
+        errors = []
+        for n, provider in enumerate(self.ranked()):
+            if n:
+                self._count('failovers')
+            produced = False
+            try:
+                for text in self._instrumented(provider, messages):
+                    produced = True
+                    yield text
+            except Exception as e:
+                if produced:
+                    raise
+                errors.append((provider.name, e))
+                continue
+            return
+        raise _all_failed(errors)
+
+    async def complete_async(self, messages):
+        """complete() for the async app; the losing hedged request is cancelled as a task"""
+        self._count('calls')
+        ranked = self.ranked()
+        if not ranked:
+            raise RuntimeError('No LLM provider is configured')
+        primary, backups = ranked[0], ranked[1:]
+        admitted = asyncio.Event()
+        tasks = {asyncio.ensure_future(self._acall(primary, messages, admitted)): primary}
+
+        try:
+            hedged = False
+            delay = self._hedge_delay(primary)
+            if backups and delay is not None:
+                await admitted.wait()
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    backup = backups.pop(0)
+                    hedged = True
+                    self._count('hedged')
+                    tasks[asyncio.ensure_future(self._acall(backup, messages))] = backup
+
+            errors = []
+            pending = set(tasks)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    provider = tasks[task]
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        errors.append((provider.name, e))
+                        continue
+                    if hedged and provider is not primary:
+                        self._count('hedge_wins')
+                    return result
+
+                if not pending:
+                    if not backups:
+                        raise _all_failed(errors)
+                    self._count('failovers')
+                    backup = backups.pop(0)
+                    task = asyncio.ensure_future(self._acall(backup, messages))
+                    tasks[task] = backup
+                    pending = {task}
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def astream(self, messages):
+        """stream() for the async app"""
+        self._count('calls')
+        errors = []
+        for n, provider in enumerate(self.ranked()):
+            if n:
+                self._count('failovers')
+            produced = False
+            try:
+                async for text in self._ainstrumented(provider, messages):
+                    produced = True
+                    yield text
+            except Exception as e:
+                if produced:
+                    raise
+                errors.append((provider.name, e))
+                continue
+            return
+        raise _all_failed(errors)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        counters['providers'] = {p.name: dict(self.trackers[p.name].snapshot(), model=p.model) for p in self.providers}
+        return counters
+
+
+PROVIDER_FACTORIES = {
+    'groq': GroqProvider,
+    'gemini': GeminiProvider,
+}
+
+
+def create_router(names=None):
+    """Build a router from REVIEW_PROVIDERS (comma-separated, first is the default primary)"""
+    names = names or os.environ.get('REVIEW_PROVIDERS', 'groq')
+    providers = [PROVIDER_FACTORIES[name.strip()]() for name in names.split(',') if name.strip()]
+    return ProviderRouter(
+        providers,
+        hedge_percentile=float(os.environ.get('REVIEW_HEDGE_PERCENTILE', 95)),
+        hedge_min_samples=int(os.environ.get('REVIEW_HEDGE_MIN_SAMPLES', 10)),
+        max_error_rate=float(os.environ.get('REVIEW_MAX_ERROR_RATE', 0.5)),
+    )
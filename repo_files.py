@@ -0,0 +1,164 @@
+import re
+from dataclasses import dataclass
+
+# UIthub plain-text dumps separate files with a "/path:" header followed by a rule of dashes
+SEPARATOR = '-' * 80
+_HEADER_RE = re.compile(r'^/(.+):$')
+_RULE_RE = re.compile(r'^-{10,}$')
+_LINE_NUMBER_RE = re.compile(r'^\s*\d+ \|(?: |$)')
+
+
+@dataclass
+class FileRecord:
+    """A single file from a repository snapshot"""
+    path: str
+    content: str
+
+    @property
+    def tokens(self):
+        return estimate_tokens(self.content)
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+def _strip_line_numbers(lines):
+    """Remove UIthub "12 | " prefixes when every non-empty line carries one"""
+    numbered = [line for line in lines if line.strip()]
+    if not numbered or not all(_LINE_NUMBER_RE.match(line) for line in numbered):
+        return lines
+    return [_LINE_NUMBER_RE.sub('', line, count=1) for line in lines]
+
+
+def _trim_separator(lines):
+    """Drop the trailing separator rule and padding before the next header"""
+    while lines and (not lines[-1].strip() or _RULE_RE.match(lines[-1])):
+        lines.pop()
+    return lines
+
+
+class DumpParser:
+    """
+    Incremental parser for UIthub plain-text dumps: feed() text as it arrives
+    and get back the FileRecords completed so far. Files longer than
+    max_chars are not kept in memory; their paths are collected in .oversized.
+    """
+
+    def __init__(self, max_chars=None):
+        self.max_chars = max_chars
+        self.preamble = ''
+        self.oversized = []
+        self._partial = ''
+        self._held = None  # possible "/path:" header waiting for its rule
+        self._path = None
+        self._seen_header = False
+        self._body = []
+        self._size = 0
+        self._overflow = False
+
+    @property
+    def current_path(self):
+        """Path of the file being read, or None before the first header"""
+        return self._path
+
+    def feed(self, text):
+        """Parse more text; returns the records it completed"""
+        lines = (self._partial + text).split('\n')
+        self._partial = lines.pop()
+        records = []
+        for line in lines:
+            self._line(line.rstrip('\r'), records)
+        return records
+
+    def close(self):
+        """Finish parsing; returns the remaining records"""
+        records = []
+        if self._partial:
+            self._line(self._partial.rstrip('\r'), records)
+            self._partial = ''
+        if self._held is not None:
+            self._append(self._held)
+            self._held = None
+        if self._seen_header:
+            self._finish(records)
+        elif any(line.strip() for line in self._body):
+            # No file headers at all: keep the text as a single unnamed record
+            records.append(FileRecord('', '\n'.join(self._body)))
+        return records
+
+    def abandon(self):
+        """Drop the partially read current file (the stream was cut off)"""
+        self._path = None
+        self._held = None
+        self._partial = ''
+        self._body = []
+
+    def _line(self, line, records):
+        if self._held is not None:
+            held, self._held = self._held, None
+            if _RULE_RE.match(line):
+                self._finish(records)
+                self._seen_header = True
+                self._path = _HEADER_RE.match(held).group(1)
+                return
+            self._append(held)
+        if _HEADER_RE.match(line):
+            self._held = line
+            return
+        self._append(line)
+
+    def _append(self, line):
+        if self._overflow:
+            return
+        self._size += len(line) + 1
+        if self.max_chars and self._size > self.max_chars:
+            self._overflow = True
+            if self._path is not None:
+                # The file will be left out anyway; free what was read of it
+                self._body = []
+            return
+        self._body.append(line)
+
+    def _finish(self, records):
+        if self._path is not None:
+            if self._overflow:
+                self.oversized.append(self._path)
+            else:
+                records.append(FileRecord(self._path, '\n'.join(_strip_line_numbers(_trim_separator(self._body)))))
+        elif not self._seen_header:
+            self.preamble = '\n'.join(_trim_separator(self._body)).strip('\n')
+        self._body = []
+        self._size = 0
+        self._overflow = False
+
+
+def parse_dump(text):
+    """
+    Split a UIthub plain-text dump into (preamble, [FileRecord, ...]).
+    The preamble is the directory tree UIthub prints before the files.
+    Text without any file headers is returned as a single unnamed record.
+    """
+    parser = DumpParser()
+    records = parser.feed(text) + parser.close()
+    if len(records) == 1 and not records[0].path:
+        return '', [FileRecord('', text)]
+    return parser.preamble, records
+
+
+def render_record(record):
+    """Render a record in UIthub's format, with line numbers"""
+    if not record.path:
+        return record.content
+    lines = record.content.split('\n')
+    width = len(str(len(lines)))
+    numbered = '\n'.join(f"{str(n).rjust(width)} | {line}" for n, line in enumerate(lines, 1))
+    return f"/{record.path}:\n{SEPARATOR}\n{numbered}\n\n{SEPARATOR}\n"
+
+
+def render_records(records, preamble=''):
+    """Render records back into a single UIthub-style dump"""
+    parts = [preamble + '\n\n'] if preamble else []
+    parts.extend(render_record(record) for record in records)
+    return ''.join(parts)
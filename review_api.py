@@ -0,0 +1,305 @@
+"""Request validation, errors, response payloads and streaming events shared by app.py and async_app.py"""
+import json
+import sys
+import time
+import traceback
+
+import prompts
+from llm_scheduler import RateLimitedError
+from local_source import LOCAL_REVIEW_ROOT, resolve_local_path
+from metrics import CACHE_LOOKUPS, ERRORS, REVIEW_SECONDS, stage_timer
+from pipeline import DEFAULT_TASKS, resolve_tasks
+from review_cache import hash_text, make_review_key
+from review_store import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from singleflight import normalize_repo_url
+
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+class ReviewError(Exception):
+    """Review failure that maps to an HTTP status code"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def validate_github_url(data):
+    """Extract and validate the GitHub URL from a request payload"""
+    if not data:
+        raise ReviewError('No JSON data provided')
+
+    github_url = data.get('github_url', '').strip()
+
+    if not github_url:
+        raise ReviewError('GitHub URL is required')
+
+    # Validate GitHub URL format
+    if not github_url.startswith('https://github.com/'):
+        raise ReviewError('Invalid GitHub URL format. Must start with https://github.com/')
+
+    return github_url
+
+
+def validate_review_source(data):
+    """GitHub URL to review, or the resolved directory for a {"local_path": ...} payload"""
+    if data and data.get('local_path'):
+        if not LOCAL_REVIEW_ROOT:
+            raise ReviewError('Local path reviews are disabled. Set LOCAL_REVIEW_ROOT to enable them.', 403)
+        try:
+            return resolve_local_path(str(data['local_path']).strip())
+        except ValueError as e:
+            raise ReviewError(str(e))
+    return validate_github_url(data)
+
+
+def validate_pipeline_request(data, router):
+    """(source, tasks) for a /api/pipeline payload"""
+    github_url = validate_review_source(data)
+    try:
+        tasks = resolve_tasks(data.get('tasks') or DEFAULT_TASKS)
+    except ValueError as e:
+        raise ReviewError(str(e))
+    check_llm_configured(router)
+    return github_url, tasks
+
+
+def check_llm_configured(router):
+    """Fail fast when no configured provider has an API key"""
+    if not router.configured():
+        keys = ', '.join(p.api_key_env for p in router.providers if p.api_key_env)
+        raise ReviewError(f'LLM API key not configured. Please set {keys} environment variable.', 500)
+
+
+def cache_model_key(router):
+    """Reviews may come from any configured provider, so cache keys cover all of them"""
+    return '+'.join(provider.model for provider in router.providers)
+
+
+def review_flight_key(github_url, model_key):
+    """Coalescing key for a review: same repo, models and prompt"""
+    return f"{normalize_repo_url(github_url)}|{model_key}|{hash_text(prompts.system_prompt_reviewer)}"
+
+
+def llm_error(error):
+    """ReviewError for a failed LLM stage: 429 when the providers kept rate limiting it, else 500"""
+    if isinstance(error, RateLimitedError):
+        ERRORS.inc(stage='rate_limit')
+        return ReviewError(f'AI review is rate limited, please retry shortly: {str(error)}', 429)
+    print(f"LLM API error: {str(error)}", file=sys.stderr)
+    return ReviewError(f'AI review failed: {str(error)}', 500)
+
+
+def lookup_cached_review(review_cache, review_store, repo_code, model_key, timings):
+    """(cache_key, cached, cache_layer) for a fetched repository, timed as the cache_lookup stage"""
+    with stage_timer(timings, 'cache_lookup'):
+        cache_key = make_review_key(repo_code, model_key, prompts.system_prompt_reviewer)
+        cached, cache_layer = lookup_review(review_cache, review_store, cache_key)
+    CACHE_LOOKUPS.inc(result='hit' if cached is not None else 'miss')
+    if cached is not None:
+        print(f"Review cache hit ({cache_layer})", file=sys.stderr)
+    return cache_key, cached, cache_layer
+
+
+def lookup_review(review_cache, review_store, cache_key):
+    """
+    (cached, cache_layer) from the review cache, falling back to the review
+    history, so an identical snapshot is never reviewed twice
+    """
+    cached, cache_layer = review_cache.get(cache_key)
+    if cached is None and review_store is not None:
+        stored = review_store.find(cache_key)
+        if stored is not None:
+            cached, cache_layer = {'review': stored['review'], 'review_id': stored['id']}, 'history'
+            review_cache.set(cache_key, cached)
+    return cached, cache_layer
+
+
+def store_review(review_cache, review_store, cache_key, github_url, repo_code, fetched, review, model_key, plan):
+    """Cache a finished review and add it to the history; returns its history id (None without a store)"""
+    review_id = None
+    if review_store is not None:
+        review_id = review_store.add(
+            github_url,
+            review,
+            content_hash=hash_text(repo_code),
+            cache_key=cache_key,
+            model=model_key,
+            prompt_version=hash_text(prompts.system_prompt_reviewer)[:12],
+            commit_sha=fetched.commit,
+            details={
+                'chunks': len(plan.chunks),
+                'omitted_files': len(plan.omitted),
+                'cached_files': len(plan.cached),
+                'tokens_saved': fetched.tokens_saved,
+            },
+        )
+    review_cache.set(cache_key, {'review': review, 'review_id': review_id})
+    return review_id
+
+
+def review_history_page(review_store, args):
+    """One page of GET /api/reviews for the query-string args (q, repo, model, limit, cursor)"""
+    if review_store is None:
+        raise ReviewError('Review history is disabled. Set REVIEW_STORE_PATH to enable it.', 404)
+    try:
+        limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+        cursor = int(args['cursor']) if args.get('cursor') else None
+    except ValueError:
+        raise ReviewError('limit and cursor must be integers')
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ReviewError(f'limit must be between 1 and {MAX_PAGE_SIZE}')
+    reviews, next_cursor = review_store.list(
+        limit=limit,
+        cursor=cursor,
+        query=args.get('q'),
+        repository_url=args.get('repo'),
+        model=args.get('model'),
+    )
+    return {'success': True, 'reviews': reviews, 'next_cursor': next_cursor}
+
+
+def cache_hit_payload(github_url, repo_code, review, cache_layer, tokens_saved=0, review_id=None):
+    return {
+        'review': review,
+        'review_id': review_id,
+        'success': True,
+        'repository_url': github_url,
+        'content_length': len(repo_code),
+        'tokens_saved': tokens_saved,
+        'cache': 'hit',
+        'cache_layer': cache_layer,
+    }
+
+
+def review_payload(github_url, repo_code, review, plan, tokens_saved=0, review_id=None):
+    return {
+        'review': review,
+        'review_id': review_id,
+        'success': True,
+        'repository_url': github_url,
+        'content_length': len(repo_code),
+        'chunks': len(plan.chunks),
+        'omitted_files': len(plan.omitted),
+        'cached_files': len(plan.cached),
+        'tokens_saved': tokens_saved,
+        'cache': 'miss',
+    }
+
+
+def replay_review(result):
+    """Stream events for a streamed request that joined a non-streaming review"""
+    data = dict(result)
+    review = data.pop('review')
+    return [('token', {'text': review}), ('done', data)]
+
+
+def collect_review(events):
+    """run_review() result for a request that joined a streamed review"""
+    review = ''.join(data['text'] for event, data in events if event == 'token')
+    return dict(events[-1][1], review=review)
+
+
+def coalesced_event(item, shared, github_url):
+    """A stream event as seen by one request; done is marked when another request produced it"""
+    event, data = item
+    if shared and event == 'done':
+        data = dict(data, repository_url=github_url, coalesced=True)
+    return event, data
+
+
+def sse_event(event, data):
+    """Format a single Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _error_event(error, handler):
+    if isinstance(error, ReviewError):
+        return sse_event('error', {'error': str(error), 'success': False})
+    print(f"Unexpected error in {handler}: {str(error)}", file=sys.stderr)
+    print(traceback.format_exc(), file=sys.stderr)
+    return sse_event('error', {'error': f'Internal server error: {str(error)}', 'success': False})
+
+
+def sse_stream(events, handler):
+    """Server-Sent Events for (event, data) pairs, ending with an error event if they fail"""
+    try:
+        for event, data in events:
+            yield sse_event(event, data)
+    except Exception as e:
+        yield _error_event(e, handler)
+    finally:
+        events.close()
+
+
+async def sse_stream_async(events, handler):
+    """sse_stream() for an async generator of (event, data) pairs"""
+    try:
+        async for event, data in events:
+            yield sse_event(event, data)
+    except Exception as e:
+        yield _error_event(e, handler)
+    finally:
+        await events.aclose()
+
+
+def pipeline_running_event(tasks, fetched, timings):
+    return 'status', {
+        'stage': 'running',
+        'tasks': [task.name for task in tasks],
+        'tokens_saved': fetched.tokens_saved,
+        'timings': timings,
+    }
+
+
+class ReviewStream:
+    """
+    State and events of one /api/review/stream request. The apps do the
+    fetch, cache lookup and LLM calls in their own sync or async way and pass
+    the results here, which builds the (event, data) pairs and the timings.
+    """
+
+    def __init__(self, github_url):
+        self.github_url = github_url
+        self.timings = {}
+        self.started = time.perf_counter()
+        self.parts = []
+
+    @property
+    def review(self):
+        return ''.join(self.parts)
+
+    def cache_hit(self, fetched, cached, cache_layer):
+        """Events replaying a cached review"""
+        payload = cache_hit_payload(self.github_url, fetched.text, cached['review'], cache_layer,
+                                    fetched.tokens_saved, cached.get('review_id'))
+        return [('token', {'text': cached['review']}), self._done(payload)]
+
+    def planned(self, plan):
+        """Status events once the review is planned"""
+        if len(plan.chunks) > 1 or plan.cached:
+            # Map stage runs in parallel; only the reduce call is streamed
+            return [('status', {
+                'stage': 'reviewing_chunks',
+                'chunks': len(plan.chunks),
+                'cached_files': len(plan.cached),
+            })]
+        return []
+
+    def token(self, text):
+        self.parts.append(text)
+        return 'token', {'text': text}
+
+    def done(self, fetched, plan, review_id):
+        """The done event of a generated review"""
+        print("AI review stream completed successfully", file=sys.stderr)
+        payload = review_payload(self.github_url, fetched.text, self.review, plan, fetched.tokens_saved, review_id)
+        return self._done(payload)
+
+    def _done(self, payload):
+        self.timings['total_ms'] = round((time.perf_counter() - self.started) * 1000, 1)
+        REVIEW_SECONDS.observe(self.timings['total_ms'] / 1000, cache=payload['cache'])
+        # The review text was streamed already
+        data = dict(payload, timings=self.timings)
+        del data['review']
+        return 'done', data
@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def hash_text(text):
+    """Hex SHA-256 of a string"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def make_review_key(repo_text, model, system_prompt):
+    """Build a content-addressed key from the repo snapshot, model and prompt"""
+    return hash_text(f"{hash_text(repo_text)}:{model}:{hash_text(system_prompt)}")
+
+
+class MemoryCache:
+    """Thread-safe in-memory LRU with TTL and entry/byte limits"""
+
+    def __init__(self, max_entries=256, max_bytes=32 * 1024 * 1024, ttl=3600):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._items = OrderedDict()  # key -> (expires_at, size, value)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires_at, size, value = item
+            if expires_at < time.time():
+                self._remove(key)
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key, value, size):
+        with self._lock:
+            if key in self._items:
+                self._remove(key)
+            if size > self.max_bytes:
+                return
+            self._items[key] = (time.time() + self.ttl, size, value)
+            self._bytes += size
+            while len(self._items) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._items)))
+
+    def pop(self, key):
+        """Remove and return a live entry, or None"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            self._remove(key)
+            return item[2] if item[0] >= time.time() else None
+
+    def _remove(self, key):
+        _, size, _ = self._items.pop(key)
+        self._bytes -= size
+
+    def __len__(self):
+        return len(self._items)
+
+
+class DiskCache:
+    """JSON-file store with TTL and total-size eviction (oldest first)"""
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, ttl=86400):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if os.path.getmtime(path) + self.ttl < time.time():
+                os.remove(path)
+                return None
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key, value):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        data = json.dumps(value)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self._evict()
+        return len(data)
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            now = time.time()
+            for entry in os.scandir(self.directory):
+                if not entry.name.endswith('.json'):
+                    continue
+                stat = entry.stat()
+                if stat.st_mtime + self.ttl < now:
+                    self._unlink(entry.path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                self._unlink(path)
+                total -= size
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class LayeredCache:
+    """In-memory LRU in front of a disk-backed store"""
+
+    def __init__(self, memory, disk=None):
+        self.memory = memory
+        self.disk = disk
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return (value, layer) where layer is 'memory', 'disk' or None on a miss"""
+        value = self.memory.get(key)
+        if value is not None:
+            self._count('memory_hits')
+            return value, 'memory'
+
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value, len(json.dumps(value)))
+                self._count('disk_hits')
+                return value, 'disk'
+
+        self._count('misses')
+        return None, None
+
+    def set(self, key, value):
+        if self.disk is not None:
+            size = self.disk.set(key, value)
+        else:
+            size = len(json.dumps(value))
+        self.memory.set(key, value, size)
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+
+def create_review_cache():
+    """Build the review cache from environment configuration"""
+    ttl = int(os.environ.get('REVIEW_CACHE_TTL', 86400))
+    memory = MemoryCache(
+        max_entries=int(os.environ.get('REVIEW_CACHE_MAX_ENTRIES', 256)),
+        max_bytes=int(os.environ.get('REVIEW_CACHE_MEMORY_BYTES', 32 * 1024 * 1024)),
+        ttl=ttl,
+    )
+    directory = os.environ.get('REVIEW_CACHE_DIR', os.path.join('.cache', 'reviews'))
+    disk = None
+    if directory:
+        disk = DiskCache(
+            directory,
+            max_bytes=int(os.environ.get('REVIEW_CACHE_DISK_BYTES', 512 * 1024 * 1024)),
+            ttl=ttl,
+        )
+    return LayeredCache(memory, disk)
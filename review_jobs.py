@@ -0,0 +1,155 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFullError(Exception):
+    """Raised when the job queue has no room for another job"""
+
+
+class JobQueue:
+    """Bounded worker pool that runs review jobs in the background"""
+
+    def __init__(self, max_workers=4, max_pending=32, ttl=3600):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='review-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Queue fn(*args, report_stage=..., **kwargs) and return the new job id.
+        fn should return a JSON-serialisable dict or raise an exception with
+        an optional status_code attribute.
+        """
+        with self._lock:
+            self._purge_expired()
+            active = sum(1 for job in self._jobs.values() if job['status'] in ('queued', 'running'))
+            if active >= self.max_workers + self.max_pending:
+                raise QueueFullError('Review queue is full, please retry shortly')
+
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                'job_id': job_id,
+                'status': 'queued',
+                'stage': None,
+                'created_at': time.time(),
+                'started_at': None,
+                'finished_at': None,
+                'result': None,
+                'error': None,
+                'status_code': None,
+            }
+
+        self._start(job_id, fn, args, kwargs)
+        return job_id
+
+    def _start(self, job_id, fn, args, kwargs):
+        self._executor.submit(self._run, job_id, fn, args, kwargs)
+
+    def get(self, job_id):
+        """Return a snapshot of the job, or None if it is unknown or expired"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def stats(self):
+        with self._lock:
+            counts = {'queued': 0, 'running': 0, 'completed': 0, 'failed': 0}
+            for job in self._jobs.values():
+                counts[job['status']] += 1
+            counts['max_workers'] = self.max_workers
+            counts['max_pending'] = self.max_pending
+            return counts
+
+    def _run(self, job_id, fn, args, kwargs):
+        self._update(job_id, status='running', started_at=time.time())
+        try:
+            result = fn(*args, report_stage=self._stage_reporter(job_id), **kwargs)
+            self._update(job_id, status='completed', result=result, finished_at=time.time())
+        except Exception as e:
+            self._fail(job_id, e)
+
+    def _stage_reporter(self, job_id):
+        def report_stage(stage):
+            self._update(job_id, stage=stage)
+        return report_stage
+
+    def _fail(self, job_id, error):
+        print(f"Review job {job_id} failed: {str(error)}", file=sys.stderr)
+        if not hasattr(error, 'status_code'):
+            print(traceback.format_exc(), file=sys.stderr)
+        self._update(
+            job_id,
+            status='failed',
+            error=str(error),
+            status_code=getattr(error, 'status_code', 500),
+            finished_at=time.time(),
+        )
+
+    def _update(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                job.update(fields)
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job['finished_at'] is not None and job['finished_at'] < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+class AsyncJobQueue(JobQueue):
+    """
+    JobQueue for the async app: jobs are coroutines run as tasks on the
+    event loop, with at most max_workers running at once.
+    """
+
+    def __init__(self, max_workers=256, max_pending=1024, ttl=3600):
+        super().__init__(max_workers, max_pending, ttl)
+        self._semaphore = None
+        self._tasks = set()
+
+    def _start(self, job_id, fn, args, kwargs):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        task = asyncio.ensure_future(self._run_async(job_id, fn, args, kwargs))
+        # The loop only keeps weak references to tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_async(self, job_id, fn, args, kwargs):
+        async with self._semaphore:
+            self._update(job_id, status='running', started_at=time.time())
+            try:
+                result = await fn(*args, report_stage=self._stage_reporter(job_id), **kwargs)
+                self._update(job_id, status='completed', result=result, finished_at=time.time())
+            except Exception as e:
+                self._fail(job_id, e)
+
+
+def create_job_queue():
+    """Build the review job queue from environment configuration"""
+    return JobQueue(
+        max_workers=int(os.environ.get('REVIEW_WORKERS', 4)),
+        max_pending=int(os.environ.get('REVIEW_MAX_PENDING', 32)),
+        ttl=int(os.environ.get('REVIEW_JOB_TTL', 3600)),
+    )
+
+
+def create_async_job_queue():
+    """Build the async app's job queue; reviews mostly wait on I/O, so far more can run at once"""
+    return AsyncJobQueue(
+        max_workers=int(os.environ.get('ASYNC_REVIEW_WORKERS', 256)),
+        max_pending=int(os.environ.get('ASYNC_REVIEW_MAX_PENDING', 1024)),
+        ttl=int(os.environ.get('REVIEW_JOB_TTL', 3600)),
+    )
@@ -0,0 +1,174 @@
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+from singleflight import normalize_repo_url
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+SUMMARY_CHARS = 240
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviews (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    repository_url TEXT NOT NULL,
+    repo_key TEXT NOT NULL,
+    commit_sha TEXT,
+    content_hash TEXT NOT NULL,
+    cache_key TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    review TEXT NOT NULL,
+    details TEXT NOT NULL DEFAULT '{}',
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reviews_repo_idx ON reviews (repo_key, id);
+CREATE INDEX IF NOT EXISTS reviews_cache_key_idx ON reviews (cache_key, id);
+CREATE INDEX IF NOT EXISTS reviews_content_idx ON reviews (content_hash);
+CREATE INDEX IF NOT EXISTS reviews_commit_idx ON reviews (commit_sha);
+CREATE INDEX IF NOT EXISTS reviews_model_idx ON reviews (model, id);
+"""
+
+# External-content FTS5 index over the review text, kept in sync by triggers
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS reviews_fts USING fts5(
+    review, repository_url, content='reviews', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS reviews_fts_insert AFTER INSERT ON reviews BEGIN
+    INSERT INTO reviews_fts (rowid, review, repository_url) VALUES (new.id, new.review, new.repository_url);
+END;
+CREATE TRIGGER IF NOT EXISTS reviews_fts_delete AFTER DELETE ON reviews BEGIN
+    INSERT INTO reviews_fts (reviews_fts, rowid, review, repository_url)
+    VALUES ('delete', old.id, old.review, old.repository_url);
+END;
+"""
+
+_LIST_COLUMNS = ('reviews.id, reviews.repository_url, commit_sha, content_hash, model, prompt_version, '
+                 'created_at')
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class ReviewStore:
+    """
+    SQLite history of finished reviews: indexed by repository, commit,
+    content hash, model and prompt version, with full-text search over the
+    review text (FTS5, or LIKE when SQLite is built without it). Each thread
+    uses its own connection.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        connection = self._connection()
+        with connection:
+            connection.executescript(_SCHEMA)
+        try:
+            with connection:
+                connection.executescript(_FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            print("SQLite has no FTS5 support; review search falls back to LIKE", file=sys.stderr)
+            self.fts = False
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.row_factory = sqlite3.Row
+            # WAL lets the list endpoints read while reviews are being written
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._local.connection = connection
+        return connection
+
+    def add(self, repository_url, review, content_hash, cache_key, model, prompt_version,
+            commit_sha=None, details=None):
+        """Store a finished review and return its id"""
+        connection = self._connection()
+        with connection:
+            cursor = connection.execute(
+                'INSERT INTO reviews (repository_url, repo_key, commit_sha, content_hash, cache_key, model, '
+                'prompt_version, review, details, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (repository_url, normalize_repo_url(repository_url), commit_sha, content_hash, cache_key,
+                 model, prompt_version, review, json.dumps(details or {}), time.time()),
+            )
+        return cursor.lastrowid
+
+    def get(self, review_id):
+        """Full review by id, or None"""
+        row = self._connection().execute('SELECT * FROM reviews WHERE id = ?', (review_id,)).fetchone()
+        return _full(row) if row else None
+
+    def find(self, cache_key):
+        """Latest review for a cache key (same content, model and prompt), or None"""
+        row = self._connection().execute(
+            'SELECT * FROM reviews WHERE cache_key = ? ORDER BY id DESC LIMIT 1', (cache_key,)
+        ).fetchone()
+        return _full(row) if row else None
+
+    def list(self, limit=DEFAULT_PAGE_SIZE, cursor=None, query=None, repository_url=None, model=None):
+        """
+        One page of review summaries, newest first, as (items, next_cursor).
+        Pages are keyset-paginated on the id: pass the returned next_cursor
+        to get the following page (None after the last one). query is a
+        full-text search over the review text and repository URL.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        summary = f'substr(reviews.review, 1, {SUMMARY_CHARS})'
+        sql_from = 'reviews'
+        conditions, params = [], []
+
+        words = _WORD_RE.findall(query or '')
+        if words and self.fts:
+            summary = "snippet(reviews_fts, 0, '**', '**', '...', 24)"
+            sql_from = 'reviews JOIN reviews_fts ON reviews_fts.rowid = reviews.id'
+            # Quoted terms, so user input never reaches the FTS query syntax
+            conditions.append('reviews_fts MATCH ?')
+            params.append(' '.join('"%s"' % word for word in words))
+        elif words:
+            for word in words:
+                conditions.append("(reviews.review LIKE ? ESCAPE '\\' OR reviews.repository_url LIKE ? ESCAPE '\\')")
+                pattern = '%' + word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+                params.extend([pattern, pattern])
+        if repository_url:
+            conditions.append('repo_key = ?')
+            params.append(normalize_repo_url(repository_url))
+        if model:
+            conditions.append('model = ?')
+            params.append(model)
+        if cursor is not None:
+            conditions.append('reviews.id < ?')
+            params.append(int(cursor))
+
+        sql = f"SELECT {_LIST_COLUMNS}, {summary} AS summary FROM {sql_from}"
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY reviews.id DESC LIMIT ?'
+        params.append(limit + 1)
+
+        rows = self._connection().execute(sql, params).fetchall()
+        items = [dict(row) for row in rows[:limit]]
+        next_cursor = str(items[-1]['id']) if len(rows) > limit else None
+        return items, next_cursor
+
+    def count(self):
+        return self._connection().execute('SELECT COUNT(*) FROM reviews').fetchone()[0]
+
+
+def _full(row):
+    review = dict(row)
+    review['details'] = json.loads(review['details'] or '{}')
+    del review['repo_key']
+    return review
+
+
+def create_review_store():
+    """Review history at REVIEW_STORE_PATH (default .cache/reviews.sqlite3); None when set to empty"""
+    path = os.environ.get('REVIEW_STORE_PATH', os.path.join('.cache', 'reviews.sqlite3'))
+    return ReviewStore(path) if path else None
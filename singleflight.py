@@ -0,0 +1,261 @@
+import asyncio
+import os
+import threading
+from urllib.parse import urlsplit
+
+
+def normalize_repo_url(url):
+    """Canonical form of a GitHub repository URL for use in coalescing keys"""
+    parts = urlsplit(url.strip())
+    if not parts.netloc:
+        # Local checkouts, whose paths are case-sensitive
+        return os.path.normpath(url.strip())
+    segments = [segment for segment in parts.path.split('/') if segment]
+    # GitHub owner and repository names are case-insensitive; branches and paths after them are not
+    segments[:2] = [segment.lower() for segment in segments[:2]]
+    if len(segments) >= 2 and segments[1].endswith('.git'):
+        segments[1] = segments[1][:-4]
+    return '/'.join([parts.netloc.lower()] + segments)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class _StreamCall(_Call):
+    """A call whose items are kept so every subscriber can replay them from the start"""
+
+    def __init__(self):
+        super().__init__()
+        self.items = []
+        self.changed = threading.Condition()
+        self.left = 0  # subscribers that stopped reading
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the
+    function and every duplicate that arrives while it is in flight waits for
+    and shares its result (or exception).
+
+    stream() does the same for generators: one producer runs per key and its
+    items are fanned out to every caller as they arrive. do() and stream()
+    calls with the same key join each other.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'executions': 0, 'coalesced': 0, 'max_waiters': 0}
+
+    def _join(self, key, call_class=_Call):
+        """Return (call, leader) for key, registering a new call if none is in flight"""
+        with self._lock:
+            self._stats['calls'] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._stats['coalesced'] += 1
+                self._stats['max_waiters'] = max(self._stats['max_waiters'], call.waiters)
+                return call, False
+            call = self._calls[key] = call_class()
+            self._stats['executions'] += 1
+            return call, True
+
+    def _finish(self, key, call):
+        with self._lock:
+            del self._calls[key]
+        call.done.set()
+
+    def do(self, key, fn, on_wait=None):
+        """Return (result, shared) where shared is True if another caller computed it"""
+        call, leader = self._join(key)
+        if not leader:
+            if on_wait:
+                on_wait()
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call)
+        return call.result, False
+
+    def _leave(self, call):
+        """Record that a stream subscriber stopped; True when nobody is left to read or wait"""
+        with self._lock:
+            call.left += 1
+            # The first caller plus everyone who joined, do() callers included
+            return call.left > call.waiters
+
+    def _abandoned(self, call):
+        with self._lock:
+            return call.left > call.waiters
+
+    def stream(self, key, produce, replay, collect):
+        """
+        Yield (item, shared) for the items of produce(), a generator started
+        once per key on a background thread. Callers that join a do() call get
+        replay(result) once it is done; do() callers that join a stream get
+        collect(items). The producer is closed at its next item once every
+        stream caller has stopped reading and no do() caller is waiting.
+        """
+        call, leader = self._join(key, _StreamCall)
+        if not isinstance(call, _StreamCall):
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            for item in replay(call.result):
+                yield item, True
+            return
+
+        if leader:
+            threading.Thread(target=self._produce, args=(key, call, produce, collect), daemon=True).start()
+        try:
+            index = 0
+            while True:
+                with call.changed:
+                    call.changed.wait_for(lambda: index < len(call.items) or call.done.is_set())
+                    items = call.items[index:]
+                    finished = call.done.is_set()
+                for item in items:
+                    yield item, not leader
+                index += len(items)
+                if finished:
+                    break
+            if call.error is not None:
+                raise call.error
+        finally:
+            self._leave(call)
+
+    def _produce(self, key, call, produce, collect):
+        iterator = produce()
+        try:
+            for item in iterator:
+                with call.changed:
+                    call.items.append(item)
+                    call.changed.notify_all()
+                if self._abandoned(call):
+                    call.error = RuntimeError('Coalesced call was cancelled')
+                    break
+            else:
+                call.result = collect(call.items)
+        except Exception as e:
+            call.error = e
+        finally:
+            iterator.close()
+            self._finish(key, call)
+            with call.changed:
+                call.changed.notify_all()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+            stats['waiters'] = sum(call.waiters for call in self._calls.values())
+        stats['coalescing_ratio'] = round(stats['coalesced'] / stats['calls'], 4) if stats['calls'] else 0.0
+        return stats
+
+
+class _AsyncCall(_Call):
+    def __init__(self):
+        super().__init__()
+        self.done = asyncio.Event()
+
+
+class _AsyncStreamCall(_StreamCall):
+    def __init__(self):
+        super().__init__()
+        self.done = asyncio.Event()
+        self.changed = asyncio.Condition()
+        self.task = None
+
+
+class AsyncSingleFlight(SingleFlight):
+    """SingleFlight for coroutines running on one event loop"""
+
+    async def do(self, key, fn, on_wait=None):
+        """Await fn() once per key; returns (result, shared) like SingleFlight.do"""
+        call, leader = self._join(key, _AsyncCall)
+        if not leader:
+            if on_wait:
+                on_wait()
+            await call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = await fn()
+        except asyncio.CancelledError:
+            call.error = RuntimeError('Coalesced call was cancelled')
+            raise
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call)
+        return call.result, False
+
+    async def stream(self, key, produce, replay, collect):
+        """
+        SingleFlight.stream() for an async generator produce(), run as a task
+        that is cancelled once every stream caller has stopped reading and no
+        do() caller is waiting
+        """
+        call, leader = self._join(key, _AsyncStreamCall)
+        if not isinstance(call, _AsyncStreamCall):
+            await call.done.wait()
+            if call.error is not None:
+                raise call.error
+            for item in replay(call.result):
+                yield item, True
+            return
+
+        if leader:
+            call.task = asyncio.ensure_future(self._produce_async(key, call, produce, collect))
+        try:
+            index = 0
+            while True:
+                async with call.changed:
+                    await call.changed.wait_for(lambda: index < len(call.items) or call.done.is_set())
+                    items = call.items[index:]
+                    finished = call.done.is_set()
+                for item in items:
+                    yield item, not leader
+                index += len(items)
+                if finished:
+                    break
+            if call.error is not None:
+                raise call.error
+        finally:
+            if self._leave(call) and not call.done.is_set():
+                call.task.cancel()
+
+    async def _produce_async(self, key, call, produce, collect):
+        iterator = produce()
+        try:
+            async for item in iterator:
+                async with call.changed:
+                    call.items.append(item)
+                    call.changed.notify_all()
+            call.result = collect(call.items)
+        except asyncio.CancelledError:
+            call.error = RuntimeError('Coalesced call was cancelled')
+        except Exception as e:
+            call.error = e
+        finally:
+            await iterator.aclose()
+            self._finish(key, call)
+            async with call.changed:
+                call.changed.notify_all()
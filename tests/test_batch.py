@@ -0,0 +1,58 @@
+import asyncio
+import threading
+
+from batch import run_batch, run_batch_async
+
+
+def test_run_batch_yields_results_then_summary():
+    def review(url):
+        if url.endswith('bad'):
+            raise RuntimeError('boom')
+        return {'review': url}
+
+    entries = list(run_batch(['https://github.com/a/ok', 'https://github.com/a/bad'], review, concurrency=2))
+    results, summary = entries[:-1], entries[-1]
+    assert {entry['repository_url']: entry['success'] for entry in results} == {
+        'https://github.com/a/ok': True,
+        'https://github.com/a/bad': False,
+    }
+    assert [entry['error'] for entry in results if not entry['success']] == ['boom']
+    assert summary['type'] == 'summary'
+    assert (summary['total'], summary['succeeded'], summary['failed']) == (2, 1, 1)
+
+
+def test_closing_run_batch_cancels_queued_reviews():
+    release = threading.Event()
+    started = []
+
+    def review(url):
+        started.append(url)
+        if url != 'u0':
+            release.wait(5)
+        return {}
+
+    batch = run_batch([f'u{n}' for n in range(10)], review, concurrency=2)
+    assert next(batch)['repository_url'] == 'u0'
+    batch.close()
+    release.set()
+    assert len(started) <= 3
+
+
+def test_run_batch_async_limits_concurrency():
+    running = 0
+    peak = 0
+
+    async def review(url):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return {'review': url}
+
+    async def main():
+        return [entry async for entry in run_batch_async([f'u{n}' for n in range(8)], review, concurrency=3)]
+
+    entries = asyncio.run(main())
+    assert peak == 3
+    assert entries[-1]['succeeded'] == 8
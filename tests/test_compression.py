@@ -0,0 +1,81 @@
+import gzip
+import os
+
+import pytest
+
+import compression
+from compression import StaticFiles, compress_body, negotiate_encoding
+
+HTML = ('<html><body>' + 'review ' * 400 + '</body></html>').encode()
+
+
+@pytest.fixture
+def files(tmp_path):
+    (tmp_path / 'index.html').write_bytes(HTML)
+    (tmp_path / 'tiny.css').write_bytes(b'a{}')
+    (tmp_path / 'logo.png').write_bytes(b'\x89PNG' + b'\0' * 2000)
+    return StaticFiles(str(tmp_path))
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('gzip, deflate', 'gzip'),
+    ('gzip;q=0, identity', None),
+    ('*', 'br'),
+    ('br;q=0.5, gzip;q=0.8', 'gzip'),
+    ('', None),
+    ('gzip;q=abc', None),
+])
+def test_negotiate_encoding(header, expected):
+    assert negotiate_encoding(header, ['br', 'gzip']) == expected
+
+
+def test_static_file_is_served_compressed_with_its_own_etag(files):
+    status, body, headers = files.response('index.html', {'Accept-Encoding': 'gzip'}, 'no-cache')
+    assert status == 200
+    assert headers['Content-Encoding'] == 'gzip'
+    assert headers['Vary'] == 'Accept-Encoding'
+    assert headers['Content-Type'] == 'text/html; charset=utf-8'
+    assert gzip.decompress(body) == HTML
+    _, plain, plain_headers = files.response('index.html', {}, 'no-cache')
+    assert plain == HTML and 'Content-Encoding' not in plain_headers
+    assert plain_headers['ETag'] != headers['ETag']
+
+
+def test_matching_if_none_match_gets_304(files):
+    _, _, headers = files.response('index.html', {'Accept-Encoding': 'gzip'}, 'no-cache')
+    status, body, not_modified = files.response(
+        'index.html', {'Accept-Encoding': 'gzip', 'If-None-Match': f'"other", W/{headers["ETag"]}'}, 'no-cache')
+    assert (status, body) == (304, b'')
+    assert not_modified['ETag'] == headers['ETag'] and 'Content-Type' not in not_modified
+    assert files.response('index.html', {'If-None-Match': '*'}, 'no-cache')[0] == 304
+    assert files.response('index.html', {'If-None-Match': '"stale"'}, 'no-cache')[0] == 200
+
+
+def test_small_and_binary_files_are_not_compressed(files):
+    assert 'Content-Encoding' not in files.response('tiny.css', {'Accept-Encoding': 'gzip'}, 'x')[2]
+    assert 'Content-Encoding' not in files.response('logo.png', {'Accept-Encoding': 'gzip'}, 'x')[2]
+
+
+def test_changed_file_is_reloaded(files, tmp_path):
+    etag = files.response('index.html', {}, 'no-cache')[2]['ETag']
+    (tmp_path / 'index.html').write_bytes(HTML + b'<!-- v2 -->')
+    later = os.path.getmtime(tmp_path / 'index.html') + 5
+    os.utime(tmp_path / 'index.html', (later, later))
+    status, body, headers = files.response('index.html', {'If-None-Match': etag}, 'no-cache')
+    assert status == 200 and body.endswith(b'<!-- v2 -->')
+
+
+def test_paths_outside_the_directory_are_not_served(files):
+    assert files.response('../secret.txt', {}, 'x') is None
+    assert files.response('missing.js', {}, 'x') is None
+
+
+def test_compress_body_skips_small_streaming_and_incompressible_responses(monkeypatch):
+    monkeypatch.setattr(compression, 'brotli', None)
+    data = b'{"review": "' + b'x' * 4000 + b'"}'
+    encoding, body = compress_body(data, 'application/json', {'Accept-Encoding': 'br, gzip'})
+    assert encoding == 'gzip' and gzip.decompress(body) == data
+    assert compress_body(b'{}', 'application/json', {'Accept-Encoding': 'gzip'}) is None
+    assert compress_body(data, 'text/event-stream', {'Accept-Encoding': 'gzip'}) is None
+    assert compress_body(data, 'image/png', {'Accept-Encoding': 'gzip'}) is None
+    assert compress_body(data, 'application/json', {}) is None
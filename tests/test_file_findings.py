@@ -0,0 +1,80 @@
+import map_reduce
+from file_findings import FindingsStore, heading_path, split_findings, summarize_findings
+from repo_files import FileRecord, render_records
+from review_cache import LayeredCache, MemoryCache
+
+
+def test_heading_path_strips_formatting():
+    assert heading_path('**File:** `./src/app.py` (part 1/2)') == 'src/app.py'
+    assert heading_path('`/lib/util.py`:') == 'lib/util.py'
+    assert heading_path('Path: README.md') == 'README.md'
+
+
+def test_split_findings_merges_parts_of_a_file():
+    text = '### app.py (part 1/2)\n* bug one\n\n### util.py\n* ok\n\n### app.py (part 2/2)\n* bug two\n'
+    assert split_findings(text) == {'app.py': '* bug one\n* bug two', 'util.py': '* ok'}
+
+
+def test_remember_stores_only_files_found_in_every_chunk():
+    store = FindingsStore(LayeredCache(MemoryCache()))
+    a, b = FileRecord('a.py', 'a = 1'), FileRecord('b.py', 'b = 2')
+    store.remember('model', [
+        ([a, b], '### a.py\n* issue in a\n### b.py\n'),
+        ([b], 'nothing matched here'),
+    ])
+    assert store.get(a, 'model') == '* issue in a'
+    assert store.get(b, 'model') is None
+
+
+def test_findings_are_keyed_by_content_and_model():
+    store = FindingsStore(LayeredCache(MemoryCache()))
+    store.set(FileRecord('a.py', 'same'), 'model', '')
+    assert store.get(FileRecord('vendor/a.py', 'same'), 'model') == 'No notable findings.'
+    assert store.get(FileRecord('a.py', 'same'), 'other-model') is None
+    assert store.get(FileRecord('a.py', 'changed'), 'model') is None
+
+
+def test_summarize_findings_truncates_long_entries():
+    summary = summarize_findings({'b.py': '* short', 'a.py': '* line\n' * 200})
+    assert summary.startswith('### a.py\n')
+    assert summary.endswith('### b.py\n* short')
+    assert '* ...' in summary
+
+
+def review_calls(monkeypatch, store, files, max_tokens=4000):
+    monkeypatch.setattr(map_reduce, 'get_findings_store', lambda: store)
+    calls = []
+
+    def complete(messages):
+        calls.append(messages)
+        return ''.join(f'### {record.path}\n* looked at\n' for record in files)
+
+    map_reduce.review_repository(render_records(files), complete, 'model', max_tokens=max_tokens)
+    return calls
+
+
+def test_single_chunk_review_is_one_call(monkeypatch):
+    store = FindingsStore(LayeredCache(MemoryCache()))
+    files = [FileRecord('a.py', 'a = 1'), FileRecord('b.py', 'b = 2')]
+    assert len(review_calls(monkeypatch, store, files)) == 1
+    assert store.get(files[0], 'model') is None
+
+
+def test_cached_findings_are_merged_with_changed_files(monkeypatch):
+    store = FindingsStore(LayeredCache(MemoryCache()))
+    files = [FileRecord('a.py', 'a = 1'), FileRecord('b.py', 'b = 2')]
+    store.set(files[0], 'model', '* known issue')
+    calls = review_calls(monkeypatch, store, files)
+    # Map over the changed file, then the merge with the cached findings
+    assert len(calls) == 2
+    assert 'b = 2' in calls[0][-1]['content'] and 'a = 1' not in calls[0][-1]['content']
+    assert '* known issue' in calls[1][-1]['content']
+    assert store.get(files[1], 'model') == '* looked at'
+
+
+def test_multi_chunk_review_stores_findings(monkeypatch):
+    store = FindingsStore(LayeredCache(MemoryCache()))
+    files = [FileRecord(f'{name}.py', f'{name} = 1\n' * 200) for name in 'abc']
+    calls = review_calls(monkeypatch, store, files, max_tokens=1000)
+    assert len(calls) == 4
+    assert all(store.get(record, 'model') == '* looked at' for record in files)
@@ -0,0 +1,86 @@
+import pytest
+
+from ingest import StreamingIngest
+from repo_files import DumpParser, FileRecord, parse_dump, render_records
+
+FILES = [
+    FileRecord('app.py', 'import os\n\nprint(os.getcwd())'),
+    FileRecord('src/util.py', 'def add(a, b):\n    return a + b'),
+    FileRecord('README.md', '# Title\n\nSome text'),
+]
+DUMP = render_records(FILES, '├── app.py\n├── src\n│   ├── util.py\n├── README.md')
+
+
+def feed_in_chunks(ingest, text, size):
+    data = text.encode('utf-8')
+    for start in range(0, len(data), size):
+        if not ingest.feed(data[start:start + size]):
+            break
+    return ingest.finish()
+
+
+def test_parse_dump_round_trips():
+    preamble, records = parse_dump(DUMP)
+    assert preamble.startswith('├── app.py')
+    assert records == FILES
+
+
+def test_text_without_headers_is_one_record():
+    assert parse_dump('just some text') == ('', [FileRecord('', 'just some text')])
+
+
+@pytest.mark.parametrize('size', [1, 7, 64, 100000])
+def test_parser_handles_any_chunking(size):
+    parser = DumpParser()
+    records = []
+    for start in range(0, len(DUMP), size):
+        records += parser.feed(DUMP[start:start + size])
+    records += parser.close()
+    assert records == FILES
+    assert parser.preamble == parse_dump(DUMP)[0]
+
+
+def test_header_without_rule_is_content():
+    dump = render_records([FileRecord('notes.md', '/not/a/header:\nstill the same file')])
+    assert parse_dump(dump)[1] == [FileRecord('notes.md', '/not/a/header:\nstill the same file')]
+
+
+def test_ingest_streams_multibyte_text_split_across_chunks():
+    files = [FileRecord('i18n.py', "GREETING = 'héllo wörld ✓'")]
+    result = feed_in_chunks(StreamingIngest(minify=False), render_records(files), 3)
+    assert result.records == files
+    assert not result.truncated
+
+
+def test_ingest_stops_at_max_bytes_and_reports_truncated_file():
+    ingest = StreamingIngest(max_bytes=len(DUMP.encode()) - 60, minify=False)
+    result = feed_in_chunks(ingest, DUMP, 16)
+    assert result.truncated
+    assert [r.path for r in result.records] == ['app.py', 'src/util.py']
+    assert ('README.md', 'truncated') in result.omitted
+    assert result.bytes_read == len(DUMP.encode()) - 60
+
+
+def test_ingest_budget_keeps_highest_scoring_files():
+    files = [
+        FileRecord('main.py', 'x = 1\n' * 20),
+        FileRecord('docs/guide.md', 'words ' * 200),
+        FileRecord('package-lock.json', '{}'),
+    ]
+    result = feed_in_chunks(StreamingIngest(budget=90, minify=False), render_records(files), 50)
+    assert [r.path for r in result.records] == ['main.py']
+    assert ('package-lock.json', 'excluded') in result.omitted
+    assert ('docs/guide.md', 'over budget') in result.omitted
+
+
+def test_ingest_keeps_file_order():
+    result = feed_in_chunks(StreamingIngest(budget=10000, minify=False), DUMP, 32)
+    assert [r.path for r in result.records] == ['app.py', 'src/util.py', 'README.md']
+
+
+def test_ingest_minifies_and_counts_savings():
+    files = [FileRecord('a.py', 'x = 1   \n\n\n\n\n\ny = 2'), FileRecord('LICENSE', 'MIT License\n\n' + 'terms ' * 200)]
+    result = feed_in_chunks(StreamingIngest(), render_records(files), 64)
+    assert result.records[0].content == 'x = 1\n\n\ny = 2'
+    assert result.records[1].content == 'MIT License\n[license text removed]'
+    assert result.tokens_saved > 0
@@ -0,0 +1,229 @@
+import asyncio
+import threading
+import time
+import types
+
+import pytest
+
+import llm_scheduler
+from llm_scheduler import (CallCancelled, LLMScheduler, RateLimitedError, TokenBucket, admission_event,
+                           estimate_prompt_tokens, queued_seconds, retry_after_seconds)
+
+
+class TooManyRequests(Exception):
+    status_code = 429
+
+    def __init__(self, retry_after=None):
+        super().__init__('429')
+        headers = {'retry-after': str(retry_after)} if retry_after is not None else {}
+        self.response = types.SimpleNamespace(headers=headers)
+
+
+def scheduler(rpm=600, tpm=600, **kwargs):
+    kwargs.setdefault('base_backoff', 0.01)
+    return LLMScheduler(limits={'m': {'rpm': rpm, 'tpm': tpm}}, **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def no_completion_reserve(monkeypatch):
+    monkeypatch.setattr(llm_scheduler, 'COMPLETION_RESERVE', 0)
+
+
+def test_token_bucket_wait_time():
+    bucket = TokenBucket(600)
+    bucket.tokens = 0
+    assert bucket.wait_time(100) == pytest.approx(10)
+    assert bucket.wait_time(100, rate_factor=0.5) == pytest.approx(20)
+    bucket.tokens = 100
+    assert bucket.wait_time(100) == 0
+
+
+def test_estimates_and_retry_after():
+    assert estimate_prompt_tokens([{'content': 'a' * 40}, {'content': 'b' * 4}]) == 11 + 2
+    assert retry_after_seconds(TooManyRequests(2)) == 2.0
+    assert retry_after_seconds(TooManyRequests()) is None
+
+
+def test_run_charges_buckets_and_reconciles_usage():
+    s = scheduler()
+    usage = types.SimpleNamespace(usage=types.SimpleNamespace(total_tokens=50))
+    assert s.run('m', 100, lambda: usage) is usage
+    stats = s.stats()['m']
+    assert stats['calls'] == 1
+    # Charged 100 up front, corrected to the 50 actually used
+    assert 545 <= stats['tokens_available'] <= 551
+
+
+def test_calls_over_budget_wait_for_refill():
+    s = scheduler(tpm=600)
+    s.acquire('m', 580)
+    started = time.perf_counter()
+    s.acquire('m', 20)
+    # 10 tokens per second: 20 tokens needed, 20 available -> almost no wait
+    assert time.perf_counter() - started < 0.5
+    started = time.perf_counter()
+    s.acquire('m', 5)
+    assert 0.3 <= time.perf_counter() - started < 1.5
+
+
+def test_calls_are_admitted_first_come_first_served():
+    s = scheduler(tpm=600)
+    s.acquire('m', 600)
+    order = []
+
+    def call(name, tokens):
+        s.acquire('m', tokens)
+        order.append(name)
+
+    threads = [threading.Thread(target=call, args=('large', 8)), threading.Thread(target=call, args=('small', 1))]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join()
+    # The small call fits sooner but must not overtake the one queued before it
+    assert order == ['large', 'small']
+    assert s.stats()['m']['queued_calls'] == 0
+
+
+def test_queue_wait_limit_fails_fast():
+    s = scheduler(tpm=600, max_queue_wait=2)
+    s.acquire('m', 600)
+    started = time.perf_counter()
+    with pytest.raises(RateLimitedError, match='queue wait'):
+        s.acquire('m', 100)
+    assert time.perf_counter() - started < 0.5
+    assert s.stats()['m']['queued_calls'] == 0
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    s = scheduler(tpm=600)
+    s.acquire('m', 600)
+    cancel = threading.Event()
+    errors = []
+
+    def call():
+        try:
+            s.acquire('m', 300, cancel)
+        except CallCancelled as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=call)
+    thread.start()
+    time.sleep(0.05)
+    assert s.stats()['m']['queued_calls'] == 1
+    cancel.set()
+    thread.join(1)
+    assert len(errors) == 1
+    assert s.stats()['m']['queued_calls'] == 0
+    assert s.stats()['m']['calls'] == 1
+    # Nothing was charged for the cancelled call, so a small one behind it goes straight through
+    started = time.perf_counter()
+    s.acquire('m', 5)
+    assert time.perf_counter() - started < 0.8
+
+
+def test_admission_event_is_set_when_the_call_is_admitted():
+    s = scheduler(tpm=600)
+    s.acquire('m', 590)
+    admitted = threading.Event()
+
+    def call():
+        with admission_event(admitted):
+            s.acquire('m', 20)
+
+    thread = threading.Thread(target=call)
+    thread.start()
+    assert not admitted.wait(0.3)
+    assert admitted.wait(2)
+    thread.join()
+
+
+def test_oversized_call_waits_for_a_full_bucket():
+    s = scheduler(tpm=600, max_queue_wait=5)
+    assert s.acquire('m', 10000) == 600
+
+
+def test_retries_rate_limited_calls_with_backoff():
+    s = scheduler(max_retries=3)
+    attempts = []
+
+    def flaky():
+        attempts.append(time.perf_counter())
+        if len(attempts) < 3:
+            raise TooManyRequests()
+        return 'ok'
+
+    assert s.run('m', 10, flaky) == 'ok'
+    stats = s.stats()['m']
+    assert stats['rate_limited'] == 2 and stats['retries'] == 2
+    assert stats['rate_factor'] < 1.0
+
+
+def test_gives_up_after_max_retries():
+    s = scheduler(max_retries=1)
+
+    def always_limited():
+        raise TooManyRequests(retry_after=0.01)
+
+    with pytest.raises(RateLimitedError, match='Rate limited by provider'):
+        s.run('m', 10, always_limited)
+
+
+def test_other_errors_are_not_retried():
+    s = scheduler()
+    calls = []
+
+    def broken():
+        calls.append(1)
+        raise ValueError('bad request')
+
+    with pytest.raises(ValueError):
+        s.run('m', 10, broken)
+    assert calls == [1]
+
+
+def test_queued_seconds_are_tracked_per_context():
+    s = scheduler(tpm=600)
+    s.acquire('m', 600)
+    before = queued_seconds()
+    s.acquire('m', 5)
+    assert queued_seconds() - before >= 0.3
+
+    async def run():
+        await s.acquire_async('m', 5)
+        return queued_seconds()
+
+    assert asyncio.run(run()) >= 0.3
+
+
+def test_async_run_and_cancelled_waiter_leaves_the_queue():
+    s = scheduler(tpm=600)
+
+    async def run():
+        async def call():
+            return 'ok'
+
+        assert await s.run_async('m', 10, call) == 'ok'
+        await s.acquire_async('m', 590)
+        blocked = asyncio.ensure_future(s.acquire_async('m', 300))
+        await asyncio.sleep(0.05)
+        assert s.stats()['m']['queued_calls'] == 1
+        blocked.cancel()
+        await asyncio.sleep(0)
+        assert s.stats()['m']['queued_calls'] == 0
+        started = time.perf_counter()
+        await s.acquire_async('m', 5)
+        # Not stuck behind the cancelled 300-token call
+        assert time.perf_counter() - started < 1.5
+
+    asyncio.run(run())
+
+
+def test_budget_is_capped_by_rate_limit(monkeypatch):
+    import packer
+    monkeypatch.delenv('REVIEW_TOKEN_BUDGET', raising=False)
+    monkeypatch.setenv('LLM_RATE_LIMITS', '{"llama-3.3-70b-versatile": {"rpm": 30, "tpm": 6000}}')
+    assert packer.budget_for_model('llama-3.3-70b-versatile') == 6000 * packer.REVIEW_BUDGET_MINUTES
+    monkeypatch.setenv('REVIEW_TOKEN_BUDGET', '1234')
+    assert packer.budget_for_model('llama-3.3-70b-versatile') == 1234
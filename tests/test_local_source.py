@@ -0,0 +1,94 @@
+import pytest
+
+from local_source import is_ignored, parse_gitignore, read_local_repo, resolve_local_path
+
+
+def ignored(text, path, is_dir=False, base=''):
+    return is_ignored(parse_gitignore(text, base), path, is_dir)
+
+
+@pytest.mark.parametrize('path, expected', [
+    ('debug.log', True),
+    ('src/deep/trace.log', True),
+    ('important.log', False),
+    ('build', True),
+    ('src/build', True),
+    ('docs/out/index.html', True),
+    ('src/docs/out/index.html', False),
+    ('app.py', False),
+])
+def test_gitignore_patterns(path, expected):
+    rules = '# comment\n*.log\n!important.log\nbuild/\n/docs/out/**\n'
+    assert ignored(rules, path, is_dir=path in ('build', 'src/build')) is expected
+
+
+def test_directory_only_rules_skip_files():
+    assert ignored('build/', 'build', is_dir=True)
+    assert not ignored('build/', 'build', is_dir=False)
+
+
+def test_double_star_matches_any_depth():
+    assert ignored('a/**/z.txt', 'a/z.txt')
+    assert ignored('a/**/z.txt', 'a/b/c/z.txt')
+    assert not ignored('a/**/z.txt', 'b/a/z.txt')
+
+
+def test_character_classes_and_escapes():
+    assert ignored('file[0-9].txt', 'file3.txt')
+    assert not ignored('file[!0-9].txt', 'file3.txt')
+    assert ignored('\\#notes', '#notes')
+
+
+def test_last_matching_rule_wins():
+    assert not ignored('*.txt\n!keep.txt', 'keep.txt')
+    assert ignored('!keep.txt\n*.txt', 'keep.txt')
+
+
+def test_nested_gitignore_only_applies_below_its_directory():
+    assert ignored('*.tmp', 'pkg/a.tmp', base='pkg')
+    assert not ignored('*.tmp', 'a.tmp', base='pkg')
+    assert ignored('/gen', 'pkg/gen', is_dir=True, base='pkg')
+    assert not ignored('/gen', 'pkg/sub/gen', is_dir=True, base='pkg')
+
+
+def write(root, path, content):
+    target = root / path
+    target.parent.mkdir(parents=True, exist_ok=True)
+    if isinstance(content, bytes):
+        target.write_bytes(content)
+    else:
+        target.write_text(content)
+
+
+def test_read_local_repo_skips_ignored_and_binary_files(tmp_path):
+    write(tmp_path, '.gitignore', 'dist/\n*.log\n')
+    write(tmp_path, 'app.py', 'print("hi")\n')
+    write(tmp_path, 'src/util.py', 'def f():\n    return 1\n')
+    write(tmp_path, 'src/.gitignore', 'secret.py\n')
+    write(tmp_path, 'src/secret.py', 'KEY = 1\n')
+    write(tmp_path, 'dist/bundle.js', 'var a;\n')
+    write(tmp_path, 'run.log', 'log\n')
+    write(tmp_path, 'logo.png', b'\x89PNG\x00\x00\x01')
+    write(tmp_path, '.git/HEAD', 'ref: refs/heads/main\n')
+
+    result = read_local_repo(str(tmp_path), workers=2)
+    paths = sorted(record.path for record in result.records)
+    assert 'app.py' in paths and 'src/util.py' in paths
+    assert not {'src/secret.py', 'dist/bundle.js', 'run.log', '.git/HEAD', 'logo.png'} & set(paths)
+    assert ('logo.png', 'binary') in result.omitted
+    assert '├── app.py' in result.preamble
+    assert 'dist' not in result.preamble
+
+
+def test_read_local_repo_rejects_missing_directory(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        read_local_repo(str(tmp_path / 'missing'))
+
+
+def test_resolve_local_path_stays_inside_root(tmp_path):
+    (tmp_path / 'repo').mkdir()
+    assert resolve_local_path('repo', root=str(tmp_path)) == str((tmp_path / 'repo').resolve())
+    with pytest.raises(ValueError):
+        resolve_local_path('../', root=str(tmp_path))
+    with pytest.raises(ValueError):
+        resolve_local_path('repo', root='')
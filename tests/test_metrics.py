@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+import map_reduce
+from ingest import IngestResult
+from metrics import REVIEWS_IN_FLIGHT, Counter, Gauge, Histogram, render_metrics, stage_timer
+from providers import ProviderRouter, StubProvider
+from repo_files import FileRecord
+from review_cache import LayeredCache, MemoryCache
+
+
+def test_counter_renders_labelled_values():
+    counter = Counter('test_requests_total', 'Requests by "path"', ['path'])
+    counter.inc(path='/a')
+    counter.inc(2, path='/a')
+    counter.inc(path='/b\n')
+    assert counter.render() == [
+        '# HELP test_requests_total Requests by "path"',
+        '# TYPE test_requests_total counter',
+        'test_requests_total{path="/a"} 3',
+        'test_requests_total{path="/b\\n"} 1',
+    ]
+
+
+def test_gauge_track_restores_the_value_on_errors():
+    gauge = Gauge('test_in_flight', 'In flight')
+    with pytest.raises(RuntimeError):
+        with gauge.track():
+            assert gauge.render()[-1] == 'test_in_flight 1'
+            raise RuntimeError('boom')
+    assert gauge.render()[-1] == 'test_in_flight 0'
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('test_seconds', 'Latency', buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.7, 5):
+        histogram.observe(value)
+    lines = histogram.render()
+    assert 'test_seconds_bucket{le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{le="1.0"} 3' in lines
+    assert 'test_seconds_bucket{le="+Inf"} 4' in lines
+    assert 'test_seconds_count 4' in lines
+    assert 'test_seconds_sum 6.25' in lines
+
+
+def test_registered_metrics_are_rendered():
+    Counter('test_registered_total', 'Registered').inc()
+    output = render_metrics()
+    assert 'test_registered_total 1' in output
+    assert '# TYPE knowflux_reviews_in_flight gauge' in output
+
+
+def test_stage_timer_accumulates_milliseconds_and_observes_seconds():
+    histogram = Histogram('test_stage_seconds', 'Stage', ['provider'])
+    timings = {}
+    for _ in range(2):
+        with stage_timer(timings, 'fetch', histogram, provider='p'):
+            time.sleep(0.01)
+    assert timings['fetch_ms'] >= 20
+    assert 'test_stage_seconds_count{provider="p"} 2' in histogram.render()
+
+
+def in_flight():
+    return REVIEWS_IN_FLIGHT._values.get((), 0)
+
+
+@pytest.fixture
+def flask_app(monkeypatch):
+    app = pytest.importorskip('app')
+    fetched = IngestResult('', [FileRecord('app.py', 'print(1)')])
+    monkeypatch.setattr(app, 'fetch_repository', lambda github_url, prefetch=False: fetched)
+    monkeypatch.setattr(app, 'review_router', ProviderRouter([StubProvider('stub', latency=2.0, chunks=40)]))
+    monkeypatch.setattr(app, 'review_cache', LayeredCache(MemoryCache()))
+    monkeypatch.setattr(app, 'review_store', None)
+    monkeypatch.setattr(map_reduce, 'get_findings_store', lambda: None)
+    return app
+
+
+@pytest.mark.parametrize('url', ['/api/review/stream', '/api/pipeline'])
+def test_streamed_reviews_and_pipelines_are_in_flight(flask_app, url):
+    response = flask_app.app.test_client().post(url, json={'github_url': 'https://github.com/o/r'}, buffered=False)
+    body = iter(response.response)
+    assert b'"stage": "fetching"' in next(body)
+    next(body)
+    assert in_flight() == 1
+    response.close()
+    deadline = time.time() + 2
+    while in_flight() and time.time() < deadline:
+        time.sleep(0.01)
+    assert in_flight() == 0
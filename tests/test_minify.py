@@ -0,0 +1,95 @@
+from minify import (DEFAULT_MINIFY, Minifier, collapse_whitespace, detect_unreviewable, language_for,
+                    load_minify_config, replace_blobs, strip_comments, strip_license_header)
+from repo_files import FileRecord
+
+
+def minifier(steps=None, **overrides):
+    config = dict(DEFAULT_MINIFY, **overrides)
+    if steps is not None:
+        config['steps'] = steps
+    return Minifier(config)
+
+
+def test_comments_are_opt_in():
+    assert 'comments' not in DEFAULT_MINIFY['steps']
+    content = 'x = 1  # note\n'
+    record, _ = minifier().process(FileRecord('a.py', content))
+    assert '# note' in record.content
+
+
+def test_language_for():
+    assert language_for('src/app.py') == 'python'
+    assert language_for('web/app.ts') == 'c'
+    assert language_for('Dockerfile') == 'hash'
+    assert language_for('notes.unknown') is None
+
+
+def test_strip_comments_keeps_strings_markers_and_shebang():
+    content = '#!/usr/bin/env python\n# drop me\nurl = "http://x#y"  # trailing\n# TODO: keep me\nz = 2\n'
+    assert strip_comments(content, 'hash', ('TODO',)) == (
+        '#!/usr/bin/env python\nurl = "http://x#y"  \n# TODO: keep me\nz = 2\n'
+    )
+
+
+def test_strip_comments_drops_lines_emptied_by_block_comments():
+    content = 'int a;\n/* one\n   two */\nint b; // tail\n\nint c;'
+    assert strip_comments(content, 'c') == 'int a;\nint b; \n\nint c;'
+
+
+def test_strip_license_header():
+    content = '# Copyright 2024 Someone\n# Licensed under MIT\n\nimport os\n'
+    assert strip_license_header(content, 'hash').lstrip('\n') == 'import os\n'
+    assert strip_license_header('# just a comment\nimport os\n', 'hash') == '# just a comment\nimport os\n'
+
+
+def test_collapse_whitespace_keeps_two_blank_lines():
+    assert collapse_whitespace('a  \n\n\n\n\n\nb\n\n\nc\n') == 'a\n\n\nb\n\n\nc'
+
+
+def test_replace_blobs_only_replaces_encoded_runs():
+    blob = 'QUJD' * 30 + '1234'
+    assert replace_blobs(f'data = "{blob}"', min_chars=100) == f'data = "<{len(blob)} characters of encoded data>"'
+    assert replace_blobs('a' * 200, min_chars=100) == 'a' * 200
+
+
+def test_detect_unreviewable():
+    assert detect_unreviewable('\x00\x01\x02' * 100) == 'binary'
+    assert detect_unreviewable('// Code generated by protoc. DO NOT EDIT.\npackage x') == 'generated'
+    assert detect_unreviewable('var a=1;' * 500) == 'minified'
+    assert detect_unreviewable('def f():\n    return 1\n') is None
+
+
+def test_boilerplate_and_generated_files_are_dropped():
+    m = minifier()
+    assert m.process(FileRecord('CODE_OF_CONDUCT.md', 'Be nice')) == (None, 'boilerplate')
+    assert m.process(FileRecord('api_pb2.py', '# Generated by the protocol buffer compiler.  DO NOT EDIT!\nx=1'))[1] == 'generated'
+    assert m.stats.dropped == 2
+
+
+def test_near_duplicates_are_dropped():
+    body = '\n'.join(f'line_{n} = {n}' for n in range(40))
+    m = minifier(['duplicates'])
+    assert m.process(FileRecord('a.py', body))[1] is None
+    assert m.process(FileRecord('copy/a.py', body + '\nextra = 1')) == (None, 'duplicate of a.py')
+    assert m.process(FileRecord('b.py', '\n'.join(f'other_{n} = {n}' for n in range(40))))[1] is None
+
+
+def test_unchanged_record_is_returned_as_is():
+    record = FileRecord('a.py', 'x = 1')
+    assert minifier().process(record)[0] is record
+
+
+def test_stats_count_saved_tokens_per_step():
+    m = minifier()
+    m.process(FileRecord('a.py', 'x = 1' + ' ' * 400 + '\n\n\n\n\n\ny = 2'))
+    assert m.stats.tokens_saved > 0
+    assert m.stats.as_dict()['saved_by_step']['whitespace'] == m.stats.tokens_saved
+
+
+def test_minify_config_from_environment(monkeypatch):
+    monkeypatch.setenv('REVIEW_MINIFY', '0')
+    assert load_minify_config()['steps'] == []
+    monkeypatch.setenv('REVIEW_MINIFY', 'comments, whitespace')
+    assert load_minify_config()['steps'] == ['comments', 'whitespace']
+    monkeypatch.setenv('REVIEW_MINIFY', '1')
+    assert load_minify_config()['steps'] == DEFAULT_MINIFY['steps']
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+import packer
+from packer import budget_for_model, format_omitted, load_scoring, pack_records, score_file
+from repo_files import FileRecord
+
+
+def test_excluded_files_score_zero():
+    for path in ('package-lock.json', 'web/node_modules/x/index.js', 'dist/app.min.js', 'go.sum', 'icon.svg'):
+        assert score_file(FileRecord(path, 'x')) == 0
+
+
+def test_entry_points_and_source_rank_above_docs_and_tests():
+    def score(path):
+        return score_file(FileRecord(path, 'x = 1\n' * 10))
+
+    assert score('main.py') > score('src/models.py') > score('tests/test_models.py')
+    assert score('src/models.py') > score('docs/guide.md')
+
+
+def test_larger_files_score_lower():
+    assert score_file(FileRecord('a.py', 'x' * 400)) > score_file(FileRecord('a.py', 'x' * 40000))
+
+
+def test_pack_skips_files_that_do_not_fit_but_keeps_smaller_ones():
+    big = FileRecord('main.py', 'x' * 4000)
+    medium = FileRecord('src/core.py', 'y' * 2000)
+    small = FileRecord('src/util.py', 'z' * 400)
+    result = pack_records([small, medium, big, FileRecord('yarn.lock', '')], budget=1200)
+    assert [record.path for record in result.included] == ['main.py', 'src/util.py']
+    assert ('src/core.py', 'over budget') in result.omitted
+    assert ('yarn.lock', 'excluded') in result.omitted
+    assert result.tokens == big.tokens + small.tokens
+
+
+def test_unparsed_dump_is_truncated_rather_than_dropped():
+    result = pack_records([FileRecord('', 'x' * 1000)], budget=100)
+    assert len(result.included) == 1
+    assert result.included[0].content == 'x' * 400
+
+
+def test_budget_is_capped_by_the_rate_limit(monkeypatch):
+    monkeypatch.delenv('REVIEW_TOKEN_BUDGET', raising=False)
+    monkeypatch.setenv('LLM_RATE_LIMITS', json.dumps({'small': {'rpm': 30, 'tpm': 1000}}))
+    monkeypatch.setattr(packer, 'REVIEW_BUDGET_MINUTES', 2)
+    assert budget_for_model('small') == 2000
+    assert budget_for_model('gemini-2.5-pro') == 400000
+    monkeypatch.setenv('REVIEW_TOKEN_BUDGET', '123')
+    assert budget_for_model('small') == 123
+
+
+def test_scoring_overrides_from_config_file(monkeypatch, tmp_path):
+    config = tmp_path / 'scoring.json'
+    config.write_text(json.dumps({'exclude_patterns': ['*.py']}))
+    monkeypatch.setenv('REVIEW_PACKER_CONFIG', str(config))
+    scoring = load_scoring()
+    assert score_file(FileRecord('main.py', 'x'), scoring) == 0
+    assert scoring['entry_points'] == packer.DEFAULT_SCORING['entry_points']
+
+
+@pytest.mark.parametrize('count, more', [(2, False), (60, True)])
+def test_format_omitted(count, more):
+    note = format_omitted([(f'f{n}.py', 'over budget') for n in range(count)])
+    assert '- f0.py (over budget)' in note
+    assert ('... and 10 more' in note) is more
+    assert format_omitted([]) == ''
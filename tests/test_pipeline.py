@@ -0,0 +1,120 @@
+import asyncio
+import queue
+import time
+
+import pytest
+
+import map_reduce
+from ingest import IngestResult
+from pipeline import (FileSink, QueueSink, resolve_tasks, run_pipeline, stream_pipeline_events,
+                      stream_pipeline_events_async, task_messages)
+from providers import ProviderRouter, StubProvider
+from repo_files import FileRecord
+
+
+class CountingStub(StubProvider):
+    """StubProvider that counts the pieces it has produced"""
+
+    produced = 0
+
+    def stream(self, messages, cancel=None):
+        for piece in super().stream(messages, cancel):
+            self.produced += 1
+            yield piece
+
+    async def astream(self, messages):
+        async for piece in super().astream(messages):
+            self.produced += 1
+            yield piece
+
+
+@pytest.fixture(autouse=True)
+def no_findings_store(monkeypatch):
+    monkeypatch.setattr(map_reduce, 'get_findings_store', lambda: None)
+
+
+def fetched():
+    return IngestResult('├── app.py', [FileRecord('app.py', 'print(1)')], omitted=[('big.bin', 'binary')])
+
+
+def router(**stub):
+    return ProviderRouter([CountingStub('stub', **stub)])
+
+
+def test_resolve_tasks_accepts_aliases_and_rejects_unknown_names():
+    assert [task.name for task in resolve_tasks('review, readme,review')] == ['reviewer', 'readme_generator']
+    with pytest.raises(ValueError, match='Unknown task'):
+        resolve_tasks(['review', 'poem'])
+    with pytest.raises(ValueError):
+        resolve_tasks([])
+
+
+def test_task_messages_include_the_omitted_files():
+    task = resolve_tasks('readme')[0]
+    messages = task_messages(task, 'CODE', [('big.bin', 'binary')])
+    assert messages[0]['content'] == task.system_prompt
+    assert messages[1]['content'].startswith(task.instruction + 'CODE')
+    assert 'big.bin' in messages[1]['content']
+
+
+def test_run_pipeline_streams_every_task_into_its_sink(tmp_path):
+    tasks = resolve_tasks('review,readme')
+    sinks = {task.name: FileSink(str(tmp_path / f'{task.name}.md')) for task in tasks}
+    results = list(run_pipeline(fetched(), tasks, router(text='generated'), sinks))
+    assert sorted(result['task'] for result in results) == ['readme_generator', 'reviewer']
+    assert all(result['success'] and result['chars'] == len('generated') for result in results)
+    assert (tmp_path / 'reviewer.md').read_text() == 'generated'
+    assert (tmp_path / 'readme_generator.md').read_text() == 'generated'
+
+
+def test_failed_task_does_not_stop_the_others():
+    events = queue.Queue()
+    tasks = resolve_tasks('review,readme')
+    sinks = {task.name: QueueSink(task.name, events) for task in tasks}
+    results = list(run_pipeline(fetched(), tasks, router(fail_every=2), sinks))
+    assert sorted(result['success'] for result in results) == [False, True]
+
+
+def test_stream_pipeline_events_tags_tokens_and_finishes_with_done():
+    events = list(stream_pipeline_events(fetched(), resolve_tasks('review,readme'), router(text='abcd')))
+    tokens = [data for event, data in events if event == 'token']
+    assert {data['task'] for data in tokens} == {'reviewer', 'readme_generator'}
+    assert [event for event, _ in events].count('task_done') == 2
+    assert events[-1][0] == 'done' and events[-1][1]['success']
+
+
+def test_closing_the_stream_stops_the_tasks():
+    stub_router = router(latency=2.0, chunks=100)
+    events = stream_pipeline_events(fetched(), resolve_tasks('review,readme'), stub_router)
+    assert next(events)[0] == 'token'
+    events.close()
+    time.sleep(0.2)
+    produced = stub_router.primary.produced
+    time.sleep(0.3)
+    assert stub_router.primary.produced == produced
+
+
+def test_async_stream_pipeline_events():
+    async def main():
+        return [item async for item in stream_pipeline_events_async(fetched(), resolve_tasks('review,readme'),
+                                                                   router(text='abcd'))]
+
+    events = asyncio.run(main())
+    assert [event for event, _ in events].count('task_done') == 2
+    assert events[-1][1]['success']
+
+
+def test_closing_the_async_stream_cancels_the_tasks():
+    stub_router = router(latency=2.0, chunks=100)
+
+    async def main():
+        events = stream_pipeline_events_async(fetched(), resolve_tasks('review,readme'), stub_router)
+        assert (await events.__anext__())[0] == 'token'
+        await events.aclose()
+        produced = stub_router.primary.produced
+        await asyncio.sleep(0.3)
+        return produced, [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+
+    produced, pending = asyncio.run(main())
+    assert stub_router.primary.produced == produced
+    assert pending == []
@@ -0,0 +1,95 @@
+import asyncio
+import threading
+import types
+
+from prefetch import AsyncPrefetcher, Prefetcher, create_fetch_cache
+
+URL = 'https://github.com/Owner/Repo'
+KEY = 'github.com/owner/repo'
+
+
+def fetched(name='repo'):
+    return types.SimpleNamespace(name=name, bytes_read=10)
+
+
+class BlockingFetch:
+    """fetch() that waits until released, so prefetches can be observed while running"""
+
+    def __init__(self, error=None):
+        self.release = threading.Event()
+        self.calls = []
+        self.error = error
+
+    def __call__(self, github_url):
+        self.calls.append(github_url)
+        self.release.wait(5)
+        if self.error:
+            raise self.error
+        return fetched(github_url)
+
+
+def wait_idle(prefetcher):
+    prefetcher._executor.shutdown(wait=True)
+
+
+def test_prefetch_caches_the_fetched_repository():
+    fetch = BlockingFetch()
+    prefetcher = Prefetcher(fetch, create_fetch_cache(), workers=2)
+    assert prefetcher.submit(URL) == 'started'
+    assert prefetcher.submit('https://github.com/owner/repo.git') == 'in_flight'
+    fetch.release.set()
+    wait_idle(prefetcher)
+    assert prefetcher.fetch_cache.get(KEY).name == URL
+    assert prefetcher.submit(URL) == 'cached'
+    assert fetch.calls == [URL]
+    stats = prefetcher.stats()
+    assert (stats['started'], stats['in_flight'], stats['cached'], stats['running']) == (1, 1, 1, 0)
+
+
+def test_prefetches_over_the_pending_limit_are_turned_away():
+    fetch = BlockingFetch()
+    prefetcher = Prefetcher(fetch, create_fetch_cache(), workers=1, max_pending=1)
+    assert prefetcher.submit('https://github.com/o/a') == 'started'
+    assert prefetcher.submit('https://github.com/o/b') == 'busy'
+    fetch.release.set()
+    wait_idle(prefetcher)
+
+
+def test_failed_prefetch_is_not_cached():
+    fetch = BlockingFetch(error=RuntimeError('not found'))
+    fetch.release.set()
+    prefetcher = Prefetcher(fetch, create_fetch_cache(), workers=1)
+    prefetcher.submit(URL)
+    wait_idle(prefetcher)
+    assert prefetcher.fetch_cache.get(KEY) is None
+    assert prefetcher.stats()['failed'] == 1
+
+
+def test_result_used_by_a_review_is_not_cached_again():
+    fetch = BlockingFetch()
+    prefetcher = Prefetcher(fetch, create_fetch_cache(), workers=1)
+    prefetcher.submit(URL)
+    # A review joined the running fetch, so its result must not be served to the next review
+    prefetcher.mark_used(URL)
+    fetch.release.set()
+    wait_idle(prefetcher)
+    assert prefetcher.fetch_cache.get(KEY) is None
+    assert prefetcher._used == set()
+    assert prefetcher.stats()['running'] == 0
+
+
+def test_async_prefetch():
+    async def fetch(github_url):
+        await asyncio.sleep(0.01)
+        return fetched(github_url)
+
+    async def main():
+        prefetcher = AsyncPrefetcher(fetch, create_fetch_cache())
+        assert prefetcher.submit(URL) == 'started'
+        assert prefetcher.submit(URL) == 'in_flight'
+        await asyncio.gather(*prefetcher._tasks)
+        return prefetcher
+
+    prefetcher = asyncio.run(main())
+    assert prefetcher.fetch_cache.get(KEY).name == URL
+    assert prefetcher.stats()['running'] == 0
@@ -0,0 +1,297 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from llm_scheduler import LLMScheduler, RateLimitedError
+from providers import Provider, ProviderCancelled, ProviderRouter, StubProvider
+
+MESSAGES = [{'role': 'user', 'content': 'review this'}]
+
+
+def seed(router, name, seconds, count=10, ok=True):
+    for _ in range(count):
+        router.trackers[name].record(seconds, ok)
+
+
+class RateLimitedProvider(Provider):
+    def __init__(self, name):
+        self.name = name
+        self.model = name
+
+    def stream(self, messages, cancel=None):
+        raise RateLimitedError(f'{self.name} rate limited')
+        yield
+
+
+class RecordingProvider(StubProvider):
+    """StubProvider that records when a call is cancelled or finishes"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.events = []
+
+    def stream(self, messages, cancel=None):
+        # Read to the end first, so the outcome is recorded even when the router stops reading
+        pieces = list(super().stream(messages, cancel))
+        self.events.append('cancelled' if cancel is not None and cancel.is_set() else 'finished')
+        yield from pieces
+
+    async def astream(self, messages):
+        try:
+            async for piece in super().astream(messages):
+                yield piece
+        except asyncio.CancelledError:
+            self.events.append('cancelled')
+            raise
+        self.events.append('finished')
+
+
+class ScheduledProvider(StubProvider):
+    """StubProvider whose calls first wait in a rate-limit scheduler, like the real providers"""
+
+    scheduled = True
+
+    def __init__(self, name, scheduler, **kwargs):
+        super().__init__(name, **kwargs)
+        self.scheduler = scheduler
+        self.started = 0
+
+    def stream(self, messages, cancel=None):
+        self.scheduler.acquire(self.model, 100, cancel)
+        self.started += 1
+        yield from super().stream(messages, cancel)
+
+    async def astream(self, messages):
+        await self.scheduler.acquire_async(self.model, 100)
+        self.started += 1
+        async for piece in super().astream(messages):
+            yield piece
+
+
+def exhausted_scheduler(*models):
+    """Scheduler whose models have just spent their minute budget (100 tokens take 6s to refill)"""
+    scheduler = LLMScheduler(limits={model: {'rpm': 600, 'tpm': 1000} for model in models})
+    for model in models:
+        scheduler.acquire(model, 1000)
+    return scheduler
+
+
+def test_untried_providers_are_ranked_first():
+    router = ProviderRouter([StubProvider('a'), StubProvider('b')])
+    seed(router, 'a', 0.1)
+    assert [p.name for p in router.ranked()] == ['b', 'a']
+
+
+def test_routes_to_fastest_healthy_provider():
+    router = ProviderRouter([StubProvider('slow', text='slow'), StubProvider('fast', text='fast')],
+                            hedge_percentile=0)
+    seed(router, 'slow', 0.5)
+    seed(router, 'fast', 0.1)
+    assert [p.name for p in router.ranked()] == ['fast', 'slow']
+    assert router.complete(MESSAGES) == 'fast'
+
+
+def test_unhealthy_provider_is_ranked_last():
+    router = ProviderRouter([StubProvider('flaky'), StubProvider('steady')], max_error_rate=0.5)
+    seed(router, 'flaky', 0.01, count=6, ok=False)
+    seed(router, 'flaky', 0.01, count=4)
+    seed(router, 'steady', 1.0)
+    assert [p.name for p in router.ranked()] == ['steady', 'flaky']
+
+
+def test_unconfigured_providers_are_skipped(monkeypatch):
+    monkeypatch.delenv('KNOWFLUX_TEST_KEY', raising=False)
+    missing = StubProvider('missing')
+    missing.api_key_env = 'KNOWFLUX_TEST_KEY'
+    router = ProviderRouter([missing, StubProvider('stub', text='ok')])
+    assert [p.name for p in router.configured()] == ['stub']
+    assert router.complete(MESSAGES) == 'ok'
+
+
+def test_hedges_slow_primary():
+    primary = RecordingProvider('primary', latency=2.0, text='primary')
+    backup = StubProvider('backup', latency=0.05, text='backup')
+    router = ProviderRouter([primary, backup], hedge_percentile=95, hedge_min_samples=10)
+    seed(router, 'primary', 0.05)
+    seed(router, 'backup', 0.2)
+
+    started = time.perf_counter()
+    assert router.complete(MESSAGES) == 'backup'
+    assert time.perf_counter() - started < 1.0
+    assert router.counters['hedged'] == 1
+    assert router.counters['hedge_wins'] == 1
+    # The losing request stops at its next piece instead of running to the end
+    deadline = time.time() + 2
+    while not primary.events and time.time() < deadline:
+        time.sleep(0.01)
+    assert primary.events == ['cancelled']
+
+
+def test_time_queued_for_the_rate_limit_does_not_trigger_a_hedge():
+    scheduler = exhausted_scheduler('primary')
+    primary = ScheduledProvider('primary', scheduler, text='primary')
+    backup = StubProvider('backup', text='backup')
+    router = ProviderRouter([primary, backup], hedge_percentile=95, hedge_min_samples=10)
+    seed(router, 'primary', 0.3)
+    seed(router, 'backup', 0.5)
+    # Queued ~0.6s for its tokens, longer than the 0.3s hedge delay
+    scheduler._state('primary').tokens.tokens = 90
+    assert router.complete(MESSAGES) == 'primary'
+    assert router.counters['hedged'] == 0
+
+
+def test_losing_hedge_leaves_the_rate_limit_queue():
+    scheduler = exhausted_scheduler('backup')
+    primary = StubProvider('primary', latency=0.4, text='primary')
+    backup = ScheduledProvider('backup', scheduler, text='backup')
+    router = ProviderRouter([primary, backup], hedge_percentile=95, hedge_min_samples=10)
+    seed(router, 'primary', 0.05)
+    seed(router, 'backup', 0.2)
+    assert router.complete(MESSAGES) == 'primary'
+    assert router.counters['hedged'] == 1
+    deadline = time.time() + 2
+    while scheduler.stats()['backup']['queued_calls'] and time.time() < deadline:
+        time.sleep(0.01)
+    assert scheduler.stats()['backup']['queued_calls'] == 0
+    assert backup.started == 0
+    # Leaving the queue is not a provider failure
+    assert router.trackers['backup'].error_rate() == 0
+
+
+def test_time_queued_for_the_rate_limit_does_not_trigger_a_hedge_async():
+    scheduler = exhausted_scheduler('primary')
+    primary = ScheduledProvider('primary', scheduler, text='primary')
+    router = ProviderRouter([primary, StubProvider('backup', text='backup')], hedge_min_samples=10)
+    seed(router, 'primary', 0.3)
+    seed(router, 'backup', 0.5)
+    scheduler._state('primary').tokens.tokens = 90
+    assert asyncio.run(router.complete_async(MESSAGES)) == 'primary'
+    assert router.counters['hedged'] == 0
+
+
+def test_no_hedge_without_enough_samples():
+    router = ProviderRouter([StubProvider('primary', latency=0.2, text='primary'), StubProvider('backup')],
+                            hedge_min_samples=10)
+    seed(router, 'primary', 0.01, count=3)
+    seed(router, 'backup', 0.5, count=3)
+    assert router.complete(MESSAGES) == 'primary'
+    assert router.counters['hedged'] == 0
+
+
+def test_hedges_slow_primary_async():
+    primary = RecordingProvider('primary', latency=2.0, text='primary')
+    backup = StubProvider('backup', latency=0.05, text='backup')
+    router = ProviderRouter([primary, backup], hedge_percentile=95, hedge_min_samples=10)
+    seed(router, 'primary', 0.05)
+    seed(router, 'backup', 0.2)
+
+    async def run():
+        result = await router.complete_async(MESSAGES)
+        await asyncio.sleep(0)
+        return result
+
+    started = time.perf_counter()
+    assert asyncio.run(run()) == 'backup'
+    assert time.perf_counter() - started < 1.0
+    assert router.counters['hedge_wins'] == 1
+    assert primary.events == ['cancelled']
+
+
+def test_fails_over_to_next_provider():
+    router = ProviderRouter([StubProvider('broken', fail_every=1), StubProvider('backup', text='backup')])
+    seed(router, 'broken', 0.01, count=3)
+    seed(router, 'backup', 0.5, count=3)
+    assert router.complete(MESSAGES) == 'backup'
+    assert router.counters['failovers'] == 1
+    assert router.trackers['broken'].error_rate() > 0
+
+
+def test_stub_stream_keeps_its_latency_without_cancel():
+    started = time.perf_counter()
+    assert ''.join(StubProvider('stub', latency=0.2).stream(MESSAGES)) == 'stub review'
+    assert time.perf_counter() - started >= 0.2
+
+
+def test_fails_over_async_and_when_streaming():
+    router = ProviderRouter([StubProvider('broken', fail_every=1), StubProvider('backup', text='backup')])
+    seed(router, 'broken', 0.01, count=3)
+    seed(router, 'backup', 0.5, count=3)
+    assert asyncio.run(router.complete_async(MESSAGES)) == 'backup'
+    assert ''.join(router.stream(MESSAGES)) == 'backup'
+
+    async def collect():
+        return ''.join([text async for text in router.astream(MESSAGES)])
+
+    assert asyncio.run(collect()) == 'backup'
+
+
+def test_all_providers_failing():
+    router = ProviderRouter([StubProvider('a', fail_every=1), StubProvider('b', fail_every=1)])
+    with pytest.raises(RuntimeError, match='All providers failed'):
+        router.complete(MESSAGES)
+    with pytest.raises(RuntimeError, match='All providers failed'):
+        list(router.stream(MESSAGES))
+
+
+def test_all_providers_rate_limited_is_a_rate_limit_error():
+    router = ProviderRouter([RateLimitedProvider('a'), RateLimitedProvider('b')])
+    with pytest.raises(RateLimitedError):
+        router.complete(MESSAGES)
+    mixed = ProviderRouter([RateLimitedProvider('a'), StubProvider('b', fail_every=1)])
+    with pytest.raises(RuntimeError) as error:
+        mixed.complete(MESSAGES)
+    assert not isinstance(error.value, RateLimitedError)
+
+
+def test_provider_complete_honours_cancel():
+    cancel = threading.Event()
+    cancel.set()
+    with pytest.raises(ProviderCancelled):
+        StubProvider('stub', latency=0.1).complete(MESSAGES, cancel)
+
+
+def test_cancelling_async_stream_stops_the_provider():
+    provider = RecordingProvider('stub', latency=1.0, chunks=10)
+    router = ProviderRouter([provider])
+
+    async def run():
+        pieces = []
+
+        async def consume():
+            async for text in router.astream(MESSAGES):
+                pieces.append(text)
+
+        task = asyncio.ensure_future(consume())
+        while not pieces:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return pieces
+
+    pieces = asyncio.run(run())
+    assert len(pieces) < 10
+    assert provider.events == ['cancelled']
+
+
+def test_cancelling_complete_async_cancels_every_request():
+    primary = RecordingProvider('primary', latency=1.0, text='primary')
+    backup = RecordingProvider('backup', latency=1.0, text='backup')
+    router = ProviderRouter([primary, backup], hedge_min_samples=10)
+    seed(router, 'primary', 0.01)
+    seed(router, 'backup', 0.5)
+
+    async def run():
+        task = asyncio.ensure_future(router.complete_async(MESSAGES))
+        await asyncio.sleep(0.2)
+        assert router.counters['hedged'] == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert primary.events == ['cancelled']
+    assert backup.events == ['cancelled']
@@ -0,0 +1,71 @@
+import os
+import time
+
+from review_cache import DiskCache, LayeredCache, MemoryCache, make_review_key
+
+
+def test_review_key_depends_on_content_model_and_prompt():
+    key = make_review_key('repo', 'model', 'prompt')
+    assert key == make_review_key('repo', 'model', 'prompt')
+    assert len({key, make_review_key('repo2', 'model', 'prompt'), make_review_key('repo', 'other', 'prompt'),
+                make_review_key('repo', 'model', 'prompt2')}) == 4
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(max_entries=2)
+    cache.set('a', 1, 1)
+    cache.set('b', 2, 1)
+    assert cache.get('a') == 1
+    cache.set('c', 3, 1)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+
+
+def test_memory_cache_byte_limit():
+    cache = MemoryCache(max_bytes=10)
+    cache.set('a', 'x', 6)
+    cache.set('b', 'y', 6)
+    assert cache.get('a') is None and cache.get('b') == 'y'
+    # Entries larger than the whole cache are not stored
+    cache.set('huge', 'z', 11)
+    assert cache.get('huge') is None and len(cache) == 1
+
+
+def test_memory_cache_ttl_and_pop():
+    cache = MemoryCache(ttl=-1)
+    cache.set('a', 1, 1)
+    assert cache.get('a') is None
+    cache = MemoryCache()
+    cache.set('a', 1, 1)
+    assert cache.pop('a') == 1
+    assert cache.pop('a') is None and len(cache) == 0
+
+
+def test_disk_cache_round_trip_and_expiry(tmp_path):
+    cache = DiskCache(str(tmp_path), ttl=60)
+    assert cache.set('k', {'review': 'text'}) > 0
+    assert cache.get('k') == {'review': 'text'}
+    old = time.time() - 120
+    os.utime(tmp_path / 'k.json', (old, old))
+    assert cache.get('k') is None
+    assert not (tmp_path / 'k.json').exists()
+
+
+def test_disk_cache_evicts_oldest_files_over_the_size_limit(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=50)
+    cache.set('old', 'x' * 30)
+    old = time.time() - 10
+    os.utime(tmp_path / 'old.json', (old, old))
+    cache.set('new', 'y' * 30)
+    assert cache.get('old') is None
+    assert cache.get('new') == 'y' * 30
+
+
+def test_layered_cache_promotes_disk_hits_to_memory(tmp_path):
+    disk = DiskCache(str(tmp_path))
+    disk.set('k', {'review': 'text'})
+    cache = LayeredCache(MemoryCache(), disk)
+    assert cache.get('k') == ({'review': 'text'}, 'disk')
+    assert cache.get('k') == ({'review': 'text'}, 'memory')
+    assert cache.get('missing') == (None, None)
+    assert cache.stats == {'memory_hits': 1, 'disk_hits': 1, 'misses': 1}
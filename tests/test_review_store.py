@@ -0,0 +1,77 @@
+import pytest
+
+from review_store import ReviewStore
+
+
+@pytest.fixture(params=[True, False], ids=['fts', 'like'])
+def store(request, tmp_path):
+    store = ReviewStore(str(tmp_path / 'reviews.sqlite3'))
+    if not request.param:
+        store.fts = False
+    elif not store.fts:
+        pytest.skip('SQLite has no FTS5 support')
+    return store
+
+
+def add(store, url='https://github.com/o/r', review='review text', model='m', **kwargs):
+    return store.add(url, review, 'hash', 'key', model, 'v1', **kwargs)
+
+
+def test_add_get_and_find(store):
+    review_id = add(store, commit_sha='abc', details={'chunks': 2})
+    add(store, review='other', model='m2')
+    review = store.get(review_id)
+    assert review['review'] == 'review text'
+    assert review['commit_sha'] == 'abc'
+    assert review['details'] == {'chunks': 2}
+    assert 'repo_key' not in review
+    assert store.find('key')['review'] == 'other'
+    assert store.find('missing') is None
+    assert store.get(12345) is None
+    assert store.count() == 2
+
+
+def test_list_is_keyset_paginated_newest_first(store):
+    ids = [add(store, review=f'review {n}') for n in range(5)]
+    seen = []
+    cursor = None
+    while True:
+        items, cursor = store.list(limit=2, cursor=cursor)
+        seen.extend(item['id'] for item in items)
+        if cursor is None:
+            break
+    assert seen == ids[::-1]
+    # Reviews added meanwhile do not shift later pages
+    items, cursor = store.list(limit=2)
+    add(store, review='newer')
+    assert [item['id'] for item in store.list(limit=2, cursor=cursor)[0]] == ids[2:0:-1]
+
+
+def test_search_matches_words_in_any_order(store):
+    wanted = add(store, review='The cache invalidation bug in the parser')
+    add(store, review='Clean code, nothing to report')
+    items, _ = store.list(query='parser cache')
+    assert [item['id'] for item in items] == [wanted]
+    assert store.list(query='missing')[0] == []
+
+
+def test_search_input_is_not_query_syntax(store):
+    add(store, review='100% coverage of the_module')
+    add(store, review='1000 lines in module')
+    assert len(store.list(query='100% the_module')[0]) == 1
+    assert store.list(query='"unbalanced OR (')[0] == []
+
+
+def test_filters_by_repository_and_model(store):
+    add(store, url='https://github.com/Owner/Repo')
+    add(store, url='https://github.com/owner/other')
+    add(store, url='https://github.com/owner/repo.git', model='m2')
+    assert len(store.list(repository_url='https://github.com/owner/repo')[0]) == 2
+    assert len(store.list(repository_url='https://github.com/owner/repo', model='m2')[0]) == 1
+
+
+def test_page_size_is_clamped(store):
+    for n in range(3):
+        add(store, review=f'review {n}')
+    assert len(store.list(limit=0)[0]) == 1
+    assert len(store.list(limit=1000)[0]) == 3
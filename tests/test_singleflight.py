@@ -0,0 +1,229 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from singleflight import AsyncSingleFlight, SingleFlight, normalize_repo_url
+
+
+def test_normalize_repo_url():
+    assert normalize_repo_url('https://github.com/Owner/Repo.git/') == 'github.com/owner/repo'
+    assert normalize_repo_url(' https://GitHub.com/owner/repo ') == 'github.com/owner/repo'
+    assert normalize_repo_url('/tmp/Checkout/') == '/tmp/Checkout'
+
+
+def test_normalize_repo_url_keeps_branch_and_path_case():
+    assert normalize_repo_url('https://github.com/Owner/Repo/tree/Feature/Src') == 'github.com/owner/repo/tree/Feature/Src'
+    feature = normalize_repo_url('https://github.com/o/r/tree/Feature')
+    assert feature != normalize_repo_url('https://github.com/o/r/tree/feature')
+
+
+def run_threads(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.01)
+    for thread in threads:
+        thread.join()
+
+
+def test_do_runs_once_for_concurrent_callers():
+    flight = SingleFlight()
+    runs = []
+    results = []
+
+    def work():
+        runs.append(1)
+        time.sleep(0.2)
+        return 'result'
+
+    run_threads(5, lambda: results.append(flight.do('key', work)))
+    assert len(runs) == 1
+    assert sorted(results) == [('result', False)] + [('result', True)] * 4
+    stats = flight.stats()
+    assert stats['executions'] == 1 and stats['coalesced'] == 4 and stats['in_flight'] == 0
+
+
+def test_do_shares_errors_and_forgets_finished_calls():
+    flight = SingleFlight()
+    errors = []
+
+    def fail():
+        time.sleep(0.1)
+        raise ValueError('boom')
+
+    def call():
+        try:
+            flight.do('key', fail)
+        except ValueError as e:
+            errors.append(e)
+
+    run_threads(3, call)
+    assert len(errors) == 3
+    # A later call runs again instead of reusing the failure
+    assert flight.do('key', lambda: 'ok') == ('ok', False)
+
+
+def test_on_wait_is_called_for_waiters_only():
+    flight = SingleFlight()
+    waited = []
+    run_threads(2, lambda: flight.do('key', lambda: time.sleep(0.1), on_wait=lambda: waited.append(1)))
+    assert waited == [1]
+
+
+def test_async_do_runs_once():
+    flight = AsyncSingleFlight()
+    runs = []
+
+    async def work():
+        runs.append(1)
+        await asyncio.sleep(0.1)
+        return 'result'
+
+    async def run():
+        return await asyncio.gather(*(flight.do('key', work) for _ in range(4)))
+
+    results = asyncio.run(run())
+    assert len(runs) == 1
+    assert sorted(results) == [('result', False)] + [('result', True)] * 3
+
+
+def test_async_do_cancelled_leader_fails_waiters():
+    flight = AsyncSingleFlight()
+
+    async def run():
+        leader = asyncio.ensure_future(flight.do('key', lambda: asyncio.sleep(1)))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.ensure_future(flight.do('key', lambda: asyncio.sleep(1)))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(RuntimeError, match='cancelled'):
+            await waiter
+
+    asyncio.run(run())
+
+
+def produce(items, delay=0.05, result_log=None):
+    def generate():
+        for item in items:
+            time.sleep(delay)
+            if result_log is not None:
+                result_log.append(item)
+            yield item
+    return generate
+
+
+def test_stream_fans_out_every_item_to_every_subscriber():
+    flight = SingleFlight()
+    runs = []
+    received = {}
+
+    def generate():
+        runs.append(1)
+        yield from produce(['a', 'b', 'c'])()
+
+    def subscribe(name):
+        received[name] = list(flight.stream('key', generate, replay=None, collect=list))
+
+    threads = [threading.Thread(target=subscribe, args=(n,)) for n in range(3)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.06)
+    for thread in threads:
+        thread.join()
+    assert len(runs) == 1
+    # Late subscribers replay the items produced before they joined
+    assert received[0] == [('a', False), ('b', False), ('c', False)]
+    assert received[1] == received[2] == [('a', True), ('b', True), ('c', True)]
+
+
+def test_do_joins_a_stream_and_stream_joins_a_do():
+    flight = SingleFlight()
+    results = {}
+
+    def stream_first():
+        results['stream'] = list(flight.stream('key', produce(['x', 'y']), replay=None, collect=''.join))
+
+    thread = threading.Thread(target=stream_first)
+    thread.start()
+    time.sleep(0.02)
+    results['do'] = flight.do('key', lambda: 'not run')
+    thread.join()
+    assert results['do'] == ('xy', True)
+
+    def do_first():
+        results['do'] = flight.do('other', lambda: time.sleep(0.1) or 'done')
+
+    thread = threading.Thread(target=do_first)
+    thread.start()
+    time.sleep(0.02)
+    replayed = list(flight.stream('other', produce(['unused']), replay=lambda result: [result.upper()], collect=list))
+    thread.join()
+    assert replayed == [('DONE', True)]
+
+
+def test_stream_errors_reach_every_subscriber():
+    flight = SingleFlight()
+
+    def generate():
+        yield 'a'
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        list(flight.stream('key', generate, replay=None, collect=list))
+    assert flight.stats()['in_flight'] == 0
+
+
+def test_stream_stops_once_every_subscriber_left():
+    flight = SingleFlight()
+    produced = []
+    items = flight.stream('key', produce(range(20), result_log=produced), replay=None, collect=list)
+    assert next(items) == (0, False)
+    items.close()
+    time.sleep(0.3)
+    assert len(produced) < 5
+    assert flight.stats()['in_flight'] == 0
+
+
+def test_stream_keeps_running_while_a_do_caller_waits():
+    flight = SingleFlight()
+    items = flight.stream('key', produce(range(4)), replay=None, collect=list)
+    next(items)
+    results = []
+    thread = threading.Thread(target=lambda: results.append(flight.do('key', lambda: None)))
+    thread.start()
+    time.sleep(0.02)
+    items.close()
+    thread.join()
+    assert results == [([0, 1, 2, 3], True)]
+
+
+def test_async_stream_fans_out_and_cancels_when_abandoned():
+    flight = AsyncSingleFlight()
+    produced = []
+
+    async def generate():
+        for item in range(20):
+            await asyncio.sleep(0.02)
+            produced.append(item)
+            yield item
+
+    async def subscribe(delay):
+        await asyncio.sleep(delay)
+        return [item async for item in flight.stream('key', generate, replay=None, collect=list)]
+
+    async def run():
+        first, second = await asyncio.gather(subscribe(0), subscribe(0.1))
+        assert [item for item, _ in first] == [item for item, _ in second] == list(range(20))
+        assert not any(shared for _, shared in first) and all(shared for _, shared in second)
+
+        produced.clear()
+        items = flight.stream('key', generate, replay=None, collect=list)
+        assert await items.__anext__() == (0, False)
+        await items.aclose()
+        await asyncio.sleep(0.1)
+        assert len(produced) == 1
+        assert flight.stats()['in_flight'] == 0
+
+    asyncio.run(run())